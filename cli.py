@@ -0,0 +1,163 @@
+"""
+TestRig Automator - command line entry point.
+
+Runs testplans headless, without Streamlit:
+    testrig run --plan "Smoke" --testbed "Sample Testbed"
+    testrig run --plan "Regression" --pool lab-a   (sharded across the pool)
+    testrig resume 42
+    testrig enqueue --plan "Smoke" --pool lab-a
+    testrig schedule --until-idle
+    testrig worker --pool lab-a          (one per lab host, sharing the DB)
+"""
+import argparse
+import sys
+import time
+
+
+class _StdoutLog:
+    """Log queue that prints each line as it arrives."""
+
+    def __init__(self, quiet: bool = False):
+        self.quiet = quiet
+
+    def put(self, msg, block=True, timeout=None):
+        if not self.quiet:
+            print(msg, flush=True)
+
+    put_nowait = put
+
+
+def _open_db(args):
+    if args.db:
+        import database.db_connection as db_connection
+        db_connection.DB_PATH = args.db
+    from database import init_db
+    init_db()
+
+
+def _wait_for_run(handle) -> int:
+    try:
+        while handle["thread"].is_alive():
+            handle["thread"].join(0.5)
+    except KeyboardInterrupt:
+        print("Cancelling run (Ctrl-C again to force quit)...", file=sys.stderr, flush=True)
+        handle["cancel"].set()
+        handle["thread"].join()
+
+    result = handle["result"]
+    if result.get("run_id") is None:
+        print(f"error: {result.get('status')}", file=sys.stderr)
+        return 2
+    print(f"run {result['run_id']}: {result['status']}")
+    return {"PASSED": 0, "FAILED": 1}.get(result["status"], 3)
+
+
+def cmd_run(args) -> int:
+    _open_db(args)
+    log = _StdoutLog(args.quiet)
+    if args.pool or len(args.testbed) > 1:
+        from core.sharding import start_sharded_thread
+        return _wait_for_run(start_sharded_thread(args.plan, args.testbed, args.pool, log,
+                                                  stop_on_fail=args.stop_on_fail, max_shards=args.shards))
+    from core.runner import start_run_thread
+    return _wait_for_run(start_run_thread(args.plan, args.testbed[0], log, stop_on_fail=args.stop_on_fail))
+
+
+def cmd_resume(args) -> int:
+    _open_db(args)
+    from core.runner import start_resume_thread
+
+    log = _StdoutLog(args.quiet)
+    return _wait_for_run(start_resume_thread(args.run_id, log, stop_on_fail=args.stop_on_fail,
+                                                   force=args.force))
+
+
+def cmd_enqueue(args) -> int:
+    _open_db(args)
+    from core.scheduler import enqueue_job
+
+    job_id, err = enqueue_job(args.plan, args.testbed, args.pool, args.priority, args.stop_on_fail)
+    if job_id is None:
+        print(f"error: {err}", file=sys.stderr)
+        return 2
+    print(f"job {job_id} queued")
+    return 0
+
+
+def cmd_schedule(args) -> int:
+    _open_db(args)
+    from core.scheduler import Scheduler, resolve_testbeds
+
+    testbeds = None
+    if args.testbed or args.pool:
+        testbeds, err = resolve_testbeds(args.testbed, args.pool)
+        if err:
+            print(f"error: {err}", file=sys.stderr)
+            return 2
+    sched = Scheduler(max_workers=args.workers, log_q=_StdoutLog(args.quiet), testbeds=testbeds)
+    print(f"scheduler {sched.owner} started", flush=True)
+    try:
+        if args.until_idle:
+            sched.run_until_idle()
+        else:
+            sched.start()
+            while True:
+                time.sleep(1)
+    except KeyboardInterrupt:
+        print("Stopping scheduler, cancelling running jobs...", file=sys.stderr, flush=True)
+        sched.stop(cancel_running=True)
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="testrig", description="TestRig Automator command line")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="execute a testplan on a testbed and record the results")
+    run.add_argument("--plan", required=True, help="testplan name or id")
+    beds = run.add_mutually_exclusive_group(required=True)
+    beds.add_argument("--testbed", action="append", help="testbed name or id; repeat to shard the plan across beds")
+    beds.add_argument("--pool", action="append", help="shard the plan across the testbeds of this pool")
+    run.add_argument("--shards", type=int, help="max testbeds to shard across (default: all given)")
+    run.add_argument("--db", help="SQLite database path (default: config.DB_PATH)")
+    run.add_argument("--stop-on-fail", action="store_true", help="stop at the first failed testcase")
+    run.add_argument("-q", "--quiet", action="store_true", help="only print the final status")
+    run.set_defaults(func=cmd_run)
+
+    res = sub.add_parser("resume", help="continue an interrupted run from its last checkpoint")
+    res.add_argument("run_id", type=int, help="run id (see the Results page)")
+    res.add_argument("--db", help="SQLite database path (default: config.DB_PATH)")
+    res.add_argument("--stop-on-fail", action="store_true", help="stop at the first failed testcase")
+    res.add_argument("--force", action="store_true",
+                     help="resume a run still marked RUNNING (only if its process is known to be dead)")
+    res.add_argument("-q", "--quiet", action="store_true", help="only print the final status")
+    res.set_defaults(func=cmd_resume)
+
+    enq = sub.add_parser("enqueue", help="queue a testplan for the scheduler")
+    enq.add_argument("--plan", required=True, help="testplan name or id")
+    target = enq.add_mutually_exclusive_group(required=True)
+    target.add_argument("--testbed", help="testbed name or id")
+    target.add_argument("--pool", help="run on any free testbed of this pool")
+    enq.add_argument("--priority", type=int, default=0, help="higher runs first")
+    enq.add_argument("--stop-on-fail", action="store_true", help="stop at the first failed testcase")
+    enq.add_argument("--db", help="SQLite database path (default: config.DB_PATH)")
+    enq.set_defaults(func=cmd_enqueue)
+
+    sch = sub.add_parser("schedule", aliases=["worker"], help="run queued jobs on every free testbed")
+    sch.add_argument("--testbed", action="append", help="only serve this testbed (repeatable)")
+    sch.add_argument("--pool", action="append", help="only serve testbeds of this pool (repeatable)")
+    sch.add_argument("--workers", type=int, help="max concurrent runs (default: number of testbeds served)")
+    sch.add_argument("--until-idle", action="store_true", help="exit once the queue is empty")
+    sch.add_argument("--db", help="SQLite database path (default: config.DB_PATH)")
+    sch.add_argument("-q", "--quiet", action="store_true", help="suppress run logs")
+    sch.set_defaults(func=cmd_schedule)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -16,6 +16,7 @@ SESSION_KEYS = {
     "tb_reach_cache": "_tb_reach_cache",
     "import_stage": "_import_stage",
     "import_payload": "_import_payload",
+    "runner_job": "_runner_job",
 }
 
 # UI defaults
@@ -25,3 +26,19 @@ UI_DEFAULTS = {
     "ssh_timeout": 20,
     "command_timeout": 60,
 }
+
+# Device reachability probing
+REACHABILITY_DEFAULTS = {
+    "cache_ttl_s": 30,
+    "max_workers": 32,
+    # Serial-port / adb device listings are shared by all probes this long
+    "enum_ttl_s": 2,
+    # ...or this long for serial ports while udev hotplug events are watched
+    "enum_watch_ttl_s": 300,
+    "enum_watch": True,
+    # Background monitor: re-probe healthy devices about this often (± jitter)
+    "monitor_interval_s": 30,
+    "monitor_jitter": 0.2,
+    # Down devices back off exponentially up to this interval
+    "monitor_max_backoff_s": 600,
+}
@@ -4,9 +4,20 @@ from .device_manager import (
     device_reachability_status,
     device_reachability_summary,
     reachability_probe_and_cache,
+    get_cached_reachability,
+    sweep_testbed_reachability,
+    sweep_devices_reachability,
     probe_ip_once,
+    probe_ips,
     probe_com_once,
     probe_adb_once,
+    DeviceEnumeration,
+    get_device_enumeration,
+)
+from .reachability_monitor import (
+    ReachabilityMonitor,
+    get_reachability_monitor,
+    load_device_status,
 )
 from .testbed_manager import (
     export_testbed_json,
@@ -18,25 +29,162 @@ from .action_executor import (
 )
 from .device_shell import (
     run_shell_on_device,
+    run_batch_on_device,
     run_streaming_shell_on_device,
     write_text_file_on_device,
+    sync_text_file_on_device,
     fetch_file_from_device,
 )
+from .adb_client import (
+    AdbClient,
+    AdbError,
+    get_adb_client,
+)
+from .serial_console import (
+    SerialConsole,
+    get_serial_console,
+    close_all_consoles,
+)
+from .ssh_pool import (
+    SSHConnectionPool,
+    get_ssh_pool,
+)
+from .actions import (
+    ActionHandler,
+    get_action_registry,
+    register_action,
+)
+from .metrics import StreamingSummary
+from .local_process import run_local_command
+from .iperf import (
+    iperf_summary,
+    run_iperf3_streaming,
+)
+from .iperf_orchestrator import run_iperf_between_devices
+from .node_graph import (
+    EventBus,
+    GraphError,
+    register_node_handler,
+    run_node_graph,
+    execute_node_graph,
+)
+from .assert_expr import (
+    CompiledExpr,
+    ExprError,
+    compile_expr,
+)
+from .iteration_group import (
+    expand_matrix,
+    run_iteration_group,
+)
+from .live_tail import (
+    LiveTailMux,
+    run_live_tail,
+)
+from .leases import (
+    LeaseSet,
+    lease_holder,
+)
+from .runner import (
+    run_plan,
+    run_testcase,
+    execute_run,
+    start_run_thread,
+    resume_run,
+    start_resume_thread,
+)
+from .scheduler import (
+    Scheduler,
+    enqueue_job,
+    cancel_job,
+    list_jobs,
+    recover_abandoned_jobs,
+    list_workers,
+    get_scheduler,
+)
+from .sharding import (
+    run_sharded,
+    start_sharded_thread,
+    merged_results,
+)
+from .probe_engine import (
+    ProbeEngine,
+    get_probe_engine,
+)
 
 __all__ = [
     'check_reachability',
     'device_reachability_status',
     'device_reachability_summary',
     'reachability_probe_and_cache',
+    'get_cached_reachability',
+    'sweep_testbed_reachability',
+    'sweep_devices_reachability',
     'probe_ip_once',
+    'probe_ips',
     'probe_com_once',
     'probe_adb_once',
+    'DeviceEnumeration',
+    'get_device_enumeration',
+    'ReachabilityMonitor',
+    'get_reachability_monitor',
+    'load_device_status',
     'export_testbed_json',
     'import_testbed_from_json',
     'execute_builtin_action',
     'execute_external_command',
+    'ActionHandler',
+    'get_action_registry',
+    'register_action',
     'run_shell_on_device',
+    'run_batch_on_device',
     'run_streaming_shell_on_device',
     'write_text_file_on_device',
+    'sync_text_file_on_device',
     'fetch_file_from_device',
+    'AdbClient',
+    'AdbError',
+    'get_adb_client',
+    'SerialConsole',
+    'get_serial_console',
+    'close_all_consoles',
+    'SSHConnectionPool',
+    'get_ssh_pool',
+    'StreamingSummary',
+    'run_local_command',
+    'iperf_summary',
+    'run_iperf3_streaming',
+    'run_iperf_between_devices',
+    'EventBus',
+    'GraphError',
+    'register_node_handler',
+    'run_node_graph',
+    'execute_node_graph',
+    'CompiledExpr',
+    'ExprError',
+    'compile_expr',
+    'expand_matrix',
+    'run_iteration_group',
+    'LiveTailMux',
+    'run_live_tail',
+    'LeaseSet',
+    'lease_holder',
+    'run_plan',
+    'run_testcase',
+    'execute_run',
+    'start_run_thread',
+    'resume_run',
+    'start_resume_thread',
+    'Scheduler',
+    'enqueue_job',
+    'cancel_job',
+    'list_jobs',
+    'recover_abandoned_jobs',
+    'list_workers',
+    'get_scheduler',
+    'run_sharded',
+    'start_sharded_thread',
+    'merged_results',
+    'ProbeEngine',
+    'get_probe_engine',
 ]
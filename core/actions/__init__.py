@@ -0,0 +1,140 @@
+"""
+Builtin action registry. Each action is a handler class registered by
+name; its module is imported only when the action is first looked up,
+and third-party actions are found through the "testrig.actions" entry
+point group (name = action name, value = "package.module:HandlerClass").
+"""
+import importlib
+import queue
+import threading
+from typing import Tuple, Dict, Any, List, Union
+
+
+ENTRY_POINT_GROUP = "testrig.actions"
+
+# Builtins: action name -> "module:Class" within this package
+_BUILTIN_ACTIONS = {
+    "sleep": "basic:SleepAction",
+    "ping": "basic:PingAction",
+    "iperf3": "iperf:Iperf3Action",
+    "iperf_between_devices": "iperf:IperfBetweenDevicesAction",
+    "tshark_capture": "capture:TsharkCaptureAction",
+    "ssh_exec": "ssh:SshExecAction",
+}
+
+
+class ActionHandler:
+    """
+    Base class for actions. Subclasses set `name` and implement run();
+    one instance serves every call, so keep per-call state in locals.
+    """
+
+    name = ""
+
+    def run(self, params: Dict[str, Any], tb_ctx: Dict[str, Any],
+            log_q: queue.Queue) -> Tuple[str, Dict[str, Any]]:
+        """Returns (status, metrics_dict). Status in {PASSED, FAILED}."""
+        raise NotImplementedError
+
+
+HandlerSpec = Union[str, type, ActionHandler]
+
+
+class ActionRegistry:
+    """Name -> handler with O(1) lookup; specs are resolved on first use."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._specs: Dict[str, Any] = {}
+        self._handlers: Dict[str, ActionHandler] = {}
+        self._discovered = False
+
+    def register(self, name: str, handler: HandlerSpec):
+        """handler: an ActionHandler subclass or instance, or a lazy "module:Class" path."""
+        name = name.lower()
+        with self._lock:
+            self._specs[name] = handler
+            self._handlers.pop(name, None)
+
+    def get(self, name: str) -> ActionHandler | None:
+        name = (name or "").lower()
+        handler = self._handlers.get(name)
+        if handler is not None:
+            return handler
+        with self._lock:
+            handler = self._handlers.get(name)
+            if handler is not None:
+                return handler
+            if name not in self._specs and not self._discovered:
+                self._discover_locked()
+            spec = self._specs.get(name)
+            if spec is None:
+                return None
+            handler = self._handlers[name] = _resolve(spec)
+            return handler
+
+    def names(self) -> List[str]:
+        with self._lock:
+            if not self._discovered:
+                self._discover_locked()
+            return sorted(self._specs)
+
+    def _discover_locked(self):
+        """Add entry-point actions (builtins and explicit registrations win)."""
+        self._discovered = True
+        try:
+            from importlib.metadata import entry_points
+            eps = entry_points(group=ENTRY_POINT_GROUP)
+        except Exception:
+            return
+        for ep in eps:
+            self._specs.setdefault(ep.name.lower(), ep)
+
+
+def _resolve(spec) -> ActionHandler:
+    if isinstance(spec, ActionHandler):
+        return spec
+    if isinstance(spec, type):
+        return spec()
+    if isinstance(spec, str):
+        module, _, attr = spec.partition(":")
+        obj = getattr(importlib.import_module(module if "." in module else f"{__name__}.{module}"), attr)
+    else:
+        obj = spec.load()  # importlib.metadata.EntryPoint
+    return obj() if isinstance(obj, type) else obj
+
+
+_registry: ActionRegistry | None = None
+_registry_lock = threading.Lock()
+
+
+def get_action_registry() -> ActionRegistry:
+    """Process-wide registry, seeded with the builtin actions."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                reg = ActionRegistry()
+                for name, spec in _BUILTIN_ACTIONS.items():
+                    reg.register(name, spec)
+                _registry = reg
+    return _registry
+
+
+def register_action(name: str, handler: HandlerSpec):
+    """Register (or replace) an action by name."""
+    get_action_registry().register(name, handler)
+    return handler
+
+
+def get_action_handler(name: str) -> ActionHandler | None:
+    return get_action_registry().get(name)
+
+
+__all__ = [
+    'ActionHandler',
+    'ActionRegistry',
+    'get_action_registry',
+    'register_action',
+    'get_action_handler',
+]
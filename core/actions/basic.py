@@ -0,0 +1,52 @@
+"""sleep and ping actions."""
+import queue
+import time
+from typing import Tuple, Dict, Any
+
+from . import ActionHandler
+from ..probe_engine import get_probe_engine
+
+
+class SleepAction(ActionHandler):
+    name = "sleep"
+
+    def run(self, params: Dict[str, Any], tb_ctx: Dict[str, Any],
+            log_q: queue.Queue) -> Tuple[str, Dict[str, Any]]:
+        dur = int(params.get("duration_s", 1))
+        log_q.put(f"Sleeping for {dur}s...")
+        for i in range(dur):
+            time.sleep(1)
+            log_q.put(f"  ... {i+1}/{dur}s")
+        return "PASSED", {"duration_s": dur}
+
+
+class PingAction(ActionHandler):
+    name = "ping"
+
+    def run(self, params: Dict[str, Any], tb_ctx: Dict[str, Any],
+            log_q: queue.Queue) -> Tuple[str, Dict[str, Any]]:
+        target = params.get("target_ip") or tb_ctx.get("ap_ip") or "127.0.0.1"
+        count = int(params.get("count", 3))
+        timeout = float(params.get("timeout_s", 2))
+        log_q.put(f"Pinging {target} ({count} packets)...")
+
+        try:
+            res = get_probe_engine().probe(str(target), count=count, timeout=timeout)
+        except Exception as e:
+            log_q.put(f"Ping failed: {e}")
+            return "FAILED", {"error": str(e)}
+
+        log_q.put(
+            f"{res['sent']} sent, {res['received']} received, {res['loss_pct']}% loss "
+            f"via {res['method']}; rtt min/avg/max = "
+            f"{res['rtt_min_ms']}/{res['rtt_avg_ms']}/{res['rtt_max_ms']} ms"
+        )
+        metrics = {k: res[k] for k in (
+            "target", "sent", "received", "loss_pct",
+            "rtt_min_ms", "rtt_avg_ms", "rtt_max_ms", "method",
+        )}
+        metrics["count"] = count
+        if res["ok"]:
+            return "PASSED", metrics
+        log_q.put(res["reason"])
+        return "FAILED", metrics
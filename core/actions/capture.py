@@ -0,0 +1,215 @@
+"""Host-side packet capture action."""
+import glob
+import os
+import queue
+import shutil
+import subprocess
+import time
+from typing import Tuple, Dict, Any, List
+
+from . import ActionHandler
+from ..local_process import run_local_command
+from ..metrics import StreamingSummary
+
+
+CAPTURE_DEFAULTS = {
+    # Ring-buffer mode: rotate at this size, keep this many files locally
+    "ring_filesize_kb": 100 * 1024,
+    "ring_files": 10,
+    # Stats bucket width for the live rates
+    "interval_s": 1.0,
+    # Per-interval rates kept in the final metrics (all feed the summaries)
+    "keep_intervals": 3600,
+}
+
+
+class _CaptureStats:
+    """
+    Buckets `frame.time_epoch<TAB>frame.len` lines into fixed intervals,
+    logging packets/s and bits/s as each interval closes.
+    """
+
+    def __init__(self, interval_s: float, keep: int, log_q: queue.Queue, on_interval=None):
+        self.interval_s = interval_s
+        self.keep = keep
+        self.log_q = log_q
+        self.on_interval = on_interval
+        self.start = None
+        self.bucket = 0
+        self.cur_packets = 0
+        self.cur_bytes = 0
+        self.packets = 0
+        self.bytes = 0
+        self.intervals: List[Dict[str, Any]] = []
+        self.pps = StreamingSummary()
+        self.bps = StreamingSummary()
+
+    def line(self, text: str):
+        parts = text.split("\t")
+        try:
+            ts, length = float(parts[0]), int(parts[1])
+        except (ValueError, IndexError):
+            if text.strip():
+                self.log_q.put(f"[tshark] {text}")
+            return
+        if self.start is None:
+            self.start = ts
+        bucket = max(0, int((ts - self.start) / self.interval_s))
+        while bucket > self.bucket:
+            self._close()
+        self.cur_packets += 1
+        self.cur_bytes += length
+        self.packets += 1
+        self.bytes += length
+
+    def _close(self):
+        pps = self.cur_packets / self.interval_s
+        bps = self.cur_bytes * 8 / self.interval_s
+        sample = {"t": round(self.bucket * self.interval_s, 3), "packets": self.cur_packets,
+                  "bytes": self.cur_bytes, "pps": pps, "bps": bps}
+        self.pps.add(pps)
+        self.bps.add(bps)
+        if len(self.intervals) < self.keep:
+            self.intervals.append(sample)
+        self.log_q.put(f"[tshark] t={sample['t']:.0f}s {pps:.0f} pkt/s {bps / 1e6:.2f} Mbit/s")
+        if self.on_interval is not None:
+            self.on_interval()
+        self.bucket += 1
+        self.cur_packets = 0
+        self.cur_bytes = 0
+
+    def finish(self) -> Dict[str, Any]:
+        if self.start is not None and (self.cur_packets or not self.intervals):
+            self._close()
+        out = {"packets": self.packets, "bytes": self.bytes, "intervals": self.intervals}
+        if self.pps.count:
+            out.update(self.pps.as_dict("pps_"))
+            out.update(self.bps.as_dict("bps_"))
+        return out
+
+
+def _ring_files(out_dir: str, stem: str) -> List[str]:
+    return sorted(glob.glob(os.path.join(out_dir, f"{stem}_*")))
+
+
+def _archive_closed(out_dir: str, stem: str, archive_dir: str, include_current: bool = False) -> List[str]:
+    """Move finished ring files (all but the newest, unless include_current) to archive_dir."""
+    files = _ring_files(out_dir, stem)
+    if not include_current:
+        files = files[:-1]
+    moved = []
+    for f in files:
+        dst = os.path.join(archive_dir, os.path.basename(f))
+        try:
+            shutil.move(f, dst)
+            moved.append(dst)
+        except OSError:
+            pass
+    return moved
+
+
+class TsharkCaptureAction(ActionHandler):
+    name = "tshark_capture"
+
+    def run(self, params: Dict[str, Any], tb_ctx: Dict[str, Any],
+            log_q: queue.Queue) -> Tuple[str, Dict[str, Any]]:
+        ring = any(params.get(k) for k in ("ring", "ring_filesize_kb", "ring_files", "archive_dir", "max_mb"))
+        if ring or params.get("stats"):
+            return self._run_streaming(params, tb_ctx, log_q, ring)
+
+        iface = params.get("iface") or params.get("interface") or "Wi-Fi"
+        duration = int(params.get("duration_s", 10))
+        outfile = params.get("outfile") or f"capture_{int(time.time())}.pcapng"
+        cap_filter = params.get("capture_filter")
+
+        cmd = ["tshark", "-i", str(iface), "-a", f"duration:{duration}", "-w", outfile]
+        if cap_filter:
+            cmd += ["-f", cap_filter]
+
+        log_q.put("Executing tshark: " + " ".join([str(x) for x in cmd]))
+        try:
+            proc = subprocess.run(cmd, capture_output=True, text=True)
+            log_q.put(proc.stdout)
+            if proc.returncode != 0:
+                log_q.put(proc.stderr)
+                return "FAILED", {"rc": proc.returncode}
+
+            ok = os.path.exists(outfile)
+            size = os.path.getsize(outfile) if ok else 0
+            return ("PASSED" if ok and size > 0 else "FAILED"), {"outfile": outfile, "size": size}
+        except Exception as e:
+            log_q.put(f"tshark failed: {e}")
+            return "FAILED", {"error": str(e)}
+
+    def _run_streaming(self, params: Dict[str, Any], tb_ctx: Dict[str, Any],
+                       log_q: queue.Queue, ring: bool) -> Tuple[str, Dict[str, Any]]:
+        """
+        Capture with live per-interval rates (-P -T fields on stdout while
+        writing the pcap). Ring mode (-b filesize/-b files) keeps at most
+        ring_files x ring_filesize_kb locally, or max_mb in total; with
+        archive_dir, finished files are moved there instead of deleted.
+        """
+        d = CAPTURE_DEFAULTS
+        iface = params.get("iface") or params.get("interface") or "Wi-Fi"
+        duration = int(params.get("duration_s", 10))
+        cap_filter = params.get("capture_filter")
+        archive_dir = params.get("archive_dir")
+
+        cmd = ["tshark", "-i", str(iface), "-a", f"duration:{duration}", "-l", "-P",
+               "-T", "fields", "-E", "separator=/t", "-e", "frame.time_epoch", "-e", "frame.len"]
+        if cap_filter:
+            cmd += ["-f", cap_filter]
+        if ring:
+            out_dir = params.get("out_dir") or f"capture_{int(time.time())}"
+            os.makedirs(out_dir, exist_ok=True)
+            if archive_dir:
+                os.makedirs(archive_dir, exist_ok=True)
+            stem = "capture"
+            filesize_kb = int(params.get("ring_filesize_kb", d["ring_filesize_kb"]))
+            files = int(params.get("ring_files", d["ring_files"]))
+            if params.get("max_mb"):
+                files = max(2, int(float(params["max_mb"]) * 1024 // filesize_kb))
+            outfile = os.path.join(out_dir, f"{stem}.pcapng")
+            cmd += ["-w", outfile, "-b", f"filesize:{filesize_kb}"]
+            # Archiving moves files away, so tshark must not delete them itself
+            if not archive_dir:
+                cmd += ["-b", f"files:{files}"]
+        else:
+            outfile = params.get("outfile") or f"capture_{int(time.time())}.pcapng"
+            cmd += ["-w", outfile]
+
+        archived: List[str] = []
+
+        def _rotate():
+            if ring and archive_dir:
+                archived.extend(_archive_closed(out_dir, stem, archive_dir))
+
+        stats = _CaptureStats(float(params.get("interval_s", d["interval_s"])),
+                              int(params.get("keep_intervals", d["keep_intervals"])), log_q, _rotate)
+        log_q.put("Executing tshark: " + " ".join(str(x) for x in cmd))
+        try:
+            res = run_local_command(cmd, log_q, timeout=duration + 30,
+                                    cancel_event=tb_ctx.get("cancel_event"), on_line=stats.line)
+        except Exception as e:
+            log_q.put(f"tshark failed: {e}")
+            return "FAILED", {"error": str(e)}
+
+        metrics = stats.finish()
+        metrics["rc"] = res["rc"]
+        if ring:
+            if archive_dir:
+                archived.extend(_archive_closed(out_dir, stem, archive_dir, include_current=True))
+                metrics["archived"] = archived
+                kept = archived
+            else:
+                kept = _ring_files(out_dir, stem)
+                metrics["files"] = kept
+            metrics["out_dir"] = archive_dir or out_dir
+        else:
+            kept = [outfile] if os.path.exists(outfile) else []
+            metrics["outfile"] = outfile
+        metrics["size"] = sum(os.path.getsize(f) for f in kept if os.path.exists(f))
+        log_q.put(f"[tshark] {metrics['packets']} packets, {metrics['bytes']} B captured; "
+                  f"{len(kept)} file(s), {metrics['size']} B on disk")
+        ok = res["rc"] == 0 and metrics["size"] > 0
+        return ("PASSED" if ok else "FAILED"), metrics
@@ -0,0 +1,88 @@
+"""iperf3 actions: host-side client and device-to-device pairs."""
+import json
+import queue
+import subprocess
+from typing import Tuple, Dict, Any
+
+from . import ActionHandler
+from ..iperf import IPERF_DEFAULTS, iperf_summary, run_iperf3_streaming
+from ..iperf_orchestrator import run_iperf_between_devices
+
+
+class Iperf3Action(ActionHandler):
+    name = "iperf3"
+
+    def run(self, params: Dict[str, Any], tb_ctx: Dict[str, Any],
+            log_q: queue.Queue) -> Tuple[str, Dict[str, Any]]:
+        target = (
+            params.get("target_ip") or
+            params.get("server_ip") or
+            tb_ctx.get("server_ip") or
+            tb_ctx.get("ap_ip")
+        )
+        if not target:
+            log_q.put("iperf3: 'target_ip' or 'server_ip' required")
+            return "FAILED", {"error": "missing target_ip"}
+
+        duration = int(params.get("duration_s", 10))
+        proto = str(params.get("protocol", "tcp")).lower()
+        reverse = bool(params.get("reverse", False))
+        parallel = int(params.get("parallel", 1))
+        bandwidth = params.get("bandwidth")
+        extra = params.get("extra_args", "")
+
+        stream = bool(params.get("stream", True))
+
+        cmd = ["iperf3", "-c", str(target), "-t", str(duration), "-P", str(parallel)]
+        if proto == "udp":
+            cmd.append("-u")
+            if bandwidth:
+                cmd += ["-b", str(bandwidth)]
+        if reverse:
+            cmd.append("-R")
+        if extra:
+            if isinstance(extra, list):
+                cmd += [str(x) for x in extra]
+            elif isinstance(extra, str):
+                cmd += extra.split()
+
+        timeout = duration + IPERF_DEFAULTS["timeout_margin_s"]
+        if stream:
+            log_q.put("Executing iperf3 (streaming): " + " ".join(cmd))
+            try:
+                rc, metrics, err = run_iperf3_streaming(
+                    cmd, proto, log_q, timeout, parallel=parallel, sink=tb_ctx.get("metrics_sink")
+                )
+            except Exception as e:
+                log_q.put(f"iperf3 failed: {e}")
+                return "FAILED", {"error": str(e)}
+            if rc != 0 or err:
+                metrics.update({"rc": rc, "error": err} if err else {"rc": rc})
+                return "FAILED", metrics
+            return "PASSED", metrics
+
+        cmd.append("-J")
+        log_q.put("Executing iperf3: " + " ".join(cmd))
+        try:
+            proc = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+            log_q.put(proc.stdout)
+            if proc.returncode != 0:
+                log_q.put(proc.stderr)
+                return "FAILED", {"rc": proc.returncode}
+
+            # Parse JSON summary
+            try:
+                return "PASSED", iperf_summary(json.loads(proc.stdout), proto)
+            except Exception:
+                return "PASSED", {}
+        except Exception as e:
+            log_q.put(f"iperf3 failed: {e}")
+            return "FAILED", {"error": str(e)}
+
+
+class IperfBetweenDevicesAction(ActionHandler):
+    name = "iperf_between_devices"
+
+    def run(self, params: Dict[str, Any], tb_ctx: Dict[str, Any],
+            log_q: queue.Queue) -> Tuple[str, Dict[str, Any]]:
+        return run_iperf_between_devices(params, tb_ctx, log_q)
@@ -0,0 +1,45 @@
+"""One-off SSH command action (explicit host/credentials, no device row)."""
+import queue
+from typing import Tuple, Dict, Any
+
+from . import ActionHandler
+from ..ssh_pool import load_paramiko
+
+
+class SshExecAction(ActionHandler):
+    name = "ssh_exec"
+
+    def run(self, params: Dict[str, Any], tb_ctx: Dict[str, Any],
+            log_q: queue.Queue) -> Tuple[str, Dict[str, Any]]:
+        paramiko = load_paramiko()
+        if paramiko is None:
+            log_q.put("Paramiko not installed. Run: pip install paramiko")
+            return "FAILED", {"error": "paramiko_not_installed"}
+
+        host = params.get("host") or tb_ctx.get("ap_ip") or tb_ctx.get("sta_ip")
+        username = params.get("username") or "root"
+        password = params.get("password")
+        port = int(params.get("port", 22))
+        command = params.get("command")
+
+        if not host or not command:
+            log_q.put("ssh_exec requires 'host' and 'command'")
+            return "FAILED", {"error": "missing host/command"}
+
+        try:
+            client = paramiko.SSHClient()
+            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            client.connect(hostname=host, port=port, username=username, password=password, timeout=20)
+            stdin, stdout, stderr = client.exec_command(command)
+            out = stdout.read().decode("utf-8", errors="ignore")
+            err = stderr.read().decode("utf-8", errors="ignore")
+            rc = stdout.channel.recv_exit_status()
+            if out:
+                log_q.put(out)
+            if err:
+                log_q.put(err)
+            client.close()
+            return ("PASSED" if rc == 0 else "FAILED"), {"rc": rc}
+        except Exception as e:
+            log_q.put(f"ssh_exec failed: {e}")
+            return "FAILED", {"error": str(e)}
@@ -0,0 +1,394 @@
+"""Minimal adb host-protocol client (talks to the adb server on TCP 5037)."""
+import atexit
+import os
+import re
+import shutil
+import socket
+import struct
+import subprocess
+import threading
+import time
+import uuid
+from typing import Tuple, Dict, List, Optional
+
+
+ADB_DEFAULTS = {
+    "host": "127.0.0.1",
+    "port": 5037,
+    "connect_timeout": 5,
+    "sync_idle_timeout": 60,
+}
+
+# Sync protocol transfers are capped at 64 KiB per DATA packet
+_SYNC_MAX_CHUNK = 64 * 1024
+
+# shell,v2 packet ids
+_V2_STDIN, _V2_STDOUT, _V2_STDERR, _V2_EXIT, _V2_CLOSE_STDIN = 0, 1, 2, 3, 4
+
+
+class AdbError(Exception):
+    """Raised for FAIL replies and protocol/transport errors."""
+
+
+class AdbCommandFailed(AdbError):
+    """The server/device answered FAIL (as opposed to a transport error)."""
+
+
+def _until(sock: socket.socket, deadline: float | None):
+    """Shrink the socket timeout to what is left before deadline (socket.timeout once it has passed)."""
+    if deadline is None:
+        return
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise socket.timeout("deadline reached")
+    sock.settimeout(left)
+
+
+def _recv_exact(sock: socket.socket, n: int, deadline: float | None = None) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        _until(sock, deadline)
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise AdbError("connection closed by adb server")
+        buf += chunk
+    return bytes(buf)
+
+
+class _SyncConnection:
+    """An open `sync:` service socket; reusable for many pulls/pushes."""
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.last_used = time.time()
+
+    def _send(self, cmd: bytes, payload: bytes = b""):
+        self.sock.sendall(cmd + struct.pack("<I", len(payload)) + payload)
+
+    def _recv_header(self) -> Tuple[bytes, int]:
+        hdr = _recv_exact(self.sock, 8)
+        return hdr[:4], struct.unpack("<I", hdr[4:])[0]
+
+    def pull(self, remote: str, fileobj) -> int:
+        self._send(b"RECV", remote.encode("utf-8"))
+        total = 0
+        while True:
+            cmd, n = self._recv_header()
+            if cmd == b"DATA":
+                fileobj.write(_recv_exact(self.sock, n))
+                total += n
+            elif cmd == b"DONE":
+                return total
+            elif cmd == b"FAIL":
+                raise AdbCommandFailed(_recv_exact(self.sock, n).decode("utf-8", errors="ignore"))
+            else:
+                raise AdbError(f"unexpected sync reply {cmd!r}")
+
+    def push(self, data: bytes, remote: str, mode: int = 0o644) -> int:
+        self._send(b"SEND", f"{remote},{mode}".encode("utf-8"))
+        view = memoryview(data)
+        for pos in range(0, len(data), _SYNC_MAX_CHUNK):
+            self._send(b"DATA", bytes(view[pos:pos + _SYNC_MAX_CHUNK]))
+        self.sock.sendall(b"DONE" + struct.pack("<I", int(time.time())))
+        cmd, n = self._recv_header()
+        if cmd == b"FAIL":
+            raise AdbCommandFailed(_recv_exact(self.sock, n).decode("utf-8", errors="ignore"))
+        if cmd != b"OKAY":
+            raise AdbError(f"unexpected sync reply {cmd!r}")
+        return len(data)
+
+    def close(self):
+        try:
+            self._send(b"QUIT")
+        except Exception:
+            pass
+        try:
+            self.sock.close()
+        except Exception:
+            pass
+
+
+class AdbClient:
+    """
+    Speaks the adb host protocol directly instead of forking `adb` per call.
+    Host queries and shells use a fresh loopback socket each (the server
+    closes them when the service ends); sync sessions are kept and reused
+    per device serial.
+    """
+
+    def __init__(self, host: str | None = None, port: int | None = None,
+                 connect_timeout: float = ADB_DEFAULTS["connect_timeout"]):
+        self.host = host or os.environ.get("ADB_SERVER_HOST") or ADB_DEFAULTS["host"]
+        self.port = int(port or os.environ.get("ANDROID_ADB_SERVER_PORT") or ADB_DEFAULTS["port"])
+        self.connect_timeout = connect_timeout
+        self._lock = threading.Lock()
+        self._sync_pool: Dict[str, List[_SyncConnection]] = {}
+        self._features: Dict[str, set] = {}
+        self._server_start_tried = False
+
+    # -- low level ---------------------------------------------------------
+
+    def _connect(self) -> socket.socket:
+        try:
+            return socket.create_connection((self.host, self.port), timeout=self.connect_timeout)
+        except ConnectionRefusedError:
+            # Same behaviour as the adb binary: start a local server on demand
+            if self._server_start_tried or self.host not in ("127.0.0.1", "localhost") or not shutil.which("adb"):
+                raise AdbError(f"adb server not reachable at {self.host}:{self.port}")
+            self._server_start_tried = True
+            subprocess.run(["adb", "-P", str(self.port), "start-server"], capture_output=True, timeout=30)
+            return socket.create_connection((self.host, self.port), timeout=self.connect_timeout)
+        except OSError as e:
+            raise AdbError(f"adb server not reachable at {self.host}:{self.port}: {e}")
+
+    @staticmethod
+    def _send_request(sock: socket.socket, payload: str):
+        data = payload.encode("utf-8")
+        sock.sendall(b"%04x" % len(data) + data)
+
+    @staticmethod
+    def _read_status(sock: socket.socket):
+        status = _recv_exact(sock, 4)
+        if status == b"OKAY":
+            return
+        if status == b"FAIL":
+            n = int(_recv_exact(sock, 4), 16)
+            raise AdbCommandFailed(_recv_exact(sock, n).decode("utf-8", errors="ignore"))
+        raise AdbError(f"unexpected adb reply {status!r}")
+
+    def _host_query(self, request: str) -> str:
+        """host:* request that answers with one length-prefixed payload."""
+        sock = self._connect()
+        try:
+            self._send_request(sock, request)
+            self._read_status(sock)
+            n = int(_recv_exact(sock, 4), 16)
+            return _recv_exact(sock, n).decode("utf-8", errors="ignore")
+        finally:
+            sock.close()
+
+    def _open_service(self, serial: str | None, service: str, timeout: float | None = None) -> socket.socket:
+        """Switch a new socket to the device transport and open a service on it."""
+        sock = self._connect()
+        try:
+            sock.settimeout(timeout)
+            self._send_request(sock, f"host:transport:{serial}" if serial else "host:transport-any")
+            self._read_status(sock)
+            self._send_request(sock, service)
+            self._read_status(sock)
+            return sock
+        except Exception:
+            sock.close()
+            raise
+
+    # -- host services -----------------------------------------------------
+
+    def devices(self) -> List[Dict[str, str]]:
+        """`adb devices -l` equivalent: [{'serial', 'state', 'model', ...}]."""
+        out = []
+        for line in self._host_query("host:devices-l").splitlines():
+            parts = line.split()
+            if len(parts) < 2:
+                continue
+            entry = {"serial": parts[0], "state": parts[1]}
+            for kv in parts[2:]:
+                k, _, v = kv.partition(":")
+                if v:
+                    entry[k] = v
+            out.append(entry)
+        return out
+
+    def get_state(self, serial: str) -> str:
+        return self._host_query(f"host-serial:{serial}:get-state").strip()
+
+    def features(self, serial: str | None) -> set:
+        key = serial or ""
+        with self._lock:
+            cached = self._features.get(key)
+        if cached is not None:
+            return cached
+        try:
+            req = f"host-serial:{serial}:features" if serial else "host:features"
+            feats = set(self._host_query(req).strip().split(","))
+        except (AdbError, OSError):
+            # Not cached: the server may just not be up yet
+            return set()
+        with self._lock:
+            self._features[key] = feats
+        return feats
+
+    # -- shell -------------------------------------------------------------
+
+    def shell(self, serial: str | None, command: str, timeout: float = 60,
+              stdin: bytes | None = None) -> Tuple[int, str, str]:
+        """Run a command; returns (rc, stdout, stderr). Uses shell v2 when supported."""
+        if "shell_v2" in self.features(serial):
+            return self._shell_v2(serial, command, timeout, stdin)
+        if stdin is not None:
+            raise AdbError("device has no shell_v2; stdin is not supported")
+        return self._shell_legacy(serial, command, timeout)
+
+    def open_shell_stream(self, serial: str | None, command: str) -> socket.socket:
+        """
+        Raw `shell:` socket for long-running output (logcat, dmesg -w).
+        stdout/stderr arrive merged; the caller reads and closes it.
+        """
+        return self._open_service(serial, f"shell:{command}", None)
+
+    def _shell_v2(self, serial, command, timeout, stdin) -> Tuple[int, str, str]:
+        deadline = time.monotonic() + timeout if timeout else None
+        sock = self._open_service(serial, f"shell,v2,raw:{command}", timeout)
+        out, err, rc = bytearray(), bytearray(), 127
+        timed_out = False
+        try:
+            if stdin is not None:
+                view = memoryview(stdin)
+                for pos in range(0, len(stdin), _SYNC_MAX_CHUNK):
+                    part = bytes(view[pos:pos + _SYNC_MAX_CHUNK])
+                    _until(sock, deadline)
+                    sock.sendall(struct.pack("<BI", _V2_STDIN, len(part)) + part)
+                sock.sendall(struct.pack("<BI", _V2_CLOSE_STDIN, 0))
+            while True:
+                try:
+                    hdr = _recv_exact(sock, 5, deadline)
+                except AdbError:
+                    break
+                pid, n = struct.unpack("<BI", hdr)
+                data = _recv_exact(sock, n, deadline) if n else b""
+                if pid == _V2_STDOUT:
+                    out += data
+                elif pid == _V2_STDERR:
+                    err += data
+                elif pid == _V2_EXIT:
+                    rc = data[0] if data else 0
+                    break
+        except socket.timeout:
+            timed_out = True
+        finally:
+            sock.close()
+        stdout, stderr = out.decode("utf-8", errors="ignore"), err.decode("utf-8", errors="ignore")
+        if timed_out:
+            # The timeout bounds the whole call; keep what the command printed so far
+            sep = "\n" if stderr and not stderr.endswith("\n") else ""
+            return 124, stdout, f"{stderr}{sep}adb shell timeout after {timeout}s"
+        return rc, stdout, stderr
+
+    def _shell_legacy(self, serial, command, timeout) -> Tuple[int, str, str]:
+        """Old adbd: merged stdout/stderr over a pty; rc recovered from a marker."""
+        nonce = uuid.uuid4().hex[:12]
+        # Subshell so an `exit` in the command still reaches the marker
+        wrapped = f"( {command}\n); printf '__TRIG_ADBRC_%s__ %d\\n' {nonce} $?"
+        deadline = time.monotonic() + timeout if timeout else None
+        sock = self._open_service(serial, f"shell:{wrapped}", timeout)
+        buf = bytearray()
+        timed_out = False
+        try:
+            while True:
+                _until(sock, deadline)
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                buf += chunk
+        except socket.timeout:
+            timed_out = True
+        finally:
+            sock.close()
+        text = buf.decode("utf-8", errors="ignore").replace("\r\n", "\n")
+        if timed_out:
+            return 124, text, f"adb shell timeout after {timeout}s"
+        m = re.search(rf"__TRIG_ADBRC_{nonce}__ (\d+)\n?", text)
+        if not m:
+            return 127, text, "adb shell ended without exit status"
+        return int(m.group(1)), text[:m.start()], ""
+
+    # -- sync (file transfer) ----------------------------------------------
+
+    def _sync_acquire(self, serial: str | None, fresh: bool = False) -> Tuple[_SyncConnection, bool]:
+        """Returns (connection, reused); fresh=True skips the pool."""
+        key = serial or ""
+        now = time.time()
+        with self._lock:
+            pool = self._sync_pool.get(key, [])
+            while pool and not fresh:
+                conn = pool.pop()
+                if now - conn.last_used < ADB_DEFAULTS["sync_idle_timeout"]:
+                    return conn, True
+                conn.close()
+        return _SyncConnection(self._open_service(serial, "sync:", timeout=120)), False
+
+    def _sync_release(self, serial: str | None, conn: _SyncConnection):
+        conn.last_used = time.time()
+        with self._lock:
+            self._sync_pool.setdefault(serial or "", []).append(conn)
+
+    def _with_sync(self, serial: str | None, fn):
+        """
+        Run fn(conn) on a pooled sync connection. adbd closes the sync
+        service after a FAIL, so the connection is dropped on any error; a
+        transport error on a reused (possibly stale) connection is retried
+        once on a fresh one, so fn must be safe to repeat.
+        """
+        conn, reused = self._sync_acquire(serial)
+        try:
+            result = fn(conn)
+        except AdbCommandFailed:
+            conn.close()
+            raise
+        except (AdbError, OSError):
+            conn.close()
+            if not reused:
+                raise
+            conn, _ = self._sync_acquire(serial, fresh=True)
+            try:
+                result = fn(conn)
+            except Exception:
+                conn.close()
+                raise
+        except Exception:
+            conn.close()
+            raise
+        self._sync_release(serial, conn)
+        return result
+
+    def pull(self, serial: str | None, remote: str, local_path: str) -> int:
+        """Copy a device file to local_path. Returns bytes transferred."""
+        tmp = local_path + ".part"
+        try:
+            with open(tmp, "wb") as f:
+                def _pull(c):
+                    # Restart from scratch if a stale connection is retried
+                    f.seek(0)
+                    f.truncate()
+                    return c.pull(remote, f)
+                n = self._with_sync(serial, _pull)
+            os.replace(tmp, local_path)
+            return n
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def push(self, serial: str | None, data: bytes, remote: str, mode: int = 0o644) -> int:
+        """Write bytes to a device path. Returns bytes transferred."""
+        return self._with_sync(serial, lambda c: c.push(data, remote, mode))
+
+    def close(self):
+        with self._lock:
+            pools = list(self._sync_pool.values())
+            self._sync_pool.clear()
+        for pool in pools:
+            for conn in pool:
+                conn.close()
+
+
+_CLIENT: Optional[AdbClient] = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def get_adb_client() -> AdbClient:
+    """Return the process-wide adb client."""
+    global _CLIENT
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            _CLIENT = AdbClient()
+            atexit.register(_CLIENT.close)
+        return _CLIENT
@@ -0,0 +1,173 @@
+"""Safe, compiled assertion expressions over action metrics (the assert_expr node)."""
+import ast
+import hashlib
+import threading
+from typing import Tuple, Dict, Any, List, Iterable
+
+from .node_graph import register_node_handler
+
+
+_ALLOWED_NODES = (
+    ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.USub, ast.UAdd,
+    ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+    ast.Compare, ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.In, ast.NotIn,
+    ast.Is, ast.IsNot, ast.IfExp, ast.Name, ast.Load, ast.Constant, ast.Subscript,
+    ast.Attribute, ast.Call, ast.Tuple, ast.List,
+)
+
+_FUNCTIONS = {
+    "abs": abs,
+    "min": min,
+    "max": max,
+    "len": len,
+    "round": round,
+    "all": all,
+    "any": any,
+    "sum": sum,
+    "float": float,
+    "int": int,
+}
+
+
+class ExprError(ValueError):
+    """The expression is not valid or uses something outside the whitelist."""
+
+
+class _DottedToSubscript(ast.NodeTransformer):
+    """Rewrite `total.bps` to `total["bps"]` so evaluation never calls getattr."""
+
+    def visit_Attribute(self, node):
+        self.generic_visit(node)
+        return ast.copy_location(
+            ast.Subscript(value=node.value, slice=ast.Constant(node.attr), ctx=ast.Load()), node
+        )
+
+
+class _Namespace(dict):
+    """Metric lookups: a missing name is None instead of a NameError."""
+
+    def __missing__(self, key):
+        return _FUNCTIONS.get(key)
+
+
+class CompiledExpr:
+    """An assertion parsed, checked and compiled once; evaluate() only runs bytecode."""
+
+    def __init__(self, source: str):
+        self.source = source
+        try:
+            tree = ast.parse(source.strip(), mode="eval")
+        except SyntaxError as e:
+            raise ExprError(f"syntax error in {source!r}: {e.msg}")
+        for node in ast.walk(tree):
+            if not isinstance(node, _ALLOWED_NODES):
+                raise ExprError(f"{type(node).__name__} is not allowed in assertions")
+            if isinstance(node, ast.Attribute) and node.attr.startswith("_"):
+                raise ExprError(f"attribute {node.attr!r} is not allowed")
+            if isinstance(node, ast.Call):
+                if not isinstance(node.func, ast.Name) or node.func.id not in _FUNCTIONS or node.keywords:
+                    raise ExprError("only simple calls to " + ", ".join(sorted(_FUNCTIONS)) + " are allowed")
+            if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float, str, bool, type(None))):
+                raise ExprError(f"constant {node.value!r} is not allowed")
+        tree = ast.fix_missing_locations(_DottedToSubscript().visit(tree))
+        self.names = sorted({n.id for n in ast.walk(tree) if isinstance(n, ast.Name)} - set(_FUNCTIONS))
+        self._code = compile(tree, "<assert_expr>", "eval")
+
+    def _eval(self, metrics: Dict[str, Any]):
+        ns = _Namespace(metrics or {})
+        return eval(self._code, {"__builtins__": {}, **_FUNCTIONS}, ns)
+
+    def evaluate(self, metrics: Dict[str, Any]) -> Tuple[bool, str]:
+        """(passed, error). A missing metric or type error counts as not passed."""
+        try:
+            return bool(self._eval(metrics)), ""
+        except Exception as e:
+            return False, f"{type(e).__name__}: {e}"
+
+    def evaluate_column(self, rows: Iterable[Dict[str, Any]]) -> List[bool]:
+        """Evaluate against every row of a result column with the same compiled code."""
+        code, glb = self._code, {"__builtins__": {}, **_FUNCTIONS}
+        out = []
+        for row in rows:
+            try:
+                out.append(bool(eval(code, glb, _Namespace(row or {}))))
+            except Exception:
+                out.append(False)
+        return out
+
+
+_CACHE: Dict[str, CompiledExpr] = {}
+_CACHE_LOCK = threading.Lock()
+
+
+def compile_expr(source: str) -> CompiledExpr:
+    """Compile an assertion, reusing an earlier compilation of the same source."""
+    key = hashlib.sha256(source.strip().encode("utf-8")).hexdigest()
+    with _CACHE_LOCK:
+        hit = _CACHE.get(key)
+    if hit is not None:
+        return hit
+    compiled = CompiledExpr(source)
+    with _CACHE_LOCK:
+        return _CACHE.setdefault(key, compiled)
+
+
+def flat_metrics(metrics: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Names an assertion can see: a node-graph result's per-node metrics are
+    merged (later nodes win) and every node is also reachable by its id.
+    """
+    metrics = metrics or {}
+    if not isinstance(metrics.get("nodes"), dict):
+        return metrics
+    flat: Dict[str, Any] = {}
+    for nid, res in metrics["nodes"].items():
+        m = (res or {}).get("metrics") or {}
+        flat.update(m)
+        flat[nid] = dict(m, status=(res or {}).get("status"))
+    return flat
+
+
+def run_assert_expr(node: Dict[str, Any], ctx: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """
+    params: expr, optional "over" (node id; defaults to this node's
+    dependencies) and "require" ("all" | "any") for iteration results.
+    If the target holds iteration results, the expression is evaluated
+    over that column; otherwise against the merged dependency metrics.
+    """
+    p = node.get("params") or {}
+    log_q = ctx["log_q"]
+    try:
+        expr = compile_expr(str(p.get("expr") or ""))
+    except ExprError as e:
+        return "FAILED", {"error": str(e)}
+
+    over = p.get("over")
+    sources = [over] if over else list(node.get("depends_on") or [])
+    merged: Dict[str, Any] = {}
+    for sid in sources:
+        res = ctx["results"].get(sid) or {}
+        m = res.get("metrics") or {}
+        if isinstance(m.get("results"), list):
+            rows = [dict(r.get("metrics") or {}, **(r.get("vars") or {})) for r in m["results"]]
+            verdicts = expr.evaluate_column(rows)
+            passed = sum(verdicts)
+            need_all = (p.get("require") or "all") == "all"
+            ok = bool(verdicts) and (all(verdicts) if need_all else any(verdicts))
+            failed_at = [r.get("iteration") for r, v in zip(m["results"], verdicts) if not v][:20]
+            log_q.put(f"[assert] {expr.source}: {passed}/{len(verdicts)} iterations passed")
+            return ("PASSED" if ok else "FAILED"), {
+                "expr": expr.source, "rows": len(verdicts), "passed": passed, "failed_iterations": failed_at,
+            }
+        merged.update(flat_metrics(m))
+        merged[sid] = dict(m)
+
+    ok, err = expr.evaluate(merged)
+    log_q.put(f"[assert] {expr.source}: {'PASS' if ok else 'FAIL'}" + (f" ({err})" if err else ""))
+    out = {"expr": expr.source, "values": {n: merged.get(n) for n in expr.names if not isinstance(merged.get(n), dict)}}
+    if err:
+        out["error"] = err
+    return ("PASSED" if ok else "FAILED"), out
+
+
+register_node_handler("assert_expr", run_assert_expr)
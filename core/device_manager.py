@@ -1,53 +1,175 @@
 """Device reachability checking module."""
-import subprocess
-import platform
+import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Tuple, Dict, Any
 
-try:
-    import paramiko
-except ImportError:
-    paramiko = None
-
 try:
     import serial
     from serial.tools import list_ports
 except ImportError:
     serial = None
+    list_ports = None
 
-import shutil
+try:
+    import pyudev
+except ImportError:
+    pyudev = None
 
-from ..database import db_query
-from ..utils import json_or_empty
+from database import db_query
+from config import REACHABILITY_DEFAULTS
+from utils import json_or_empty, TTLCache
+from .serial_console import is_console_open
+from .adb_client import get_adb_client, AdbCommandFailed
+from .probe_engine import get_probe_engine, PROBE_DEFAULTS
 
 
 def probe_ip_once(ip: str) -> Tuple[bool, str]:
-    """
-    Ping an IP once with short timeout.
-    Windows vs POSIX flags handled.
-    """
+    """Probe an IP once (ICMP echo, TCP connect fallback) with short timeout."""
     ip = (ip or "").strip()
     if not ip:
         return False, "ip not set"
     
     try:
-        is_windows = platform.system().lower().startswith("win")
-        cmd = ["ping", "-n" if is_windows else "-c", "1"]
-        if is_windows:
-            cmd += ["-w", "2000"]
-        else:
-            cmd += ["-W", "2"]
-        cmd.append(ip)
-        
-        proc = subprocess.run(cmd, capture_output=True, text=True, timeout=5)
-        if proc.returncode == 0:
-            return True, "ip ok"
-        
-        reason = (proc.stdout or proc.stderr or "").strip().splitlines()
-        reason = ("; ".join(reason[:3])) if reason else f"ip rc={proc.returncode}"
-        return False, reason
+        res = get_probe_engine().probe(ip, timeout=PROBE_DEFAULTS["timeout_s"])
     except Exception as e:
         return False, f"ip error: {e}"
+    if res["ok"]:
+        return True, "ip ok"
+    return False, res["reason"]
+
+
+def probe_ips(ips) -> Dict[str, Tuple[bool, str]]:
+    """Probe many IPs in one shared timeout window. Returns {ip: (ok, reason)}."""
+    try:
+        results = get_probe_engine().probe_many(ips, timeout=PROBE_DEFAULTS["timeout_s"])
+    except Exception as e:
+        return {ip: (False, f"ip error: {e}") for ip in ips}
+    return {
+        ip: (True, "ip ok") if res["ok"] else (False, res["reason"])
+        for ip, res in results.items()
+    }
+
+
+class DeviceEnumeration:
+    """
+    Short-lived snapshots of host-side enumeration: the serial port list
+    (`comports()`) and the adb server's device list. Every probe within
+    the TTL reads the same snapshot, and concurrent callers wait for a
+    single refresh instead of each enumerating. With pyudev available,
+    tty/usb hotplug events invalidate the snapshots, so the serial port
+    list can be kept much longer.
+    """
+    
+    def __init__(self, ttl: float = REACHABILITY_DEFAULTS["enum_ttl_s"],
+                 watch_ttl: float = REACHABILITY_DEFAULTS["enum_watch_ttl_s"]):
+        self.ttl = float(ttl)
+        self.watch_ttl = float(watch_ttl)
+        self._caches = {"com": TTLCache(ttl), "adb": TTLCache(ttl)}
+        self._locks = {"com": threading.Lock(), "adb": threading.Lock()}
+        self._loaders = {"com": self._list_com_ports, "adb": self._list_adb_devices}
+        self._observer = None
+        self._watch_lock = threading.Lock()
+    
+    @staticmethod
+    def _list_com_ports():
+        if list_ports is None:
+            return None
+        return frozenset(p.device for p in list_ports.comports())
+    
+    @staticmethod
+    def _list_adb_devices():
+        return tuple(get_adb_client().devices())
+    
+    def _snapshot(self, kind: str, refresh: bool):
+        cache = self._caches[kind]
+        if not refresh:
+            hit = cache.get(kind)
+            if hit is not None:
+                return hit
+        with self._locks[kind]:
+            # Someone else may have refreshed while we waited
+            hit = None if refresh else cache.get(kind)
+            if hit is None:
+                try:
+                    hit = (self._loaders[kind](), None)
+                except Exception as e:
+                    hit = (None, str(e))
+                cache.set(kind, hit)
+        return hit
+    
+    def com_ports(self, refresh: bool = False):
+        """Set of enumerated serial port paths, or None if enumeration is unavailable."""
+        ports, _err = self._snapshot("com", refresh)
+        return ports
+    
+    def adb_devices(self, refresh: bool = False) -> Tuple[tuple, str | None]:
+        """(device entries, error). Entries as returned by AdbClient.devices()."""
+        entries, err = self._snapshot("adb", refresh)
+        return entries or (), err
+    
+    def invalidate(self, kind: str | None = None):
+        for k in ([kind] if kind else list(self._caches)):
+            self._caches[k].clear()
+    
+    # -- hotplug watch -----------------------------------------------------
+    
+    @property
+    def watching(self) -> bool:
+        return self._observer is not None
+    
+    def start_watch(self) -> bool:
+        """Invalidate on udev tty/usb events (Linux + pyudev). Returns True if active."""
+        if pyudev is None:
+            return False
+        with self._watch_lock:
+            if self._observer is not None:
+                return True
+            try:
+                monitor = pyudev.Monitor.from_netlink(pyudev.Context())
+                monitor.filter_by("tty")
+                monitor.filter_by("usb")
+                observer = pyudev.MonitorObserver(monitor, callback=self._on_udev_event, name="testrig-udev")
+                observer.daemon = True
+                observer.start()
+            except Exception:
+                return False
+            self._observer = observer
+            # adb also tracks network devices, which udev never reports
+            self._caches["com"].ttl = self.watch_ttl
+        return True
+    
+    def stop_watch(self):
+        with self._watch_lock:
+            observer, self._observer = self._observer, None
+            self._caches["com"].ttl = self.ttl
+        if observer is not None:
+            try:
+                observer.stop()
+            except Exception:
+                pass
+    
+    def _on_udev_event(self, device):
+        if device.subsystem == "tty":
+            self.invalidate("com")
+        else:
+            self.invalidate()
+
+
+_ENUMERATION = None
+_ENUMERATION_LOCK = threading.Lock()
+
+
+def get_device_enumeration() -> DeviceEnumeration:
+    """Return the process-wide enumeration snapshot service."""
+    global _ENUMERATION
+    with _ENUMERATION_LOCK:
+        if _ENUMERATION is None:
+            _ENUMERATION = DeviceEnumeration()
+            if REACHABILITY_DEFAULTS.get("enum_watch"):
+                _ENUMERATION.start_watch()
+        return _ENUMERATION
 
 
 def probe_com_once(port: str, baud: int | None = None) -> Tuple[bool, str]:
@@ -56,13 +178,13 @@ def probe_com_once(port: str, baud: int | None = None) -> Tuple[bool, str]:
     if not port:
         return False, "com not set"
     
-    try:
-        if serial and hasattr(serial.tools, 'list_ports'):
-            ports = [p.device for p in list_ports.comports()]
-            if port not in ports:
-                return False, "com not present"
-    except Exception:
-        pass
+    # A live console session already proves the port works; don't reopen it
+    if is_console_open(port):
+        return True, "com ok (session open)"
+    
+    ports = get_device_enumeration().com_ports()
+    if ports is not None and port not in ports and os.path.realpath(port) not in ports:
+        return False, "com not present"
     
     try:
         if serial is None:
@@ -84,49 +206,47 @@ def probe_com_once(port: str, baud: int | None = None) -> Tuple[bool, str]:
 
 
 def probe_adb_once(adb_id: str) -> Tuple[bool, str]:
-    """ADB reachability: ensure adb exists and device is 'device' state."""
+    """ADB reachability: device is in 'device' state on the adb server."""
     adb_id = (adb_id or "").strip()
     if not adb_id:
         return False, "adb not set"
     
+    entries, err = get_device_enumeration().adb_devices()
+    if err:
+        return False, f"adb error: {err}"
+    
+    # Serial may be listed under a transport id / usb path alias
+    for entry in entries:
+        if adb_id in (entry.get("serial"), entry.get("usb"), entry.get("transport_id")):
+            if entry.get("state") == "device":
+                return True, "adb ok"
+            return False, f"adb state: {entry.get('state') or 'adb not device'}"
+    
+    # Not in the listing: let the server resolve it (e.g. host:port aliases)
     try:
-        if not shutil.which("adb"):
-            return False, "adb not found"
-        
-        proc = subprocess.run(
-            ["adb", "-s", adb_id, "get-state"],
-            capture_output=True,
-            text=True,
-            timeout=8
-        )
-        out = (proc.stdout or "").strip().lower()
-        if proc.returncode == 0 and "device" in out:
-            return True, "adb ok"
-        
-        # Fallback: parse 'adb devices'
-        proc2 = subprocess.run(
-            ["adb", "devices", "-l"],
-            capture_output=True,
-            text=True,
-            timeout=8
-        )
-        ok = any(
-            (adb_id in ln and "device" in ln.lower() and "offline" not in ln.lower())
-            for ln in (proc2.stdout or "").splitlines()
-        )
-        if ok:
-            return True, "adb ok (devices -l)"
-        
-        reason = out or (proc.stderr or "").strip() or "adb not device"
-        return False, f"adb state: {reason} rc={proc.returncode}"
+        state = get_adb_client().get_state(adb_id)
+    except AdbCommandFailed as e:
+        state = str(e)
     except Exception as e:
         return False, f"adb error: {e}"
+    if state == "device":
+        return True, "adb ok"
+    return False, f"adb state: {state or 'adb not device'}"
 
 
-def device_reachability_status(dev_row: dict) -> Tuple[bool, dict]:
+# Shared reachability state: per-endpoint probe results and per-device
+# summaries. Replaces ad-hoc per-page dicts; the Testbeds page renders from it.
+_ENDPOINT_CACHE = TTLCache(REACHABILITY_DEFAULTS["cache_ttl_s"])
+REACHABILITY_CACHE = TTLCache(REACHABILITY_DEFAULTS["cache_ttl_s"])
+
+_ENDPOINT_LABELS = ("ip_mgmt", "ip_traffic", "com", "adb")
+
+
+def _device_endpoints(dev_row: dict) -> Dict[str, Tuple | None]:
     """
-    Check device reachability across configured endpoints.
-    Returns (overall_ok, {endpoint: (ok, reason)}).
+    Map each endpoint label to a hashable probe key, or None if not set.
+    Identical keys across devices (shared console server, same IP) are
+    probed once per sweep.
     """
     extra = json_or_empty(dev_row.get("extra_json") or "{}")
     
@@ -136,38 +256,33 @@ def device_reachability_status(dev_row: dict) -> Tuple[bool, dict]:
     adb = (extra.get("adb_serial") or extra.get("adb_id") or "").strip()
     baud = extra.get("baud", 115200)
     
-    configured = 0
+    return {
+        "ip_mgmt": ("ip", ip_mgmt) if ip_mgmt else None,
+        "ip_traffic": ("ip", ip_traffic) if ip_traffic else None,
+        "com": ("com", com, baud) if com else None,
+        "adb": ("adb", adb) if adb else None,
+    }
+
+
+def _probe_endpoint(key: Tuple) -> Tuple[bool, str]:
+    kind = key[0]
+    if kind == "ip":
+        return probe_ip_once(key[1])
+    if kind == "com":
+        return probe_com_once(key[1], key[2])
+    if kind == "adb":
+        return probe_adb_once(key[1])
+    return False, f"unknown endpoint {kind}"
+
+
+def _status_from_probes(endpoints: Dict[str, Tuple | None], probed: Dict[Tuple, Tuple[bool, str]]) -> Tuple[bool, dict]:
+    """Fold endpoint probe results into (overall_ok, {label: (ok, reason)})."""
     results: dict[str, Tuple[bool, str]] = {}
+    for label in _ENDPOINT_LABELS:
+        key = endpoints.get(label)
+        results[label] = probed[key] if key else (False, "not set")
     
-    if ip_mgmt:
-        configured += 1
-        ok, msg = probe_ip_once(ip_mgmt)
-        results["ip_mgmt"] = (ok, msg)
-    else:
-        results["ip_mgmt"] = (False, "not set")
-    
-    if ip_traffic:
-        configured += 1
-        ok, msg = probe_ip_once(ip_traffic)
-        results["ip_traffic"] = (ok, msg)
-    else:
-        results["ip_traffic"] = (False, "not set")
-    
-    if com:
-        configured += 1
-        ok, msg = probe_com_once(com, baud)
-        results["com"] = (ok, msg)
-    else:
-        results["com"] = (False, "not set")
-    
-    if adb:
-        configured += 1
-        ok, msg = probe_adb_once(adb)
-        results["adb"] = (ok, msg)
-    else:
-        results["adb"] = (False, "not set")
-    
-    if configured == 0:
+    if not any(endpoints.values()):
         return False, results
     
     overall_ok = True
@@ -180,13 +295,7 @@ def device_reachability_status(dev_row: dict) -> Tuple[bool, dict]:
     return overall_ok, results
 
 
-def device_reachability_summary(dev_row: dict) -> Tuple[bool, str]:
-    """Get a human-readable reachability summary."""
-    try:
-        ok, details = device_reachability_status(dev_row)
-    except Exception as e:
-        return False, f"error: {e}"
-    
+def _summarize(ok: bool, details: dict) -> str:
     def _fmt(label, tup):
         if not tup:
             return None
@@ -196,18 +305,48 @@ def device_reachability_summary(dev_row: dict) -> Tuple[bool, str]:
         return f"{label}:{'ok' if sub_ok else reason}"
     
     parts = []
-    for label in ("ip_mgmt", "ip_traffic", "com", "adb"):
+    for label in _ENDPOINT_LABELS:
         p = _fmt(label, details.get(label))
         if p:
             parts.append(p)
     
     if not parts:
-        return ok, "no checks configured"
+        return "no checks configured"
     if len(parts) > 2:
-        summary = "; ".join(parts[:2]) + f"; +{len(parts)-2} more"
-    else:
-        summary = "; ".join(parts)
-    return ok, summary
+        return "; ".join(parts[:2]) + f"; +{len(parts)-2} more"
+    return "; ".join(parts)
+
+
+def _cache_entry(ok: bool, details: dict) -> dict:
+    return {
+        'status': ('🟢' if ok else '🔴'),
+        'reason': _summarize(ok, details),
+        'ok': ok,
+        'details': details,
+        'ts': time.time(),
+    }
+
+
+def device_reachability_status(dev_row: dict) -> Tuple[bool, dict]:
+    """
+    Check device reachability across configured endpoints.
+    Returns (overall_ok, {endpoint: (ok, reason)}).
+    """
+    endpoints = _device_endpoints(dev_row)
+    keys = list(dict.fromkeys(key for key in endpoints.values() if key))
+    ip_keys = [key for key in keys if key[0] == "ip"]
+    probed = dict(zip(ip_keys, _probe_ip_keys(ip_keys))) if ip_keys else {}
+    probed.update({key: _probe_endpoint(key) for key in keys if key[0] != "ip"})
+    return _status_from_probes(endpoints, probed)
+
+
+def device_reachability_summary(dev_row: dict) -> Tuple[bool, str]:
+    """Get a human-readable reachability summary."""
+    try:
+        ok, details = device_reachability_status(dev_row)
+    except Exception as e:
+        return False, f"error: {e}"
+    return ok, _summarize(ok, details)
 
 
 def check_reachability(dev_row: dict) -> bool:
@@ -216,12 +355,103 @@ def check_reachability(dev_row: dict) -> bool:
     return ok
 
 
-def reachability_probe_and_cache(dev_row: dict, *, cache: dict) -> dict:
-    """Probe reachability and cache result with timestamp."""
-    ok, reason = device_reachability_summary(dev_row)
-    cache[dev_row['id']] = {
-        'status': ('🟢' if ok else '🔴'),
-        'reason': reason,
-        'ts': time.time()
-    }
-    return cache[dev_row['id']]
+def reachability_probe_and_cache(dev_row: dict, *, cache: dict | None = None) -> dict:
+    """
+    Probe one device and store the result in REACHABILITY_CACHE.
+    A caller-supplied dict is still filled for backwards compatibility.
+    """
+    try:
+        ok, details = device_reachability_status(dev_row)
+        entry = _cache_entry(ok, details)
+    except Exception as e:
+        entry = {'status': '🔴', 'reason': f"error: {e}", 'ok': False, 'details': {}, 'ts': time.time()}
+    REACHABILITY_CACHE.set(dev_row['id'], entry)
+    if cache is not None:
+        cache[dev_row['id']] = entry
+    return entry
+
+
+def get_cached_reachability(device_id: int, allow_stale: bool = True) -> dict | None:
+    """Last known reachability entry for a device (None if never probed)."""
+    return REACHABILITY_CACHE.get(device_id, allow_stale=allow_stale)
+
+
+def _probe_ip_keys(keys: list) -> list:
+    results = probe_ips([key[1] for key in keys])
+    return [results.get(key[1], (False, "ip not probed")) for key in keys]
+
+
+def sweep_testbed_reachability(
+    testbed_id: int,
+    *,
+    max_workers: int | None = None,
+    force: bool = False
+) -> Dict[int, dict]:
+    """
+    Probe every endpoint of every device in a testbed concurrently.
+    Endpoints shared by several devices are probed once, and endpoints
+    with a fresh cached result are skipped unless force=True.
+    Returns {device_id: cache entry}; entries also land in REACHABILITY_CACHE.
+    """
+    # DB access stays on the calling thread; only probes fan out
+    devices = db_query("SELECT * FROM devices WHERE testbed_id=? ORDER BY id", (testbed_id,)) or []
+    return sweep_devices_reachability(devices, max_workers=max_workers, force=force)
+
+
+def sweep_devices_reachability(
+    devices: list,
+    *,
+    max_workers: int | None = None,
+    force: bool = False
+) -> Dict[int, dict]:
+    """Concurrent, de-duplicated reachability sweep over device rows."""
+    per_device = {d["id"]: _device_endpoints(d) for d in devices}
+    
+    probed: Dict[Tuple, Tuple[bool, str]] = {}
+    todo = set()
+    for endpoints in per_device.values():
+        for key in endpoints.values():
+            if not key or key in probed or key in todo:
+                continue
+            cached = None if force else _ENDPOINT_CACHE.get(key)
+            if cached is not None:
+                probed[key] = cached
+            else:
+                todo.add(key)
+    
+    # One serial-port and one adb listing serve every probe in this sweep
+    kinds = {key[0] for key in todo}
+    enumeration = get_device_enumeration()
+    if "com" in kinds:
+        enumeration.com_ports(refresh=force)
+    if "adb" in kinds:
+        enumeration.adb_devices(refresh=force)
+    
+    # All IPs go out together from one socket; serial/adb probes use the pool
+    ip_keys = [key for key in todo if key[0] == "ip"]
+    if ip_keys:
+        for key, res in zip(ip_keys, _probe_ip_keys(ip_keys)):
+            probed[key] = res
+            _ENDPOINT_CACHE.set(key, res)
+        todo.difference_update(ip_keys)
+    
+    if todo:
+        workers = max(1, min(int(max_workers or REACHABILITY_DEFAULTS["max_workers"]), len(todo)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="reach") as pool:
+            futures = {pool.submit(_probe_endpoint, key): key for key in todo}
+            for fut in as_completed(futures):
+                key = futures[fut]
+                try:
+                    res = fut.result()
+                except Exception as e:
+                    res = (False, f"{key[0]} error: {e}")
+                probed[key] = res
+                _ENDPOINT_CACHE.set(key, res)
+    
+    out = {}
+    for dev_id, endpoints in per_device.items():
+        ok, details = _status_from_probes(endpoints, probed)
+        entry = _cache_entry(ok, details)
+        REACHABILITY_CACHE.set(dev_id, entry)
+        out[dev_id] = entry
+    return out
@@ -1,24 +1,47 @@
 """Device shell access: SSH, ADB, Serial."""
-import subprocess
-import shutil
 import time
 import random
 import os
+import select
+import threading
 import base64
+import hashlib
+import io
 import queue
+import re
+import shlex
+import uuid
 from typing import Tuple, Dict, Any, List
 
-try:
-    import paramiko
-except ImportError:
-    paramiko = None
-
 try:
     import serial
 except ImportError:
     serial = None
 
-from ..utils import json_or_empty
+from utils import json_or_empty
+from .ssh_pool import get_ssh_pool, load_paramiko
+from .adb_client import get_adb_client
+from .serial_console import get_serial_console, strip_console_echo
+
+
+def _resolve_access(device: Dict[str, Any], access: str | None) -> str:
+    """Pick ssh/adb/serial for a device; explicit access wins, else auto-detect."""
+    access = (access or "").lower() or "auto"
+    if access in ("ssh", "adb", "serial"):
+        return access
+    
+    extra = json_or_empty(device.get("extra_json") or "{}")
+    if (
+        device.get("mgmt_ip") and
+        (device.get("username") or extra.get("username") or extra.get("ssh_key_path")) and
+        load_paramiko() is not None
+    ):
+        return "ssh"
+    if extra.get("adb_serial") or extra.get("adb_id"):
+        return "adb"
+    if extra.get("com_port") and serial is not None:
+        return "serial"
+    return "ssh"
 
 
 def run_shell_on_device(
@@ -32,118 +55,262 @@ def run_shell_on_device(
     Run shell command on device via SSH/ADB/Serial/Auto.
     Returns (rc, stdout, stderr).
     """
-    access = (access or "").lower() or "auto"
     extra = json_or_empty(device.get("extra_json") or "{}")
-    
-    def use_ssh() -> bool:
-        return bool(
-            device.get("mgmt_ip") and
-            (device.get("username") or extra.get("username") or extra.get("ssh_key_path")) and
-            paramiko is not None
-        )
-    
-    def use_adb() -> bool:
-        return bool(extra.get("adb_serial") or extra.get("adb_id"))
-    
-    def use_serial() -> bool:
-        return bool(extra.get("com_port")) and serial is not None
-    
-    # Resolve access method
-    chosen = None
-    if access in ("ssh", "adb", "serial"):
-        chosen = access
-    else:
-        if use_ssh():
-            chosen = "ssh"
-        elif use_adb():
-            chosen = "adb"
-        elif use_serial():
-            chosen = "serial"
-        else:
-            chosen = "ssh"
+    chosen = _resolve_access(device, access)
     
     if chosen == "ssh":
-        if paramiko is None:
+        if load_paramiko() is None:
             return 127, "", "Paramiko not installed"
         
-        host = device.get("mgmt_ip")
-        username = device.get("username") or extra.get("username") or "root"
-        password = device.get("password") or extra.get("password")
-        key_path = extra.get("ssh_key_path")
-        passphrase = extra.get("ssh_key_passphrase")
-        
         try:
-            client = paramiko.SSHClient()
-            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            
-            if key_path:
-                pkey = _load_ssh_key(key_path, passphrase)
-                client.connect(hostname=host, username=username, pkey=pkey, timeout=20, allow_agent=True, look_for_keys=True)
-            else:
-                client.connect(hostname=host, username=username, password=password or None, timeout=20, allow_agent=True, look_for_keys=True)
-            
-            stdin, stdout, stderr = client.exec_command(command, timeout=timeout)
-            out = stdout.read().decode("utf-8", errors="ignore")
-            err = stderr.read().decode("utf-8", errors="ignore")
-            rc = stdout.channel.recv_exit_status()
-            client.close()
+            with get_ssh_pool().session(device) as client:
+                stdin, stdout, stderr = client.exec_command(command, timeout=timeout)
+                out = stdout.read().decode("utf-8", errors="ignore")
+                err = stderr.read().decode("utf-8", errors="ignore")
+                rc = stdout.channel.recv_exit_status()
             return rc, out, err
         except Exception as e:
             return 127, "", f"ssh error: {e}"
     
     if chosen == "adb":
         serial_id = extra.get("adb_serial") or extra.get("adb_id")
-        if not shutil.which("adb"):
-            return 127, "", "adb not found in PATH"
-        
-        cmd = ["adb"]
-        if serial_id:
-            cmd += ["-s", str(serial_id)]
-        cmd += ["shell", command]
-        
         try:
-            proc = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
-            return proc.returncode, proc.stdout, proc.stderr
+            return get_adb_client().shell(serial_id, command, timeout=timeout)
         except Exception as e:
             return 127, "", f"adb error: {e}"
     
     if chosen == "serial":
-        port = extra.get("com_port")
-        baud = int(extra.get("baud", 115200))
         if serial is None:
             return 127, "", "pyserial not installed"
         
         try:
-            ser = serial.Serial(port=port, baudrate=baud, timeout=1)
-            ser.write((command + "\n").encode("utf-8"))
-            ser.flush()
-            
-            t0 = time.time()
-            chunks = []
-            while time.time() - t0 < min(timeout, 5):
-                data = ser.read(4096)
-                if data:
-                    chunks.append(data)
-            
-            out = (b"".join(chunks)).decode("utf-8", errors="ignore")
-            ser.close()
-            rc = 0 if ("not found" not in out.lower()) else 127
-            return rc, out, ""
+            return get_serial_console(device).run(command, timeout=timeout)
         except Exception as e:
             return 127, "", f"serial error: {e}"
     
     return 127, "", f"unknown access method {chosen}"
 
 
-def _load_ssh_key(key_path: str, passphrase: str = None):
-    """Load SSH private key (RSA or Ed25519)."""
+def run_batch_on_device(
+    device: Dict[str, Any],
+    commands: List[str],
+    access: str | None,
+    log_q: queue.Queue,
+    timeout: int = 120,
+    stop_on_error: bool = False
+) -> List[Tuple[int, str, str]]:
+    """
+    Run several commands through one remote shell (SSH/ADB/Serial/Auto).
+    Output is split back out per command using unique sentinels, so N
+    commands cost one round trip instead of N.
+    Returns [(rc, stdout, stderr), ...] aligned with `commands`; commands
+    that never ran (shell died, stop_on_error, timeout) get rc 127.
+    """
+    commands = [str(c) for c in (commands or [])]
+    if not commands:
+        return []
+    
+    chosen = _resolve_access(device, access)
+    nonce = uuid.uuid4().hex[:12]
+    
     try:
-        return paramiko.RSAKey.from_private_key_file(key_path, password=passphrase)
-    except Exception:
+        if chosen == "ssh":
+            if load_paramiko() is None:
+                return _batch_error(commands, "Paramiko not installed")
+            script = _batch_script(commands, nonce, stop_on_error)
+            out, err, shell_rc = _batch_over_ssh(device, script, timeout)
+        elif chosen == "adb":
+            script = _batch_script(commands, nonce, stop_on_error)
+            out, err, shell_rc = _batch_over_adb(device, script, timeout)
+        elif chosen == "serial":
+            if serial is None:
+                return _batch_error(commands, "pyserial not installed")
+            lines = _batch_script_lines(commands, nonce, stop_on_error)
+            out = _batch_over_serial(device, lines, nonce, len(commands), timeout, stop_on_error)
+            err, shell_rc = "", None
+        else:
+            return _batch_error(commands, f"unknown access method {chosen}")
+    except Exception as e:
+        return _batch_error(commands, f"{chosen} batch error: {e}")
+    
+    results = _split_batch_output(out, err, nonce, len(commands), shell_rc)
+    if stop_on_error:
+        failed = next((i for i, r in enumerate(results) if r[0] != 0), None)
+        if failed is not None:
+            results[failed + 1:] = [(127, "", "skipped: earlier command failed")] * (len(results) - failed - 1)
+    if chosen == "serial":
+        results = [(rc, strip_console_echo(o), e) for rc, o, e in results]
+    return results
+
+
+def _batch_error(commands: List[str], msg: str) -> List[Tuple[int, str, str]]:
+    return [(127, "", msg) for _ in commands]
+
+
+def _batch_marker_cmd(nonce: str, idx: int, stop_on_error: bool, stderr: bool = True) -> str:
+    """
+    Sentinel emitters. The nonce/index are printf arguments, so an echoed
+    copy of this line (serial consoles) can never match the expanded marker.
+    """
+    cmd = f"__trig_rc=$?; printf '__TRIG_%s_%d__ %d\\n' {nonce} {idx} $__trig_rc"
+    if stderr:
+        cmd += f"; printf '__TRIG_%s_%d__\\n' {nonce} {idx} >&2"
+    if stop_on_error:
+        cmd += "; [ $__trig_rc -eq 0 ] || exit $__trig_rc"
+    return cmd
+
+
+def _batch_script(commands: List[str], nonce: str, stop_on_error: bool) -> str:
+    """Script fed to `sh` on stdin; each command runs with stdin from /dev/null."""
+    parts = []
+    for idx, cmd in enumerate(commands):
+        parts.append(f"{{ {cmd}\n}} </dev/null\n{_batch_marker_cmd(nonce, idx, stop_on_error)}\n")
+    parts.append("exit 0\n")
+    return "".join(parts)
+
+
+# Keep typed console lines well under the tty canonical-mode limit (4095)
+_SERIAL_LINE_MAX = 1024
+
+
+def _batch_script_lines(commands: List[str], nonce: str, stop_on_error: bool) -> List[str]:
+    """
+    Console variant: commands are packed into as few typed entries as fit,
+    each entry a subshell. The shell then prints its prompts only while
+    the entry is echoed, and `exit` under stop_on_error leaves the
+    subshell, not the login shell. Like the stdin script, each command is
+    closed by a newline, so a trailing `&`, `;` or comment stays valid.
+    """
+    steps = [
+        f"{{ {cmd}\n}} </dev/null; {_batch_marker_cmd(nonce, idx, stop_on_error, stderr=False)}"
+        for idx, cmd in enumerate(commands)
+    ]
+    groups: List[List[str]] = [[]]
+    for step in steps:
+        if groups[-1] and len("; ".join(groups[-1] + [step])) > _SERIAL_LINE_MAX:
+            groups.append([])
+        groups[-1].append(step)
+    
+    return [f"( {'; '.join(group)} )" for group in groups]
+
+
+def _split_batch_output(out: str, err: str, nonce: str, count: int,
+                        shell_rc: int | None = None) -> List[Tuple[int, str, str]]:
+    out_re = re.compile(rf"__TRIG_{nonce}_(\d+)__ (\d+)\r?\n?")
+    err_re = re.compile(rf"__TRIG_{nonce}_(\d+)__\r?\n?")
+    err = err or ""
+    
+    outs: Dict[int, Tuple[int, str]] = {}
+    out_pos = 0
+    for m in out_re.finditer(out):
+        # A shell without stderr separation (legacy adb) leaks err markers into out
+        outs[int(m.group(1))] = (int(m.group(2)), err_re.sub("", out[out_pos:m.start()]))
+        out_pos = m.end()
+    
+    errs: Dict[int, str] = {}
+    err_pos = 0
+    for m in err_re.finditer(err):
+        errs[int(m.group(1))] = err[err_pos:m.start()]
+        err_pos = m.end()
+    
+    results = []
+    for idx in range(count):
+        if idx in outs:
+            rc, o = outs[idx]
+            results.append((rc, o, errs.get(idx, "")))
+        elif idx == len(outs):
+            # The command that was running when the shell went away
+            rc = shell_rc if shell_rc else 127
+            results.append((rc, out[out_pos:], err[err_pos:] or "batch aborted"))
+        else:
+            results.append((127, "", "batch aborted before command ran"))
+    return results
+
+
+def _read_channel(chan, timeout: float) -> Tuple[str, str, int | None]:
+    """Drain stdout and stderr of a paramiko channel until exit or timeout."""
+    deadline = time.time() + timeout
+    out, err = bytearray(), bytearray()
+    while True:
+        while chan.recv_ready():
+            out += chan.recv(_STREAM_RECV_SIZE)
+        while chan.recv_stderr_ready():
+            err += chan.recv_stderr(_STREAM_RECV_SIZE)
+        if chan.exit_status_ready() or chan.closed or chan.eof_received:
+            if not chan.recv_ready() and not chan.recv_stderr_ready():
+                break
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            break
+        select.select([chan], [], [], min(remaining, _STREAM_WAIT_SLICE))
+    rc = chan.recv_exit_status() if chan.exit_status_ready() else None
+    return out.decode("utf-8", errors="ignore"), err.decode("utf-8", errors="ignore"), rc
+
+
+def _batch_over_ssh(device: Dict[str, Any], script: str, timeout: int) -> Tuple[str, str, int | None]:
+    with get_ssh_pool().session(device) as client:
+        chan = client.get_transport().open_session()
         try:
-            return paramiko.Ed25519Key.from_private_key_file(key_path, password=passphrase)
-        except Exception:
-            return None
+            chan.exec_command("sh")
+            chan.sendall(script.encode("utf-8"))
+            chan.shutdown_write()
+            return _read_channel(chan, timeout)
+        finally:
+            chan.close()
+
+
+def _batch_over_adb(device: Dict[str, Any], script: str, timeout: int) -> Tuple[str, str, int | None]:
+    extra = json_or_empty(device.get("extra_json") or "{}")
+    serial_id = extra.get("adb_serial") or extra.get("adb_id")
+    client = get_adb_client()
+    if "shell_v2" in client.features(serial_id):
+        rc, out, err = client.shell(serial_id, "sh", timeout=timeout, stdin=script.encode("utf-8"))
+    else:
+        # Legacy adbd has no separate stdin; ship the script as the command
+        rc, out, err = client.shell(serial_id, script, timeout=timeout)
+    return out, err, rc
+
+
+def _batch_over_serial(device: Dict[str, Any], lines: List[str], nonce: str,
+                       count: int, timeout: int, stop_on_error: bool = False) -> str:
+    """
+    Type the packed lines one at a time; each line is done once its last
+    marker and the next prompt are in. Stops early on timeout or failure.
+    """
+    console = get_serial_console(device)
+    marker_re = re.compile(rf"__TRIG_{nonce}_(\d+)__ (\d+)\n")
+    deadline = time.time() + timeout
+    chunks = []
+    
+    for line in lines:
+        expected = [int(i) for i in re.findall(rf"' {nonce} (\d+) \$__trig_rc", line)]
+        last_idx = max(expected) if expected else count - 1
+        
+        def done(text: str) -> bool:
+            last = None
+            for last in marker_re.finditer(text):
+                pass
+            if last is None:
+                return False
+            finished = int(last.group(1)) == last_idx or (stop_on_error and last.group(2) != "0")
+            return finished and bool(console.prompt_re.search(text[last.end():]))
+        
+        with console.lock:
+            completed, text = console.transact(line + "\n", done, max(deadline - time.time(), 0.1))
+            # Drop the echo of the typed entry and the PS2 prompt the shell
+            # prints for each of its continuation lines
+            echo_at = text.rfind(f"' {nonce} {last_idx} $__trig_rc")
+            if echo_at != -1:
+                continuations = line.count("\n")
+                text = text[text.find("\n", echo_at) + 1:]
+                text = re.sub(rf"^(?:> ){{0,{continuations}}}", "", text)
+            chunks.append(text)
+            if not completed:
+                console.interrupt()
+                break
+        if stop_on_error and any(m.group(2) != "0" for m in marker_re.finditer(text)):
+            break
+    return "".join(chunks)
 
 
 def run_streaming_shell_on_device(
@@ -151,69 +318,19 @@ def run_streaming_shell_on_device(
     command: str,
     access: str | None,
     log_q: queue.Queue,
-    duration: int = 20
+    duration: int = 20,
+    cancel_event: threading.Event | None = None
 ) -> int:
-    """Stream command output line-by-line (SSH preferred). Returns rc."""
+    """
+    Stream command output line-by-line (SSH preferred). Returns rc.
+    Stops at `duration` seconds or as soon as `cancel_event` is set.
+    """
     access = (access or "").lower() or "auto"
-    extra = json_or_empty(device.get("extra_json") or "{}")
     
-    if (access in ("auto", "ssh")) and paramiko is not None and device.get("mgmt_ip"):
+    if (access in ("auto", "ssh")) and load_paramiko() is not None and device.get("mgmt_ip"):
         try:
-            host = device.get("mgmt_ip")
-            username = device.get("username") or extra.get("username") or "root"
-            password = device.get("password") or extra.get("password")
-            key_path = extra.get("ssh_key_path")
-            passphrase = extra.get("ssh_key_passphrase")
-            
-            client = paramiko.SSHClient()
-            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            
-            if key_path:
-                pkey = _load_ssh_key(key_path, passphrase)
-                client.connect(hostname=host, username=username, pkey=pkey, timeout=20, allow_agent=True, look_for_keys=True)
-            else:
-                client.connect(hostname=host, username=username, password=password or None, timeout=20, allow_agent=True, look_for_keys=True)
-            
-            chan = client.get_transport().open_session()
-            chan.exec_command(command)
-            
-            t0 = time.time()
-            buf = b""
-            
-            while True:
-                if chan.recv_ready():
-                    data = chan.recv(4096)
-                    if not data:
-                        break
-                    buf += data
-                    while b"\n" in buf:
-                        line, buf = buf.split(b"\n", 1)
-                        try:
-                            log_q.put(line.decode("utf-8", errors="ignore"))
-                        except Exception:
-                            pass
-                
-                if chan.exit_status_ready():
-                    break
-                
-                if time.time() - t0 > duration:
-                    try:
-                        chan.close()
-                    except Exception:
-                        pass
-                    break
-                
-                time.sleep(0.1)
-            
-            if buf:
-                try:
-                    log_q.put(buf.decode("utf-8", errors="ignore"))
-                except Exception:
-                    pass
-            
-            rc = chan.recv_exit_status() if chan.exit_status_ready() else 0
-            client.close()
-            return rc
+            with get_ssh_pool().session(device) as client:
+                return _stream_channel(client, command, log_q, duration, cancel_event)
         except Exception as e:
             try:
                 log_q.put(f"stream error: {e}")
@@ -221,6 +338,18 @@ def run_streaming_shell_on_device(
                 pass
             return 127
     
+    if _resolve_access(device, access) == "adb":
+        extra = json_or_empty(device.get("extra_json") or "{}")
+        try:
+            sock = get_adb_client().open_shell_stream(extra.get("adb_serial") or extra.get("adb_id"), command)
+        except Exception as e:
+            _put_lines(log_q, [f"stream error: {e}"])
+            return 127
+        try:
+            return _stream_socket(sock, log_q, duration, cancel_event)
+        finally:
+            sock.close()
+    
     # Fallback: run normally and dump
     rc, out, err = run_shell_on_device(device, command, access, log_q, timeout=duration + 5)
     if out:
@@ -232,6 +361,135 @@ def run_streaming_shell_on_device(
     return rc
 
 
+# Upper bound on how long the reader blocks before re-checking cancel/deadline
+_STREAM_WAIT_SLICE = 0.25
+_STREAM_RECV_SIZE = 65536
+
+
+class _LineSplitter:
+    """
+    Incremental bytes -> lines splitter over a single bytearray.
+    Each feed scans only the new bytes and trims consumed lines once,
+    so chatty output stays linear instead of re-copying the buffer per line.
+    """
+    
+    def __init__(self, prefix: str = ""):
+        self.prefix = prefix
+        self._buf = bytearray()
+    
+    def feed(self, data: bytes) -> List[str]:
+        buf = self._buf
+        scan_from = len(buf)
+        buf += data
+        lines = []
+        pos = 0
+        nl = buf.find(b"\n", scan_from)
+        while nl != -1:
+            lines.append(self.prefix + buf[pos:nl].decode("utf-8", errors="ignore"))
+            pos = nl + 1
+            nl = buf.find(b"\n", pos)
+        if pos:
+            del buf[:pos]
+        return lines
+    
+    def flush(self) -> List[str]:
+        if not self._buf:
+            return []
+        line = self.prefix + self._buf.decode("utf-8", errors="ignore")
+        self._buf.clear()
+        return [line]
+
+
+def _put_lines(log_q: queue.Queue, lines: List[str]):
+    for line in lines:
+        try:
+            log_q.put(line)
+        except Exception:
+            pass
+
+
+def _stream_channel(
+    client,
+    command: str,
+    log_q: queue.Queue,
+    duration: int,
+    cancel_event: threading.Event | None = None
+) -> int:
+    """
+    Run command on a fresh channel of a pooled client, pushing lines to log_q.
+    Blocks in select() on the channel fileno (woken for stdout, stderr and
+    close) rather than polling; stderr lines are pushed with a prefix.
+    """
+    chan = client.get_transport().open_session()
+    try:
+        chan.exec_command(command)
+        
+        deadline = time.time() + duration
+        out_split = _LineSplitter()
+        err_split = _LineSplitter(prefix="[stderr] ")
+        
+        while True:
+            if cancel_event is not None and cancel_event.is_set():
+                _put_lines(log_q, ["[stream] cancelled"])
+                break
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            
+            select.select([chan], [], [], min(remaining, _STREAM_WAIT_SLICE))
+            
+            while chan.recv_ready():
+                data = chan.recv(_STREAM_RECV_SIZE)
+                if not data:
+                    break
+                _put_lines(log_q, out_split.feed(data))
+            while chan.recv_stderr_ready():
+                data = chan.recv_stderr(_STREAM_RECV_SIZE)
+                if not data:
+                    break
+                _put_lines(log_q, err_split.feed(data))
+            
+            if chan.exit_status_ready() or chan.closed or chan.eof_received:
+                if not chan.recv_ready() and not chan.recv_stderr_ready():
+                    break
+        
+        _put_lines(log_q, out_split.flush() + err_split.flush())
+        return chan.recv_exit_status() if chan.exit_status_ready() else 0
+    finally:
+        try:
+            chan.close()
+        except Exception:
+            pass
+
+
+def _stream_socket(
+    sock,
+    log_q: queue.Queue,
+    duration: int,
+    cancel_event: threading.Event | None = None
+) -> int:
+    """Same loop as _stream_channel for a plain socket (adb raw shell). Returns 0."""
+    deadline = time.time() + duration
+    split = _LineSplitter()
+    while True:
+        if cancel_event is not None and cancel_event.is_set():
+            _put_lines(log_q, ["[stream] cancelled"])
+            break
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            break
+        ready, _, _ = select.select([sock], [], [], min(remaining, _STREAM_WAIT_SLICE))
+        if not ready:
+            continue
+        data = sock.recv(_STREAM_RECV_SIZE)
+        if not data:
+            break
+        # adb's pty turns \n into \r\n
+        _put_lines(log_q, [ln.rstrip("\r") for ln in split.feed(data)])
+    _put_lines(log_q, [ln.rstrip("\r") for ln in split.flush()])
+    return 0
+
+
 def write_text_file_on_device(
     device: Dict[str, Any],
     path: str,
@@ -240,9 +498,11 @@ def write_text_file_on_device(
     log_q: queue.Queue
 ) -> Tuple[int, str]:
     """
-    Write file to device using chunked base64 encoding.
-    Avoids shell/argv limits for large payloads.
-    Returns (rc, message).
+    Write file to device atomically (upload to a tmp file, then mv).
+    Transfer methods are tried in order: SFTP putfo, one SSH channel with
+    the payload streamed on stdin, adb push. Chunked base64 shell writes
+    remain only as the fallback for serial consoles.
+    Returns (rc, message); the message reports throughput on success.
     """
     def _log(msg):
         try:
@@ -250,19 +510,224 @@ def write_text_file_on_device(
         except Exception:
             pass
     
-    dirn = os.path.dirname(path) or "/tmp"
-    rc, out, err = run_shell_on_device(device, f"sh -lc 'mkdir -p {dirn}'", access, log_q, timeout=20)
-    if rc != 0:
-        _log(f"[config_write] mkdir failed for {dirn}: {err or out}")
-        return rc, (err or out or "mkdir failed")
+    chosen = _resolve_access(device, access)
+    raw = content.encode("utf-8")
+    tmp_dir = "/data/local/tmp" if chosen == "adb" else "/tmp"
+    tmp = f"{tmp_dir}/trig_{int(time.time())}_{random.randint(1000,9999)}.tmp"
+    
+    if chosen == "ssh":
+        methods = [("sftp", _upload_sftp), ("ssh-stdin", _upload_ssh_stdin)]
+    elif chosen == "adb":
+        methods = [("adb-push", _upload_adb_push)]
+    else:
+        methods = [("chunked", _upload_chunked)]
     
-    tmp = f"/tmp/trig_{int(time.time())}_{random.randint(1000,9999)}.tmp"
+    rc, msg = 127, f"no transfer method for access {chosen}"
+    for name, method in methods:
+        t0 = time.time()
+        try:
+            rc, msg = method(device, path, raw, tmp, chosen, log_q)
+        except Exception as e:
+            rc, msg = 127, f"{name} error: {e}"
+        if rc == 0:
+            dt = max(time.time() - t0, 1e-6)
+            msg = f"write OK via {name}: {len(raw)} B in {dt:.2f}s ({len(raw) / dt:.0f} B/s)"
+            _log(f"[config_write] {msg}")
+            return 0, msg
+        _log(f"[config_write] {name} failed: {msg}")
+    return rc, msg
+
+
+CONFIG_SYNC_DEFAULTS = {
+    # "always" uploads unconditionally, "hash" skips identical files,
+    # "delta" also patches only the changed blocks of big files
+    "mode": "hash",
+    "delta_min_bytes": 256 * 1024,
+    # Keeps each patch command (base64) well inside one shell line
+    "delta_block": 4096,
+    # Above this share of changed blocks a full upload is cheaper
+    "delta_max_ratio": 0.5,
+}
+
+_HASHERS = {64: ("sha256sum", hashlib.sha256), 32: ("md5sum", hashlib.md5)}
+
+
+def _remote_digest_cmd(path: str) -> str:
+    """One command printing `<size> <digest>`, or `missing` if there is no regular file."""
+    p = shlex.quote(path)
+    return (
+        f"if [ -f {p} ]; then echo \"$(wc -c < {p}) $( (sha256sum {p} || md5sum {p}) 2>/dev/null | cut -d' ' -f1)\"; "
+        f"else echo missing; fi"
+    )
+
+
+def _parse_remote_digest(out: str) -> Tuple[int | None, str]:
+    parts = (out or "").strip().split()
+    if len(parts) != 2 or not parts[0].isdigit() or len(parts[1]) not in _HASHERS:
+        return None, ""
+    return int(parts[0]), parts[1].lower()
+
+
+def sync_text_file_on_device(
+    device: Dict[str, Any],
+    path: str,
+    content: str,
+    access: str | None,
+    log_q: queue.Queue,
+    mode: str | None = None
+) -> Tuple[int, str, Dict[str, Any]]:
+    """
+    Idempotent write: hash the content locally, read the remote size and
+    sha256sum (md5sum fallback) in one command, and only transfer on a
+    mismatch. In "delta" mode files of at least delta_min_bytes have just
+    their changed blocks rewritten (see _delta_write).
+    Returns (rc, message, info); info["outcome"] is "hit" (already up to
+    date, nothing sent), "delta" or "transfer", with bytes_sent/bytes_saved.
+    """
+    mode = (mode or CONFIG_SYNC_DEFAULTS["mode"]).lower()
     raw = content.encode("utf-8")
+    info: Dict[str, Any] = {"outcome": "transfer", "bytes": len(raw), "bytes_sent": len(raw), "bytes_saved": 0}
+
+    if mode != "always":
+        rc, out, _ = run_shell_on_device(device, _remote_digest_cmd(path), access, log_q, timeout=30)
+        size, digest = _parse_remote_digest(out) if rc == 0 else (None, "")
+        if digest:
+            algo, hasher = _HASHERS[len(digest)]
+            local = hasher(raw).hexdigest()
+            info["hash"] = f"{algo[:-3]}:{local}"
+            if size == len(raw) and local == digest:
+                info.update(outcome="hit", bytes_sent=0, bytes_saved=len(raw))
+                msg = f"{path} already up to date ({len(raw)} B, {algo})"
+                log_q.put(f"[config_write] {msg}")
+                return 0, msg, info
+            # Patch lines are too long to type into a serial console
+            if (mode == "delta" and size and len(raw) >= CONFIG_SYNC_DEFAULTS["delta_min_bytes"]
+                    and _resolve_access(device, access) != "serial"):
+                rc, msg, sent = _delta_write(device, path, raw, size, access, log_q)
+                if rc == 0:
+                    info.update(outcome="delta", bytes_sent=sent, bytes_saved=len(raw) - sent)
+                    return 0, msg, info
+                log_q.put(f"[config_write] delta failed, uploading in full: {msg}")
+
+    rc, msg = write_text_file_on_device(device, path, content, access, log_q)
+    return rc, msg, info
+
+
+def _delta_write(device, path, raw, remote_size, access, log_q) -> Tuple[int, str, int]:
+    """
+    Compare per-block md5s with the remote copy, then in one batch copy
+    the file to a tmp, dd the changed blocks in, truncate to the new size,
+    verify the whole-file md5 and mv into place.
+    Returns (rc, message, payload bytes sent).
+    """
+    block = CONFIG_SYNC_DEFAULTS["delta_block"]
+    p = shlex.quote(path)
+    count = (remote_size + block - 1) // block
+    hash_cmd = (
+        f"i=0; while [ $i -lt {count} ]; do "
+        f"dd if={p} bs={block} skip=$i count=1 2>/dev/null | md5sum | cut -d' ' -f1; i=$((i+1)); done"
+    )
+    rc, out, err = run_shell_on_device(device, hash_cmd, access, log_q, timeout=120)
+    remote = out.split()
+    if rc != 0 or len(remote) != count:
+        return rc or 1, (err or "could not read remote block hashes").strip(), 0
+
+    blocks = (len(raw) + block - 1) // block
+    changed = [i for i in range(blocks)
+               if i >= count or hashlib.md5(raw[i * block:(i + 1) * block]).hexdigest() != remote[i]]
+    if blocks and len(changed) > blocks * CONFIG_SYNC_DEFAULTS["delta_max_ratio"]:
+        return 1, f"{len(changed)}/{blocks} blocks changed", 0
+
+    tmp_dir = "/data/local/tmp" if _resolve_access(device, access) == "adb" else "/tmp"
+    tmp = f"{tmp_dir}/trig_{int(time.time())}_{random.randint(1000,9999)}.tmp"
+    cmds = [f"cp {p} {tmp}"]
+    sent = 0
+    for i in changed:
+        part = raw[i * block:(i + 1) * block]
+        sent += len(part)
+        b64 = base64.b64encode(part).decode("ascii")
+        cmds.append(f"printf %s '{b64}' | base64 -d | dd of={tmp} bs={block} seek={i} conv=notrunc 2>/dev/null")
+    cmds.append(f"dd if=/dev/null of={tmp} bs=1 seek={len(raw)} 2>/dev/null")
+    cmds.append(f"[ \"$(md5sum {tmp} | cut -d' ' -f1)\" = {hashlib.md5(raw).hexdigest()} ] || {{ rm -f {tmp}; false; }}")
+    cmds.append(_finalize_cmd(path, tmp))
+
+    t0 = time.time()
+    results = run_batch_on_device(device, cmds, access, log_q, timeout=120, stop_on_error=True)
+    failed = next((r for r in results if r[0] != 0), None)
+    if failed is not None:
+        run_shell_on_device(device, f"rm -f {tmp}", access, log_q, timeout=10)
+        return failed[0], (failed[2] or failed[1] or "delta patch failed").strip(), 0
+    msg = (f"delta write OK: {len(changed)}/{blocks} blocks, {sent} of {len(raw)} B "
+           f"in {time.time() - t0:.2f}s")
+    log_q.put(f"[config_write] {msg}")
+    return 0, msg, sent
+
+
+def _finalize_cmd(path: str, tmp: str) -> str:
+    """Shell snippet that atomically moves tmp into place (cleans up on failure)."""
+    p, t = shlex.quote(path), shlex.quote(tmp)
+    return f"mv -f {t} {p} && chmod 0644 {p} || (rc=$?; rm -f {t}; exit $rc)"
+
+
+def _mkdir_cmd(path: str) -> str:
+    return f"mkdir -p {shlex.quote(os.path.dirname(path) or '/tmp')}"
+
+
+def _upload_sftp(device, path, raw, tmp, access, log_q) -> Tuple[int, str]:
+    """SFTP putfo into tmp, then mkdir+mv in one exec on the same transport."""
+    with get_ssh_pool().session(device) as client:
+        sftp = client.open_sftp()
+        try:
+            sftp.putfo(io.BytesIO(raw), tmp, file_size=len(raw), confirm=True)
+        finally:
+            sftp.close()
+        cmd = f"sh -c {shlex.quote(_mkdir_cmd(path) + ' && ' + _finalize_cmd(path, tmp))}"
+        stdin, stdout, stderr = client.exec_command(cmd, timeout=20)
+        out = stdout.read().decode("utf-8", errors="ignore")
+        err = stderr.read().decode("utf-8", errors="ignore")
+        rc = stdout.channel.recv_exit_status()
+    return rc, (err or out or "finalize failed") if rc else ""
+
+
+def _upload_ssh_stdin(device, path, raw, tmp, access, log_q) -> Tuple[int, str]:
+    """Stream the payload on stdin of a single `cat > tmp && mv` channel."""
+    script = f"{_mkdir_cmd(path)} && cat > {shlex.quote(tmp)} && {_finalize_cmd(path, tmp)}"
+    with get_ssh_pool().session(device) as client:
+        stdin, stdout, stderr = client.exec_command(f"sh -c {shlex.quote(script)}", timeout=60)
+        stdin.write(raw)
+        stdin.flush()
+        stdin.channel.shutdown_write()
+        out = stdout.read().decode("utf-8", errors="ignore")
+        err = stderr.read().decode("utf-8", errors="ignore")
+        rc = stdout.channel.recv_exit_status()
+    return rc, (err or out or "stdin upload failed") if rc else ""
+
+
+def _upload_adb_push(device, path, raw, tmp, access, log_q) -> Tuple[int, str]:
+    """Sync-protocol push into tmp, then mkdir+mv in one adb shell."""
+    extra = json_or_empty(device.get("extra_json") or "{}")
+    serial_id = extra.get("adb_serial") or extra.get("adb_id")
+    get_adb_client().push(serial_id, raw, tmp)
+    
+    rc, out, err = run_shell_on_device(
+        device, f"{_mkdir_cmd(path)} && {_finalize_cmd(path, tmp)}", "adb", log_q, timeout=20
+    )
+    return rc, (err or out or "finalize failed") if rc else ""
+
+
+def _upload_chunked(device, path, raw, tmp, access, log_q) -> Tuple[int, str]:
+    """
+    Chunked base64 writes, one shell command per chunk.
+    Avoids shell/argv limits on consoles that only accept typed input.
+    """
     CHUNK = 500
     
+    rc, out, err = run_shell_on_device(device, f"sh -lc {shlex.quote(_mkdir_cmd(path))}", access, log_q, timeout=20)
+    if rc != 0:
+        return rc, (err or out or "mkdir failed")
+    
     rc, out, err = run_shell_on_device(device, f"sh -lc ': > {tmp}'", access, log_q, timeout=20)
     if rc != 0:
-        _log(f"[config_write] init tmp failed: {err or out}")
         return rc, (err or out or "init tmp failed")
     
     total = len(raw)
@@ -276,18 +741,12 @@ def write_text_file_on_device(
         cmd = f"sh -lc \"printf %s '{b64}' | base64 -d >> {tmp}\""
         rc, out, err = run_shell_on_device(device, cmd, access, log_q, timeout=60)
         if rc != 0:
-            _log(f"[config_write] chunk {idx} failed ({len(part)}B): {err or out}")
             run_shell_on_device(device, f"sh -lc 'rm -f {tmp}'", access, log_q, timeout=10)
-            return rc, (err or out or f"chunk {idx} failed")
+            return rc, (err or out or f"chunk {idx} failed ({len(part)}B)")
     
-    cmd_mv = f"sh -lc 'mv -f {tmp} {path} && chmod 0644 {path} || (rc=$?; rm -f {tmp}; exit $rc)'"
+    cmd_mv = f"sh -lc {shlex.quote(_finalize_cmd(path, tmp))}"
     rc, out, err = run_shell_on_device(device, cmd_mv, access, log_q, timeout=20)
-    if rc == 0:
-        _log("[config_write] write OK (chunked)")
-        return 0, (out or "")
-    else:
-        _log(f"[config_write] finalize failed: {err or out}")
-        return rc, (err or out or "finalize failed")
+    return rc, (err or out or "finalize failed") if rc else ""
 
 
 def fetch_file_from_device(
@@ -306,27 +765,14 @@ def fetch_file_from_device(
     extra = json_or_empty(device.get("extra_json") or "{}")
     chosen = (access or "auto").lower()
     
-    if chosen in ("auto", "ssh") and paramiko is not None and device.get("mgmt_ip"):
+    if chosen in ("auto", "ssh") and load_paramiko() is not None and device.get("mgmt_ip"):
         try:
-            host = device.get("mgmt_ip")
-            username = device.get("username") or extra.get("username") or "root"
-            password = device.get("password") or extra.get("password")
-            key_path = extra.get("ssh_key_path")
-            passphrase = extra.get("ssh_key_passphrase")
-            
-            client = paramiko.SSHClient()
-            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            
-            if key_path:
-                pkey = _load_ssh_key(key_path, passphrase)
-                client.connect(hostname=host, username=username, pkey=pkey, timeout=20, allow_agent=True, look_for_keys=True)
-            else:
-                client.connect(hostname=host, username=username, password=password or None, timeout=20, allow_agent=True, look_for_keys=True)
-            
-            sftp = client.open_sftp()
-            sftp.get(remote_path, local_path)
-            sftp.close()
-            client.close()
+            with get_ssh_pool().session(device) as client:
+                sftp = client.open_sftp()
+                try:
+                    sftp.get(remote_path, local_path)
+                finally:
+                    sftp.close()
             return True, local_path
         except Exception as e:
             log_q.put(f"SFTP get failed: {e}")
@@ -335,17 +781,12 @@ def fetch_file_from_device(
     
     if chosen in ("auto", "adb"):
         serial_id = extra.get("adb_serial") or extra.get("adb_id")
-        if shutil.which("adb"):
-            cmd = ["adb"] + (["-s", str(serial_id)] if serial_id else []) + ["pull", remote_path, local_path]
-            try:
-                proc = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
-                if proc.returncode == 0 and os.path.exists(local_path):
-                    return True, local_path
-                else:
-                    log_q.put(proc.stdout + "" + proc.stderr)
-            except Exception as e:
+        try:
+            get_adb_client().pull(serial_id, remote_path, local_path)
+            return True, local_path
+        except Exception as e:
+            log_q.put(f"adb pull failed: {e}")
+            if chosen != "auto":
                 return False, str(e)
-        else:
-            log_q.put("adb not found in PATH")
     
     return False, "unsupported method or failure"
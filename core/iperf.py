@@ -0,0 +1,241 @@
+"""iperf3 helpers: result parsing and live, per-interval streaming."""
+import json
+import queue
+import re
+import subprocess
+import threading
+from typing import Tuple, Dict, Any, Callable, Optional
+
+from .metrics import StreamingSummary
+
+
+IPERF_DEFAULTS = {
+    # Extra time allowed on top of -t before the client is killed
+    "timeout_margin_s": 60,
+}
+
+_UNIT_SCALE = {"": 1.0, "K": 1e3, "M": 1e6, "G": 1e9, "T": 1e12}
+
+# "[  5]   1.00-2.00   sec   112 MBytes   941 Mbits/sec    0    386 KBytes"
+# "[SUM]   0.00-10.00  sec  1.10 GBytes   943 Mbits/sec  12             sender"
+_TEXT_LINE_RE = re.compile(
+    r"^\[\s*(?P<id>SUM|\d+)\]\s+(?P<start>[\d.]+)-(?P<end>[\d.]+)\s+sec\s+"
+    r"[\d.]+\s+\w?Bytes\s+(?P<rate>[\d.]+)\s+(?P<unit>[KMGT]?)bits/sec(?P<rest>.*)$"
+)
+_UDP_RX_RE = re.compile(r"([\d.]+)\s+ms\s+(\d+)/(\d+)\s+\(([\d.eE+-]+)%\)")
+
+
+def iperf_summary(data: Dict[str, Any], proto: str = "tcp") -> Dict[str, Any]:
+    """
+    Headline metrics from an iperf3 -J document (or the data of a
+    --json-stream "end" event): bps plus retransmits (TCP) or jitter/loss (UDP).
+    """
+    end = data.get("end", data) or {}
+    if proto == "udp":
+        summ = end.get("sum", {}) or {}
+        return {
+            "bps": summ.get("bits_per_second"),
+            "jitter_ms": summ.get("jitter_ms"),
+            "loss_pct": summ.get("lost_percent"),
+            "lost_packets": summ.get("lost_packets"),
+            "packets": summ.get("packets"),
+        }
+    bps = (
+        (end.get("sum_received", {}) or {}).get("bits_per_second") or
+        (end.get("sum_sent", {}) or {}).get("bits_per_second")
+    )
+    retrans = (end.get("sum_sent", {}) or {}).get("retransmits")
+    if retrans is None:
+        streams = end.get("streams", [])
+        if streams and isinstance(streams, list):
+            retrans = (streams[0].get("sender", {}) or {}).get("retransmits")
+    return {"bps": bps, "retransmits": retrans}
+
+
+def interval_sample(data: Dict[str, Any]) -> Dict[str, Any]:
+    """One --json-stream "interval" event -> flat sample (sum over all streams)."""
+    s = data.get("sum", {}) or {}
+    return {
+        "t_start": s.get("start"),
+        "t_end": s.get("end"),
+        "bps": s.get("bits_per_second"),
+        "retransmits": s.get("retransmits"),
+        "jitter_ms": s.get("jitter_ms"),
+        "lost_pct": s.get("lost_percent"),
+    }
+
+
+def parse_text_line(line: str, parallel: int = 1, proto: str = "tcp") -> Tuple[str | None, Dict[str, Any]]:
+    """
+    Parse one line of human-readable iperf3 output.
+    Returns ("interval" | "sender" | "receiver" | None, sample). With -P > 1
+    only [SUM] lines are used, otherwise the single stream's lines.
+    """
+    m = _TEXT_LINE_RE.match(line.strip())
+    if not m or (parallel > 1) != (m.group("id") == "SUM"):
+        return None, {}
+    rest = m.group("rest")
+    sample = {
+        "t_start": float(m.group("start")),
+        "t_end": float(m.group("end")),
+        "bps": float(m.group("rate")) * _UNIT_SCALE[m.group("unit")],
+        "retransmits": None,
+        "jitter_ms": None,
+        "lost_pct": None,
+    }
+    udp = _UDP_RX_RE.search(rest)
+    if udp:
+        sample["jitter_ms"] = float(udp.group(1))
+        sample["lost_pct"] = float(udp.group(4))
+    elif proto != "udp":
+        first = rest.split()[:1]
+        if first and first[0].isdigit() and not rest.strip().endswith("receiver"):
+            sample["retransmits"] = int(first[0])
+    kind = rest.split()[-1] if rest.split() and rest.split()[-1] in ("sender", "receiver") else "interval"
+    return kind, sample
+
+
+class IperfStream:
+    """
+    Consumes interval samples as they arrive: logs them, forwards them to
+    an optional sink and folds them into running summaries. Nothing but
+    the summaries is retained.
+    """
+
+    def __init__(self, proto: str, log_q: queue.Queue, sink: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.proto = proto
+        self.log_q = log_q
+        self.sink = sink
+        self.bps = StreamingSummary()
+        self.jitter = StreamingSummary()
+        self.retransmits = 0
+        self.intervals = 0
+        self.final: Dict[str, Any] = {}
+
+    def on_interval(self, sample: Dict[str, Any]):
+        self.intervals += 1
+        self.bps.add(sample.get("bps"))
+        self.jitter.add(sample.get("jitter_ms"))
+        if sample.get("retransmits") is not None:
+            self.retransmits += int(sample["retransmits"])
+
+        line = f"[iperf3] {sample.get('t_start') or 0:.1f}-{sample.get('t_end') or 0:.1f}s"
+        if sample.get("bps") is not None:
+            line += f" {sample['bps'] / 1e6:.2f} Mbit/s"
+        if sample.get("retransmits") is not None:
+            line += f" retr={sample['retransmits']}"
+        if sample.get("jitter_ms") is not None:
+            line += f" jitter={sample['jitter_ms']:.3f}ms"
+        if sample.get("lost_pct") is not None:
+            line += f" lost={sample['lost_pct']:.2f}%"
+        self.log_q.put(line)
+
+        if self.sink is not None:
+            try:
+                self.sink(dict(sample, source="iperf3"))
+            except Exception as e:
+                self.log_q.put(f"[iperf3] metrics sink error: {e}")
+
+    def metrics(self) -> Dict[str, Any]:
+        out = dict(self.final)
+        out["intervals"] = self.intervals
+        out.update(self.bps.as_dict("bps_"))
+        out.pop("bps_count", None)
+        if self.proto == "udp":
+            out.update({k: v for k, v in self.jitter.as_dict("jitter_ms_").items() if not k.endswith("count")})
+        elif out.get("retransmits") is None and self.intervals:
+            out["retransmits"] = self.retransmits
+        return out
+
+
+def _run_lines(cmd, timeout: float, on_line: Callable[[str], None]) -> Tuple[int, bool]:
+    """Run cmd, feeding each output line (stdout+stderr) to on_line. Returns (rc, timed_out)."""
+    proc = subprocess.Popen(
+        cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+        text=True, bufsize=1, errors="replace",
+    )
+    timed_out = threading.Event()
+
+    def _kill():
+        timed_out.set()
+        proc.kill()
+
+    timer = threading.Timer(timeout, _kill)
+    timer.daemon = True
+    timer.start()
+    try:
+        for line in proc.stdout:
+            on_line(line.rstrip("\n"))
+        rc = proc.wait()
+    finally:
+        timer.cancel()
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+    return rc, timed_out.is_set()
+
+
+def run_iperf3_streaming(
+    cmd: list,
+    proto: str,
+    log_q: queue.Queue,
+    timeout: float,
+    parallel: int = 1,
+    sink: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Tuple[int, Dict[str, Any], str]:
+    """
+    Run an iperf3 client command (without -J) and report every interval
+    while it runs. Uses --json-stream (iperf3 >= 3.17) and falls back to
+    parsing the -i 1 text output on older builds.
+    Returns (rc, metrics, error).
+    """
+    stream = IperfStream(proto, log_q, sink)
+    state = {"events": 0, "error": "", "unsupported": False}
+
+    def on_json_line(line: str):
+        try:
+            ev = json.loads(line)
+        except ValueError:
+            if "json-stream" in line and ("unrecognized" in line or "invalid" in line):
+                state["unsupported"] = True
+            elif line.strip() and not state["unsupported"]:
+                log_q.put(line)
+            return
+        state["events"] += 1
+        kind, data = ev.get("event"), ev.get("data") or {}
+        if kind == "interval":
+            stream.on_interval(interval_sample(data))
+        elif kind == "end":
+            stream.final = iperf_summary(data, proto)
+        elif kind == "error":
+            state["error"] = str(data)
+            log_q.put(f"[iperf3] error: {data}")
+
+    rc, timed_out = _run_lines(cmd + ["--json-stream"], timeout, on_json_line)
+
+    if state["unsupported"] and not state["events"]:
+        log_q.put("[iperf3] --json-stream not supported; parsing interval text output")
+        final: Dict[str, Dict[str, Any]] = {}
+
+        def on_text_line(line: str):
+            kind, sample = parse_text_line(line, parallel, proto)
+            if kind == "interval":
+                stream.on_interval(sample)
+            elif kind:
+                final[kind] = sample
+            elif line.strip():
+                log_q.put(line)
+            if line.startswith("iperf3: error"):
+                state["error"] = line.split(":", 2)[-1].strip()
+
+        rc, timed_out = _run_lines(cmd + ["-i", "1", "--forceflush"], timeout, on_text_line)
+        rx, tx = final.get("receiver", {}), final.get("sender", {})
+        if proto == "udp":
+            stream.final = {"bps": rx.get("bps") or tx.get("bps"), "jitter_ms": rx.get("jitter_ms"), "loss_pct": rx.get("lost_pct")}
+        elif rx or tx:
+            stream.final = {"bps": rx.get("bps") or tx.get("bps"), "retransmits": tx.get("retransmits")}
+
+    if timed_out:
+        return 124, stream.metrics(), f"iperf3 timeout after {timeout}s"
+    return rc, stream.metrics(), state["error"]
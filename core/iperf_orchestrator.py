@@ -0,0 +1,223 @@
+"""Concurrent iperf3 between testbed devices (the iperf_between_devices node)."""
+import json
+import queue
+import shlex
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple, Dict, Any, List
+
+from utils import json_or_empty, find_device
+from .device_shell import run_shell_on_device, run_batch_on_device
+from .iperf import IPERF_DEFAULTS, iperf_summary
+
+
+IPERF_PAIR_DEFAULTS = {
+    "base_port": 5201,
+    "duration_s": 10,
+    "protocol": "tcp",
+    "parallel": 1,
+    # Time for daemonized servers to bind before clients connect
+    "server_settle_s": 1.0,
+    # Max time to wait for every client to be ready before starting them together
+    "align_timeout_s": 30,
+}
+
+
+def _traffic_ip(device: Dict[str, Any]) -> str:
+    extra = json_or_empty(device.get("extra_json") or "{}")
+    return (extra.get("traffic_ip") or device.get("mgmt_ip") or "").strip()
+
+
+def _plan_pairs(params: Dict[str, Any], tb_ctx: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], str]:
+    """
+    Resolve params["pairs"] against the testbed and give every pair its own
+    server port (ports count up from base_port per server device).
+    Returns (pairs, error).
+    """
+    devices = tb_ctx.get("devices") or []
+    base_port = int(params.get("base_port", IPERF_PAIR_DEFAULTS["base_port"]))
+    next_port: Dict[Any, int] = {}
+    planned = []
+    for i, spec in enumerate(params.get("pairs") or []):
+        client = find_device(devices, spec.get("client"))
+        server = find_device(devices, spec.get("server"))
+        if client is None or server is None:
+            missing = spec.get("client") if client is None else spec.get("server")
+            return [], f"pair {i}: device {missing!r} not found in testbed"
+        server_ip = spec.get("server_ip") or _traffic_ip(server)
+        if not server_ip:
+            return [], f"pair {i}: no IP for server {server.get('name')}"
+        port = spec.get("port") or next_port.get(server["id"], base_port)
+        next_port[server["id"]] = int(port) + 1
+        planned.append({
+            "name": spec.get("name") or f"{client.get('name')}->{server.get('name')}:{port}",
+            "client": client,
+            "server": server,
+            "server_ip": server_ip,
+            "port": int(port),
+            "protocol": str(spec.get("protocol", params.get("protocol", IPERF_PAIR_DEFAULTS["protocol"]))).lower(),
+            "parallel": int(spec.get("parallel", params.get("parallel", IPERF_PAIR_DEFAULTS["parallel"]))),
+            "bandwidth": spec.get("bandwidth", params.get("bandwidth")),
+            "reverse": bool(spec.get("reverse", params.get("reverse", False))),
+            "access": spec.get("access", params.get("access")),
+        })
+    if not planned:
+        return [], "no pairs given"
+    return planned, ""
+
+
+def _client_cmd(pair: Dict[str, Any], duration: int) -> str:
+    cmd = ["iperf3", "-c", pair["server_ip"], "-p", str(pair["port"]),
+           "-t", str(duration), "-P", str(pair["parallel"]), "-J"]
+    if pair["protocol"] == "udp":
+        cmd.append("-u")
+        if pair["bandwidth"]:
+            cmd += ["-b", str(pair["bandwidth"])]
+    if pair["reverse"]:
+        cmd.append("-R")
+    return " ".join(shlex.quote(c) for c in cmd)
+
+
+def _start_servers(pairs: List[Dict[str, Any]], log_q: queue.Queue) -> Dict[Any, str]:
+    """One shell session per server device starts all its one-shot daemons. Returns {server_id: error}."""
+    by_server: Dict[Any, List[Dict[str, Any]]] = {}
+    for p in pairs:
+        by_server.setdefault(p["server"]["id"], []).append(p)
+
+    def _start(group):
+        server = group[0]["server"]
+        cmds = [f"iperf3 -s -1 -D -p {p['port']}" for p in group]
+        log_q.put(f"[iperf] {server.get('name')}: starting servers on ports {', '.join(str(p['port']) for p in group)}")
+        results = run_batch_on_device(server, cmds, group[0]["access"], log_q, timeout=30)
+        errs = [f"port {p['port']}: {(err or out).strip() or f'rc={rc}'}"
+                for p, (rc, out, err) in zip(group, results) if rc != 0]
+        return server["id"], "; ".join(errs)
+
+    failed = {}
+    with ThreadPoolExecutor(max_workers=max(1, len(by_server)), thread_name_prefix="iperf-srv") as pool:
+        for server_id, err in pool.map(_start, by_server.values()):
+            if err:
+                failed[server_id] = err
+    return failed
+
+
+def _stop_servers(pairs: List[Dict[str, Any]], log_q: queue.Queue):
+    """Kill one-shot servers whose client never connected (they would linger)."""
+    by_server: Dict[Any, List[Dict[str, Any]]] = {}
+    for p in pairs:
+        by_server.setdefault(p["server"]["id"], []).append(p)
+    for group in by_server.values():
+        # Anchored: port 520 must not match a daemon on 5201, nor this shell's own command line
+        cmds = [f"pkill -f '(^|/)iperf3 -s -1 -D -p {p['port']}$' || true" for p in group]
+        run_batch_on_device(group[0]["server"], cmds, group[0]["access"], log_q, timeout=15)
+
+
+def _aggregate(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    ok = [r for r in results if r.get("bps") is not None and r.get("rc") == 0]
+    total = {
+        "pairs": len(results),
+        "pairs_ok": len(ok),
+        "total_bps": sum(r["bps"] for r in ok) if ok else None,
+    }
+    if ok:
+        bps = [r["bps"] for r in ok]
+        total["pair_bps_min"] = min(bps)
+        total["pair_bps_max"] = max(bps)
+    udp = [r for r in ok if r.get("jitter_ms") is not None]
+    if udp:
+        total["jitter_ms_avg"] = sum(r["jitter_ms"] for r in udp) / len(udp)
+        total["jitter_ms_max"] = max(r["jitter_ms"] for r in udp)
+        packets = sum(r.get("packets") or 0 for r in udp)
+        lost = sum(r.get("lost_packets") or 0 for r in udp)
+        if packets:
+            total["loss_pct"] = 100.0 * lost / packets
+        else:
+            total["loss_pct"] = sum(r.get("loss_pct") or 0 for r in udp) / len(udp)
+    tcp = [r for r in ok if r.get("retransmits") is not None]
+    if tcp:
+        total["retransmits"] = sum(r["retransmits"] for r in tcp)
+    return total
+
+
+def run_iperf_between_devices(
+    params: Dict[str, Any],
+    tb_ctx: Dict[str, Any],
+    log_q: queue.Queue
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Run several iperf3 client/server pairs between testbed devices at once.
+
+    params: {"pairs": [{"client": <name|id|role>, "server": <name|id|role>,
+    optional server_ip/port/protocol/parallel/bandwidth/reverse/access}],
+    plus defaults duration_s, protocol, parallel, bandwidth, reverse,
+    access, base_port}. Returns (status, {"pairs": [...], "total": {...}}).
+    """
+    pairs, err = _plan_pairs(params, tb_ctx)
+    if err:
+        log_q.put(f"[iperf] {err}")
+        return "FAILED", {"error": err}
+    duration = int(params.get("duration_s", IPERF_PAIR_DEFAULTS["duration_s"]))
+
+    failed_servers = _start_servers(pairs, log_q)
+    for server_id, msg in failed_servers.items():
+        log_q.put(f"[iperf] server start failed on device {server_id}: {msg}")
+    runnable = [p for p in pairs if p["server"]["id"] not in failed_servers]
+    time.sleep(float(params.get("server_settle_s", IPERF_PAIR_DEFAULTS["server_settle_s"])))
+
+    # Every client warms its shell transport, then all start together
+    barrier = threading.Barrier(max(1, len(runnable)))
+    align_timeout = float(params.get("align_timeout_s", IPERF_PAIR_DEFAULTS["align_timeout_s"]))
+    started_at: Dict[str, float] = {}
+
+    def _run_client(pair):
+        run_shell_on_device(pair["client"], "true", pair["access"], log_q, timeout=30)
+        try:
+            barrier.wait(align_timeout)
+        except threading.BrokenBarrierError:
+            pass  # a peer is stuck; start anyway rather than not at all
+        started_at[pair["name"]] = time.time()
+        rc, out, err = run_shell_on_device(
+            pair["client"], _client_cmd(pair, duration), pair["access"], log_q,
+            timeout=duration + IPERF_DEFAULTS["timeout_margin_s"],
+        )
+        res = {"pair": pair["name"], "client": pair["client"].get("name"),
+               "server": pair["server"].get("name"), "port": pair["port"], "rc": rc}
+        try:
+            data = json.loads(out)
+            if data.get("error"):
+                res["error"] = data["error"]
+            res.update(iperf_summary(data, pair["protocol"]))
+        except ValueError:
+            res["error"] = (err or out).strip()[-500:] or f"rc={rc}"
+        if rc != 0 and "error" not in res:
+            res["error"] = (err or "").strip()[-500:] or f"rc={rc}"
+        if res.get("error"):
+            log_q.put(f"[iperf] {pair['name']}: FAILED {res['error']}")
+        else:
+            log_q.put(f"[iperf] {pair['name']}: {(res.get('bps') or 0) / 1e6:.2f} Mbit/s")
+        return res
+
+    results: List[Dict[str, Any]] = []
+    if runnable:
+        with ThreadPoolExecutor(max_workers=len(runnable), thread_name_prefix="iperf-cli") as pool:
+            results = list(pool.map(_run_client, runnable))
+    for p in pairs:
+        if p["server"]["id"] in failed_servers:
+            results.append({"pair": p["name"], "client": p["client"].get("name"),
+                            "server": p["server"].get("name"), "port": p["port"], "rc": 127,
+                            "error": f"server start failed: {failed_servers[p['server']['id']]}"})
+
+    leftover = [p for p, r in zip(runnable, results) if r.get("error")]
+    if leftover:
+        _stop_servers(leftover, log_q)
+
+    total = _aggregate(results)
+    if started_at:
+        total["start_skew_ms"] = round((max(started_at.values()) - min(started_at.values())) * 1000.0, 1)
+    log_q.put(
+        f"[iperf] total {(total.get('total_bps') or 0) / 1e6:.2f} Mbit/s over "
+        f"{total['pairs_ok']}/{total['pairs']} pairs"
+    )
+    status = "PASSED" if total["pairs_ok"] == total["pairs"] else "FAILED"
+    return status, {"pairs": results, "total": total}
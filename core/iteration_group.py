@@ -0,0 +1,269 @@
+"""iteration_group node: lazy parameter-matrix sweeps with parallel fan-out."""
+import json
+import queue
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Tuple, Dict, Any, List, Iterator
+
+from database import db_exec
+from utils import find_device
+from .node_graph import register_node_handler, run_node_graph
+from .assert_expr import compile_expr, flat_metrics, ExprError
+
+
+ITERATION_DEFAULTS = {
+    "mode": "cartesian",
+    "parallel": 1,
+    # Per-iteration summaries kept in the node's metrics (all go to run_results)
+    "keep_results": 1000,
+}
+
+_PLACEHOLDER_RE = re.compile(r"^\{(\w+)\}$")
+
+
+def _values(spec) -> Iterator:
+    """A matrix axis: a list, or {"start", "stop", "step"} expanded lazily as a range."""
+    if isinstance(spec, dict):
+        start, stop, step = spec.get("start", 0), spec["stop"], spec.get("step", 1)
+        if all(isinstance(x, int) for x in (start, stop, step)):
+            return iter(range(start, stop, step))
+        return _frange(float(start), float(stop), float(step))
+    if isinstance(spec, (list, tuple)):
+        return iter(spec)
+    return iter([spec])
+
+
+def _frange(start: float, stop: float, step: float) -> Iterator[float]:
+    i = 0
+    while True:
+        x = start + i * step
+        if (step > 0 and x >= stop) or (step < 0 and x <= stop):
+            return
+        yield round(x, 9)
+        i += 1
+
+
+_MATRIX_KEYS = {"mode", "params", "items"}
+
+
+def expand_matrix(matrix: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """
+    Return a generator of one {name: value} dict per iteration, never
+    materializing the whole sweep. matrix: {"mode": "cartesian" | "zip",
+    "params": {name: [values] | {"start","stop","step"}}} or
+    {"mode": "list", "items": [{...}, ...]}. A malformed matrix raises
+    ValueError here rather than silently yielding nothing.
+    """
+    if not isinstance(matrix, dict):
+        raise ValueError("matrix must be an object")
+    unknown = sorted(set(matrix) - _MATRIX_KEYS)
+    if unknown:
+        raise ValueError(f"unknown matrix key(s) {', '.join(map(repr, unknown))} "
+                         f"(expected mode, params or items)")
+    mode = (matrix.get("mode") or ITERATION_DEFAULTS["mode"]).lower()
+    if mode == "list":
+        if not isinstance(matrix.get("items"), list):
+            raise ValueError('matrix mode "list" needs "items": [{...}, ...]')
+        return (dict(item) for item in matrix["items"])
+    if mode not in ("zip", "cartesian"):
+        raise ValueError(f"unknown matrix mode {mode!r}")
+    axes = matrix.get("params")
+    if not isinstance(axes, dict) or not axes:
+        raise ValueError(f'matrix mode {mode!r} needs "params": {{name: [values], ...}}')
+    names = list(axes)
+    if mode == "zip":
+        return (dict(zip(names, combo)) for combo in zip(*(_values(axes[n]) for n in names)))
+
+    # Nested generators: only the inner axes are re-created per outer value
+    def _walk(i: int, acc: Dict[str, Any]):
+        if i == len(names):
+            yield dict(acc)
+            return
+        for v in _values(axes[names[i]]):
+            acc[names[i]] = v
+            yield from _walk(i + 1, acc)
+    return _walk(0, {})
+
+
+def substitute(obj, variables: Dict[str, Any]):
+    """Fill {name} placeholders in strings; a lone "{name}" keeps the value's type."""
+    if isinstance(obj, str):
+        m = _PLACEHOLDER_RE.match(obj)
+        if m and m.group(1) in variables:
+            return variables[m.group(1)]
+        try:
+            return obj.format_map(_Defaulting(variables))
+        except (ValueError, IndexError, AttributeError):
+            return obj
+    if isinstance(obj, list):
+        return [substitute(x, variables) for x in obj]
+    if isinstance(obj, dict):
+        return {k: substitute(v, variables) for k, v in obj.items()}
+    return obj
+
+
+class _Defaulting(dict):
+    """format_map mapping that leaves unknown placeholders untouched."""
+
+    def __missing__(self, key):
+        return "{" + key + "}"
+
+
+def _body_graph(params: Dict[str, Any]) -> Dict[str, Any]:
+    body = params.get("body") or {}
+    if "nodes" in body:
+        return body
+    # A single node body runs as a one-node graph
+    return {"nodes": [dict(body, id=body.get("id") or "body")]}
+
+
+def _record_result(tb_ctx: Dict[str, Any], index: int, variables: Dict[str, Any], status: str,
+                   metrics: Dict[str, Any], duration: float, log_q: queue.Queue):
+    run_id, testcase_id = tb_ctx.get("run_id"), tb_ctx.get("testcase_id")
+    if run_id is None or testcase_id is None:
+        return
+    try:
+        db_exec(
+            "INSERT INTO run_results (run_id, testcase_id, status, logs, metrics_json, duration_s) VALUES (?,?,?,?,?,?)",
+            (run_id, testcase_id, status, "",
+             json.dumps({"iteration": index, "vars": variables, "metrics": metrics}, default=str), duration),
+        )
+    except Exception as e:
+        log_q.put(f"[iter] could not record iteration {index}: {e}")
+
+
+def run_iteration_group(node: Dict[str, Any], ctx: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """
+    Run params["body"] (a node or {"nodes": [...]}) once per matrix entry.
+
+    params: matrix (see expand_matrix), body, parallel, devices (pool of
+    device refs; each iteration takes a free one, bound as {device}),
+    assert (expression checked after every iteration), stop_on_fail,
+    max_failures, keep_results, allow_empty (a matrix that yields no
+    iterations fails unless this is set). Iterations are pulled from
+    the generator only when a worker and a device are free, and each
+    result is written to run_results on this thread as it completes.
+    """
+    p = node.get("params") or {}
+    tb_ctx, log_q = ctx["tb_ctx"], ctx["log_q"]
+    parent_cancel: threading.Event = ctx["cancel_event"]
+    parallel = max(1, int(p.get("parallel", ITERATION_DEFAULTS["parallel"])))
+    keep = int(p.get("keep_results", ITERATION_DEFAULTS["keep_results"]))
+    max_failures = p.get("max_failures")
+    if p.get("stop_on_fail"):
+        max_failures = 1
+    body = _body_graph(p)
+    check = None
+    if p.get("assert"):
+        try:
+            check = compile_expr(str(p["assert"]))
+        except ExprError as e:
+            return "FAILED", {"error": str(e)}
+
+    all_devices = tb_ctx.get("devices") or []
+    pool_refs = p.get("devices") or []
+    free_devices: List[Dict[str, Any]] = [d for d in (find_device(all_devices, r) for r in pool_refs) if d]
+    if pool_refs and not free_devices:
+        return "FAILED", {"error": "none of the pool devices exist in the testbed"}
+    if free_devices:
+        parallel = min(parallel, len(free_devices))
+
+    try:
+        iterations = enumerate(expand_matrix(p.get("matrix") or {}))
+    except ValueError as e:
+        return "FAILED", {"error": str(e)}
+
+    # Stopping early cancels in-flight iterations too, without touching the parent run
+    stop = threading.Event()
+
+    def _run_one(index: int, variables: Dict[str, Any], device: Dict[str, Any] | None):
+        local_vars = dict(variables, iteration=index)
+        if device is not None:
+            local_vars["device"] = device.get("name")
+        graph = substitute(body, local_vars)
+        if device is not None:
+            for n in graph.get("nodes") or []:
+                n.setdefault("device", device.get("name"))
+        iter_ctx = dict(tb_ctx, iteration=local_vars)
+        return run_node_graph(graph, iter_ctx, log_q, cancel_event=stop)
+
+    counts = {"PASSED": 0, "FAILED": 0}
+    summaries: List[Dict[str, Any]] = []
+    stopped = ""
+    exhausted = False
+    in_flight: Dict[Any, Tuple[int, Dict[str, Any], Dict[str, Any] | None, float]] = {}
+    t0 = time.time()
+
+    with ThreadPoolExecutor(max_workers=parallel, thread_name_prefix="iter") as pool:
+        while True:
+            while not (exhausted or stopped) and len(in_flight) < parallel and (free_devices or not pool_refs):
+                try:
+                    index, variables = next(iterations)
+                except StopIteration:
+                    exhausted = True
+                    break
+                except Exception as e:
+                    stopped = f"matrix error: {e}"
+                    break
+                device = free_devices.pop(0) if pool_refs else None
+                log_q.put(f"[iter] #{index} start {variables}" + (f" on {device.get('name')}" if device else ""))
+                in_flight[pool.submit(_run_one, index, variables, device)] = (index, variables, device, time.time())
+
+            if not in_flight:
+                break
+
+            done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+            for fut in done:
+                index, variables, device, started = in_flight.pop(fut)
+                if device is not None:
+                    free_devices.append(device)
+                try:
+                    status, metrics = fut.result()
+                except Exception as e:
+                    status, metrics = "FAILED", {"error": str(e)}
+                duration = time.time() - started
+                status = "PASSED" if status == "PASSED" else "FAILED"
+                # The namespace of both this assert and a downstream assert_expr over the results column
+                flat = dict(flat_metrics(metrics), **variables)
+                if check is not None and status == "PASSED":
+                    ok, err = check.evaluate(flat)
+                    if not ok:
+                        status = "FAILED"
+                        metrics = dict(metrics, assert_failed=check.source, assert_error=err)
+                counts[status] += 1
+                log_q.put(f"[iter] #{index} {status} in {duration:.1f}s")
+                _record_result(tb_ctx, index, variables, status, metrics, duration, log_q)
+                if len(summaries) < keep:
+                    summary = {"iteration": index, "vars": variables, "status": status,
+                               "duration_s": round(duration, 3), "metrics": flat}
+                    summaries.append(summary)
+
+            if not stopped:
+                if parent_cancel.is_set():
+                    stopped = "cancelled"
+                elif max_failures is not None and counts["FAILED"] >= int(max_failures):
+                    stopped = f"{counts['FAILED']} failure(s) reached max_failures={max_failures}"
+                if stopped:
+                    log_q.put(f"[iter] stopping early: {stopped}")
+                    stop.set()
+
+    metrics = {
+        "iterations": counts["PASSED"] + counts["FAILED"],
+        "passed": counts["PASSED"],
+        "failed": counts["FAILED"],
+        "wall_s": round(time.time() - t0, 3),
+        "results": summaries,
+    }
+    if stopped:
+        metrics["stopped_early"] = stopped
+    status = "PASSED" if counts["FAILED"] == 0 and not stopped else "FAILED"
+    if not metrics["iterations"] and not stopped and not p.get("allow_empty"):
+        metrics["error"] = "the matrix yielded no iterations (set allow_empty to accept that)"
+        log_q.put(f"[iter] {metrics['error']}")
+        status = "FAILED"
+    return status, metrics
+
+
+register_node_handler("iteration_group", run_iteration_group)
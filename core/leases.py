@@ -0,0 +1,141 @@
+"""Exclusive testbed leases (testbed_leases table) shared by scheduler jobs, resumes and sharded runs."""
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import List, Callable
+
+from database import db_query, db_exec, get_conn
+
+
+LEASE_DEFAULTS = {
+    # A lease not renewed for this long is considered abandoned
+    "ttl_s": 60,
+    "heartbeat_s": 15,
+}
+
+# job_id recorded for leases not held by a scheduler job
+NO_JOB = 0
+
+
+def default_owner(kind: str = "") -> str:
+    prefix = f"{kind}:" if kind else ""
+    return f"{prefix}{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+@contextmanager
+def _immediate():
+    """Write transaction that takes the database write lock up front."""
+    conn = get_conn()
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def acquire_lease(testbed_id: int, job_id: int, owner: str, lease_ttl_s: float) -> str:
+    """Atomically lease a bed unless someone else holds a live lease. Returns the holder on failure, else ''."""
+    now = time.time()
+    with _immediate() as conn:
+        row = conn.execute("SELECT owner, expires_ts FROM testbed_leases WHERE testbed_id=?",
+                           (testbed_id,)).fetchone()
+        if row is not None and row["expires_ts"] >= now and row["owner"] != owner:
+            return row["owner"]
+        conn.execute(
+            "INSERT OR REPLACE INTO testbed_leases (testbed_id, job_id, owner, acquired_ts, heartbeat_ts, expires_ts) "
+            "VALUES (?,?,?,?,?,?)",
+            (testbed_id, job_id, owner, now, now, now + lease_ttl_s),
+        )
+    return ""
+
+
+def renew_lease(testbed_id: int, job_id: int, owner: str, lease_ttl_s: float) -> bool:
+    """Heartbeat. False means the lease was lost (expired and taken over)."""
+    now = time.time()
+    cur = db_exec(
+        "UPDATE testbed_leases SET heartbeat_ts=?, expires_ts=? WHERE testbed_id=? AND job_id=? AND owner=?",
+        (now, now + lease_ttl_s, testbed_id, job_id, owner),
+    )
+    return cur.rowcount == 1
+
+
+def release_lease(testbed_id: int, job_id: int, owner: str):
+    db_exec("DELETE FROM testbed_leases WHERE testbed_id=? AND job_id=? AND owner=?", (testbed_id, job_id, owner))
+
+
+def lease_holder(testbed_id: int) -> str:
+    """Owner of the live lease on a bed, or ''."""
+    row = db_query("SELECT owner FROM testbed_leases WHERE testbed_id=? AND expires_ts >= ?",
+                   (testbed_id, time.time()), one=True)
+    return row["owner"] if row else ""
+
+
+class LeaseSet:
+    """
+    Leases held outside a scheduler job (a resumed or sharded run): taken
+    with acquire(), renewed by a heartbeat thread, and released on
+    release() / leaving the with-block. on_lost(testbed_id) is called if a
+    lease expires and is taken over.
+    """
+
+    def __init__(self, owner: str | None = None, on_lost: Callable[[int], None] | None = None,
+                 lease_ttl_s: float = LEASE_DEFAULTS["ttl_s"],
+                 heartbeat_s: float = LEASE_DEFAULTS["heartbeat_s"]):
+        self.owner = owner or default_owner()
+        self.on_lost = on_lost
+        self.lease_ttl_s = lease_ttl_s
+        self.heartbeat_s = heartbeat_s
+        self.held: List[int] = []
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def acquire(self, testbed_id: int) -> str:
+        """Lease one bed. Returns '' on success, else the current holder."""
+        holder = acquire_lease(testbed_id, NO_JOB, self.owner, self.lease_ttl_s)
+        if holder:
+            return holder
+        with self._lock:
+            self.held.append(testbed_id)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._heartbeat, daemon=True, name="testrig-lease")
+                self._thread.start()
+        return ""
+
+    def _heartbeat(self):
+        while not self._stop.wait(self.heartbeat_s):
+            with self._lock:
+                beds = list(self.held)
+            for bed in beds:
+                try:
+                    ok = renew_lease(bed, NO_JOB, self.owner, self.lease_ttl_s)
+                except Exception:
+                    continue  # database busy: retry at the next beat, well within the TTL
+                if not ok:
+                    with self._lock:
+                        self.held.remove(bed)
+                    if self.on_lost is not None:
+                        self.on_lost(bed)
+
+    def release(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        with self._lock:
+            beds, self.held = self.held, []
+        for bed in beds:
+            release_lease(bed, NO_JOB, self.owner)
+
+    def __enter__(self) -> "LeaseSet":
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
@@ -0,0 +1,234 @@
+"""live_tail node: tail logs on many devices into one time-ordered stream."""
+import collections
+import heapq
+import queue
+import re
+import threading
+import time
+from typing import Tuple, Dict, Any, List, Optional
+
+from utils import find_device
+from .device_shell import run_streaming_shell_on_device
+from .node_graph import EventBus, register_node_handler
+
+
+LIVE_TAIL_DEFAULTS = {
+    "command": "logread -f",
+    "duration_s": 60,
+    # Lines buffered per source before the oldest are dropped
+    "max_lines_per_source": 10000,
+    # Merged lines kept in the node's metrics
+    "keep_lines": 200,
+}
+
+
+class _Source:
+    """
+    Per-device line buffer handed to run_streaming_shell_on_device as its
+    log queue. Lines are stamped on arrival, checked against triggers and
+    appended to a bounded deque; the oldest lines go if the merger falls behind.
+    """
+
+    def __init__(self, name: str, mux: "LiveTailMux", max_lines: int):
+        self.name = name
+        self.mux = mux
+        self.lines: collections.deque = collections.deque(maxlen=max_lines)
+        self.received = 0
+        self.dropped = 0
+        self.done = False
+
+    def put(self, line, block=True, timeout=None):
+        line = str(line)
+        with self.mux.cond:
+            ts = time.time()
+            if len(self.lines) == self.lines.maxlen:
+                self.dropped += 1
+            self.lines.append((ts, line))
+            self.received += 1
+            self.mux.cond.notify()
+        self.mux.check_triggers(self.name, ts, line)
+
+    put_nowait = put
+
+
+class LiveTailMux:
+    """
+    Runs one streaming tail per source and merges their lines by receive
+    timestamp. Each source's buffer is already in timestamp order, and
+    every line still to come will be stamped later than anything buffered,
+    so a k-way heap merge of the buffered lines is final: nothing emitted
+    can be overtaken by a later arrival.
+    """
+
+    def __init__(self, sources: List[Dict[str, Any]], log_q: queue.Queue, bus: EventBus | None = None,
+                 triggers: List[Dict[str, Any]] | None = None,
+                 max_lines: int = LIVE_TAIL_DEFAULTS["max_lines_per_source"]):
+        self.cond = threading.Condition()
+        self.log_q = log_q
+        self.bus = bus or EventBus()
+        self.sources = sources
+        self.buffers = {s["name"]: _Source(s["name"], self, max_lines) for s in sources}
+        self.triggers = [
+            {"name": t["name"], "re": re.compile(t["regex"]), "source": t.get("source"), "hits": 0}
+            for t in (triggers or [])
+        ]
+        self._trig_lock = threading.Lock()
+        self.cancel = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self.rcs: Dict[str, int] = {}
+
+    def check_triggers(self, source: str, ts: float, line: str):
+        for trig in self.triggers:
+            if trig["source"] and trig["source"] != source:
+                continue
+            if trig["re"].search(line):
+                with self._trig_lock:
+                    trig["hits"] += 1
+                    first = trig["hits"] == 1
+                if first:
+                    self.bus.set(trig["name"], {"source": source, "ts": ts, "line": line})
+
+    def start(self, duration: float):
+        for spec in self.sources:
+            t = threading.Thread(target=self._tail, args=(spec, duration), daemon=True,
+                                 name=f"tail-{spec['name']}")
+            t.start()
+            self._threads.append(t)
+
+    def _tail(self, spec: Dict[str, Any], duration: float):
+        buf = self.buffers[spec["name"]]
+        try:
+            rc = run_streaming_shell_on_device(spec["device"], spec["command"], spec.get("access"), buf,
+                                               duration=int(duration) + 1, cancel_event=self.cancel)
+        except Exception as e:
+            buf.put(f"[tail error] {e}")
+            rc = 127
+        self.rcs[spec["name"]] = rc
+        with self.cond:
+            buf.done = True
+            self.cond.notify()
+
+    def drain(self) -> List[Tuple[float, str, str]]:
+        """Take every buffered line, merged across sources in timestamp order."""
+        with self.cond:
+            runs = []
+            for name, buf in self.buffers.items():
+                if buf.lines:
+                    runs.append([(ts, name, line) for ts, line in buf.lines])
+                    buf.lines.clear()
+        return list(heapq.merge(*runs))
+
+    def run(self, duration: float, stop: Optional[threading.Event] = None,
+            on_line=None) -> None:
+        """Tail for `duration` seconds (or until `stop`/cancel), emitting merged lines as they come."""
+        deadline = time.time() + duration
+        self.start(duration)
+        while True:
+            with self.cond:
+                all_done = all(b.done for b in self.buffers.values())
+                if not any(b.lines for b in self.buffers.values()) and not all_done:
+                    self.cond.wait(max(0.0, min(0.5, deadline - time.time())))
+            for item in self.drain():
+                if on_line is not None:
+                    on_line(*item)
+            if all_done or time.time() >= deadline or (stop is not None and stop.is_set()):
+                break
+        self.cancel.set()
+        for t in self._threads:
+            t.join(timeout=5)
+        for item in self.drain():
+            if on_line is not None:
+                on_line(*item)
+
+
+def _sources_from_params(p: Dict[str, Any], devices: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], str]:
+    specs = list(p.get("sources") or [])
+    for ref in p.get("devices") or []:
+        specs.append({"device": ref})
+    out = []
+    for spec in specs:
+        dev = find_device(devices, spec.get("device"))
+        if dev is None:
+            return [], f"device {spec.get('device')!r} not found"
+        name = spec.get("name") or dev.get("name") or str(dev.get("id"))
+        if any(s["name"] == name for s in out):
+            name = f"{name}#{len(out)}"
+        out.append({
+            "name": name,
+            "device": dev,
+            "command": spec.get("command") or p.get("command") or LIVE_TAIL_DEFAULTS["command"],
+            "access": spec.get("access", p.get("access")),
+        })
+    if not out:
+        return [], "no sources given"
+    return out, ""
+
+
+def run_live_tail(node: Dict[str, Any], ctx: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """
+    params: sources [{device, command, access, name}] and/or devices [refs]
+    with a shared command; duration_s; triggers [{name, regex, source}]
+    that set graph events (see EventBus / "wait_for"); stop_on (event
+    name, e.g. "node:iperf:done"); outfile; require_triggers (fail if
+    these never fired); max_lines_per_source; keep_lines.
+    """
+    p = node.get("params") or {}
+    log_q = ctx["log_q"]
+    sources, err = _sources_from_params(p, ctx["tb_ctx"].get("devices") or [])
+    if err:
+        return "FAILED", {"error": err}
+    bus: EventBus = ctx.get("events") or EventBus()
+    mux = LiveTailMux(sources, log_q, bus, p.get("triggers"),
+                      int(p.get("max_lines_per_source", LIVE_TAIL_DEFAULTS["max_lines_per_source"])))
+
+    keep = collections.deque(maxlen=int(p.get("keep_lines", LIVE_TAIL_DEFAULTS["keep_lines"])))
+    outfile = open(p["outfile"], "a", encoding="utf-8") if p.get("outfile") else None
+
+    def _emit(ts: float, source: str, line: str):
+        stamp = time.strftime("%H:%M:%S", time.localtime(ts)) + f".{int(ts * 1000) % 1000:03d}"
+        text = f"[{stamp}] [{source}] {line}"
+        log_q.put(text)
+        keep.append(text)
+        if outfile is not None:
+            outfile.write(text + "\n")
+
+    # Stop on the node's own stop event or a graph-wide cancel, whichever comes first
+    stop = threading.Event()
+    if p.get("stop_on"):
+        bus.add_listener(lambda name: stop.set() if name == p["stop_on"] else None)
+        if bus.is_set(p["stop_on"]):
+            stop.set()
+    cancel = ctx.get("cancel_event")
+    watcher_done = threading.Event()
+
+    def _watch_cancel():
+        while not watcher_done.is_set():
+            if cancel is not None and cancel.wait(0.5):
+                stop.set()
+                return
+
+    if cancel is not None:
+        threading.Thread(target=_watch_cancel, daemon=True).start()
+    try:
+        mux.run(float(p.get("duration_s", LIVE_TAIL_DEFAULTS["duration_s"])), stop=stop, on_line=_emit)
+    finally:
+        watcher_done.set()
+        if outfile is not None:
+            outfile.close()
+
+    metrics = {
+        "sources": {
+            name: {"lines": b.received, "dropped": b.dropped, "rc": mux.rcs.get(name)}
+            for name, b in mux.buffers.items()
+        },
+        "triggers": {t["name"]: t["hits"] for t in mux.triggers},
+        "tail": list(keep),
+    }
+    missing = [t for t in (p.get("require_triggers") or []) if not metrics["triggers"].get(t)]
+    if missing:
+        metrics["error"] = f"triggers never fired: {', '.join(missing)}"
+        return "FAILED", metrics
+    return "PASSED", metrics
+
+
+register_node_handler("live_tail", run_live_tail)
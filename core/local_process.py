@@ -0,0 +1,221 @@
+"""Local subprocess runner: line streaming, bounded memory, timeouts and cancellation."""
+import collections
+import os
+import queue
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, Any, List, Optional
+
+
+LOCAL_PROCESS_DEFAULTS = {
+    # Output kept in memory; past this everything also goes to the spill log
+    "mem_bytes": 1024 * 1024,
+    # Longest single line read (longer lines are split)
+    "line_max_bytes": 64 * 1024,
+    "spill_dir": os.path.join(tempfile.gettempdir(), "testrig_logs"),
+    "spill_max_bytes": 64 * 1024 * 1024,
+    "spill_backups": 3,
+    # SIGTERM -> SIGKILL grace period on timeout/cancel
+    "kill_grace_s": 5.0,
+    # Lines of output returned in the result
+    "tail_lines": 50,
+}
+
+
+class _RotatingSpill:
+    """Append-only log file rotated to .1 .. .N once it reaches max_bytes."""
+
+    def __init__(self, path: str, max_bytes: int, backups: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.written = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._f = open(path, "ab")
+        self._size = self._f.tell()
+
+    def write(self, data: bytes):
+        if self._size and self._size + len(data) > self.max_bytes:
+            self._rotate()
+        self._f.write(data)
+        self._size += len(data)
+        self.written += len(data)
+
+    def _rotate(self):
+        self._f.close()
+        for i in range(self.backups - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        self._f = open(self.path, "wb")
+        self._size = 0
+
+    def close(self):
+        self._f.close()
+
+
+class _OutputBuffer:
+    """
+    In-memory output capped at mem_bytes (oldest lines dropped). The first
+    time the cap is hit the buffered lines are written to the spill log and
+    every later line goes there too, so nothing is lost.
+    """
+
+    def __init__(self, mem_bytes: int, spill_path: str, spill_max_bytes: int, spill_backups: int):
+        self.lines: collections.deque = collections.deque()
+        self.mem = 0
+        self.mem_bytes = mem_bytes
+        self.spill_path = spill_path
+        self.spill_max_bytes = spill_max_bytes
+        self.spill_backups = spill_backups
+        self.spill: Optional[_RotatingSpill] = None
+        self.total_lines = 0
+        self.total_bytes = 0
+
+    def add(self, raw: bytes):
+        self.total_lines += 1
+        self.total_bytes += len(raw)
+        if self.spill is None and self.mem + len(raw) > self.mem_bytes:
+            self.spill = _RotatingSpill(self.spill_path, self.spill_max_bytes, self.spill_backups)
+            for old in self.lines:
+                self.spill.write(old)
+        if self.spill is not None:
+            self.spill.write(raw)
+        self.lines.append(raw)
+        self.mem += len(raw)
+        while self.mem > self.mem_bytes and len(self.lines) > 1:
+            self.mem -= len(self.lines.popleft())
+
+    def tail(self, n: int) -> List[str]:
+        return [b.decode("utf-8", errors="replace").rstrip("\r\n") for b in list(self.lines)[-n:]]
+
+    def close(self):
+        if self.spill is not None:
+            self.spill.close()
+
+
+def _signal_group(proc: subprocess.Popen, sig) -> None:
+    try:
+        if os.name == "posix":
+            os.killpg(proc.pid, sig)
+        elif sig == signal.SIGTERM:
+            proc.terminate()
+        else:
+            proc.kill()
+    except (ProcessLookupError, PermissionError, OSError):
+        pass
+
+
+def _reap(proc: subprocess.Popen) -> Optional[int]:
+    """Wait for the child; returns peak RSS in KiB where wait4 is available."""
+    if not hasattr(os, "wait4"):
+        proc.wait()
+        return None
+    try:
+        _, status, usage = os.wait4(proc.pid, 0)
+    except ChildProcessError:
+        proc.wait()
+        return None
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return usage.ru_maxrss // 1024 if os.uname().sysname == "Darwin" else usage.ru_maxrss
+
+
+def run_local_command(
+    cmd,
+    log_q: queue.Queue,
+    timeout: float | None = None,
+    cancel_event: threading.Event | None = None,
+    shell: bool = False,
+    spill_path: str | None = None,
+    mem_bytes: int | None = None,
+    kill_grace_s: float | None = None,
+    env: Dict[str, str] | None = None,
+    cwd: str | None = None,
+    on_line: Callable[[str], None] | None = None,
+) -> Dict[str, Any]:
+    """
+    Run a local command in its own process group, putting each stdout/stderr
+    line on log_q as it arrives. Output beyond mem_bytes spills to a
+    rotating log at spill_path. On timeout or cancel_event the group gets
+    SIGTERM, then SIGKILL after kill_grace_s. With on_line, every line
+    goes to that callback instead of log_q and the output buffer (for
+    callers that parse high-volume output themselves).
+    Returns {"rc", "wall_s", "peak_rss_kb", "lines", "bytes", "timed_out",
+    "cancelled", "spill_file", "tail"}.
+    """
+    d = LOCAL_PROCESS_DEFAULTS
+    grace = d["kill_grace_s"] if kill_grace_s is None else kill_grace_s
+    spill_path = spill_path or os.path.join(
+        d["spill_dir"], f"cmd_{time.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}_{threading.get_ident()}.log"
+    )
+    out = _OutputBuffer(mem_bytes or d["mem_bytes"], spill_path, d["spill_max_bytes"], d["spill_backups"])
+
+    popen_kw: Dict[str, Any] = {}
+    if os.name == "posix":
+        popen_kw["start_new_session"] = True
+    else:
+        popen_kw["creationflags"] = getattr(subprocess, "CREATE_NEW_PROCESS_GROUP", 0)
+    t0 = time.time()
+    proc = subprocess.Popen(
+        cmd, shell=shell, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT, env=env, cwd=cwd, **popen_kw,
+    )
+
+    stop = {"reason": ""}
+    finished = threading.Event()
+
+    def _watchdog():
+        deadline = None if timeout is None else t0 + timeout
+        while not finished.is_set():
+            if cancel_event is not None and cancel_event.is_set():
+                stop["reason"] = "cancelled"
+            elif deadline is not None and time.time() >= deadline:
+                stop["reason"] = "timed_out"
+            if stop["reason"]:
+                log_q.put(f"[cmd] {stop['reason'].replace('_', ' ')}; sending SIGTERM to process group {proc.pid}")
+                _signal_group(proc, signal.SIGTERM)
+                if not finished.wait(grace):
+                    log_q.put(f"[cmd] still running after {grace:.0f}s; sending SIGKILL")
+                    _signal_group(proc, getattr(signal, "SIGKILL", signal.SIGTERM))
+                return
+            finished.wait(0.2)
+
+    watcher = threading.Thread(target=_watchdog, daemon=True, name="cmd-watchdog")
+    watcher.start()
+
+    line_max = d["line_max_bytes"]
+    peak_rss = None
+    try:
+        for raw in iter(lambda: proc.stdout.readline(line_max), b""):
+            if on_line is not None:
+                on_line(raw.decode("utf-8", errors="replace").rstrip("\r\n"))
+                continue
+            out.add(raw)
+            log_q.put(raw.decode("utf-8", errors="replace").rstrip("\r\n"))
+        peak_rss = _reap(proc)
+    finally:
+        finished.set()
+        if proc.poll() is None:
+            _signal_group(proc, getattr(signal, "SIGKILL", signal.SIGTERM))
+            proc.wait()
+        proc.stdout.close()
+        out.close()
+    watcher.join(timeout=1)
+
+    return {
+        "rc": proc.returncode,
+        "wall_s": round(time.time() - t0, 3),
+        "peak_rss_kb": peak_rss,
+        "lines": out.total_lines,
+        "bytes": out.total_bytes,
+        "timed_out": stop["reason"] == "timed_out",
+        "cancelled": stop["reason"] == "cancelled",
+        "spill_file": spill_path if out.spill is not None else None,
+        "tail": out.tail(d["tail_lines"]),
+    }
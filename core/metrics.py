@@ -0,0 +1,68 @@
+"""Incremental metric summaries for long-running, streaming actions."""
+import math
+from typing import Dict
+
+
+class StreamingSummary:
+    """
+    Running count/min/max/mean plus approximate quantiles of a stream of
+    non-negative samples, without keeping the samples. Values are counted
+    in logarithmic buckets, so any quantile is within `rel_err` of a real
+    sample and memory grows with the value range, not the sample count.
+    """
+
+    def __init__(self, rel_err: float = 0.01):
+        self.rel_err = float(rel_err)
+        self._gamma = (1.0 + rel_err) / (1.0 - rel_err)
+        self._log_gamma = math.log(self._gamma)
+        self._buckets: Dict[int, int] = {}
+        self._zeros = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        if value is None:
+            return
+        x = float(value)
+        if math.isnan(x):
+            return
+        self.count += 1
+        self.total += x
+        self.min = x if self.min is None else min(self.min, x)
+        self.max = x if self.max is None else max(self.max, x)
+        if x <= 0:
+            self._zeros += 1
+        else:
+            idx = math.ceil(math.log(x) / self._log_gamma)
+            self._buckets[idx] = self._buckets.get(idx, 0) + 1
+
+    def quantile(self, q: float):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self._zeros
+        if rank < seen:
+            return max(self.min, 0.0)
+        for idx in sorted(self._buckets):
+            seen += self._buckets[idx]
+            if rank < seen:
+                est = 2.0 * self._gamma ** idx / (self._gamma + 1.0)
+                return min(max(est, self.min), self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def as_dict(self, prefix: str = "") -> Dict[str, float]:
+        """{prefix}min/p50/p95/max/mean/count, ready to merge into action metrics."""
+        return {
+            f"{prefix}min": self.min,
+            f"{prefix}p50": self.quantile(0.50),
+            f"{prefix}p95": self.quantile(0.95),
+            f"{prefix}max": self.max,
+            f"{prefix}mean": self.mean,
+            f"{prefix}count": self.count,
+        }
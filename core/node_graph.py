@@ -0,0 +1,433 @@
+"""Node-graph (DAG) execution: topological scheduling on a worker pool."""
+import queue
+import shlex
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future, InvalidStateError, wait, FIRST_COMPLETED
+from typing import Tuple, Dict, Any, List, Callable
+
+from config import DEFAULT_NODE_DELAYS
+from utils import find_device
+from .actions import get_action_registry
+from .device_shell import run_shell_on_device, sync_text_file_on_device
+from .probe_engine import get_probe_engine
+
+
+NODE_GRAPH_DEFAULTS = {
+    "max_workers": 8,
+    # Nodes allowed to run on one device at the same time
+    "device_concurrency": 1,
+}
+
+NodeHandler = Callable[[Dict[str, Any], Dict[str, Any]], Tuple[str, Dict[str, Any]]]
+
+# node type -> handler(node, ctx) -> (status, metrics)
+NODE_HANDLERS: Dict[str, NodeHandler] = {}
+
+
+def register_node_handler(node_type: str, handler: NodeHandler):
+    """Register (or replace) the handler for a node type."""
+    NODE_HANDLERS[node_type] = handler
+
+
+class EventBus:
+    """
+    Named one-shot signals shared by the nodes of one graph run. Nodes
+    set them (e.g. live_tail regex triggers); the scheduler holds nodes
+    with "wait_for" until they fire, and handlers can wait() on them.
+    Every finished node also sets "node:<id>:done".
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events: Dict[str, threading.Event] = {}
+        self._info: Dict[str, Any] = {}
+        self._listeners: List[Callable[[str], None]] = []
+
+    def event(self, name: str) -> threading.Event:
+        with self._lock:
+            ev = self._events.get(name)
+            if ev is None:
+                ev = self._events[name] = threading.Event()
+            return ev
+
+    def set(self, name: str, info: Any = None):
+        ev = self.event(name)
+        with self._lock:
+            if ev.is_set():
+                return
+            self._info[name] = info
+            ev.set()
+            listeners = list(self._listeners)
+        for cb in listeners:
+            cb(name)
+
+    def is_set(self, name: str) -> bool:
+        return self.event(name).is_set()
+
+    def wait(self, name: str, timeout: float | None = None) -> bool:
+        return self.event(name).wait(timeout)
+
+    def info(self, name: str) -> Any:
+        with self._lock:
+            return self._info.get(name)
+
+    def add_listener(self, cb: Callable[[str], None]):
+        with self._lock:
+            self._listeners.append(cb)
+
+
+class GraphError(ValueError):
+    """Raised for malformed graphs: duplicate ids, unknown dependencies, cycles."""
+
+
+# -- graph preparation ---------------------------------------------------------
+
+def _flatten(nodes: List[Dict[str, Any]], outer_deps: List[str], out: List[Dict[str, Any]]):
+    """
+    Expand parallel_group nodes in place: children inherit the group's
+    dependencies, and the group id becomes a join node that depends on
+    every child, so later nodes can depend on the group as a whole.
+    """
+    for raw in nodes:
+        node = dict(raw)
+        node["depends_on"] = list(outer_deps) + list(node.get("depends_on") or [])
+        if node.get("type") == "parallel_group":
+            children = node.pop("children", None) or (node.get("params") or {}).get("children") or []
+            start = len(out)
+            _flatten(children, node["depends_on"], out)
+            node["depends_on"] = [c["id"] for c in out[start:]] or node["depends_on"]
+            node["_join"] = True
+        out.append(node)
+
+
+def prepare_graph(graph: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Flatten groups and validate. Returns {node_id: node} in declaration order."""
+    flat: List[Dict[str, Any]] = []
+    _flatten(graph.get("nodes") or [], [], flat)
+    nodes: Dict[str, Dict[str, Any]] = {}
+    for i, n in enumerate(flat):
+        n.setdefault("id", f"{n.get('type', 'node')}_{i}")
+        n["id"] = str(n["id"])
+        if n["id"] in nodes:
+            raise GraphError(f"duplicate node id {n['id']!r}")
+        nodes[n["id"]] = n
+    for n in nodes.values():
+        n["depends_on"] = [str(d) for d in dict.fromkeys(n["depends_on"])]
+        for d in n["depends_on"]:
+            if d not in nodes:
+                raise GraphError(f"node {n['id']!r} depends on unknown node {d!r}")
+
+    # Kahn's algorithm, only to reject cycles before anything runs
+    indeg = {nid: len(n["depends_on"]) for nid, n in nodes.items()}
+    children = _children(nodes)
+    ready = [nid for nid, k in indeg.items() if k == 0]
+    seen = 0
+    while ready:
+        nid = ready.pop()
+        seen += 1
+        for c in children[nid]:
+            indeg[c] -= 1
+            if indeg[c] == 0:
+                ready.append(c)
+    if seen != len(nodes):
+        stuck = sorted(nid for nid, k in indeg.items() if k > 0)
+        raise GraphError(f"dependency cycle among nodes: {', '.join(stuck)}")
+    return nodes
+
+
+def _children(nodes: Dict[str, Dict[str, Any]]) -> Dict[str, List[str]]:
+    children: Dict[str, List[str]] = {nid: [] for nid in nodes}
+    for nid, n in nodes.items():
+        for d in n["depends_on"]:
+            children[d].append(nid)
+    return children
+
+
+def node_device(node: Dict[str, Any], ctx: Dict[str, Any]) -> Dict[str, Any] | None:
+    """The device row a node targets (node["device"] or params["device"]), if any."""
+    ref = node.get("device", (node.get("params") or {}).get("device"))
+    return find_device(ctx["tb_ctx"].get("devices") or [], ref)
+
+
+# -- scheduler -----------------------------------------------------------------
+
+def run_node_graph(
+    graph: Dict[str, Any],
+    tb_ctx: Dict[str, Any],
+    log_q: queue.Queue,
+    cancel_event: threading.Event | None = None,
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Execute a node graph. Each node: {"id", "type", "params", "depends_on",
+    optional "device", "delay_s", "continue_on_fail", "wait_for" (event
+    names) and "wait_timeout_s"}; parallel_group nodes hold "children".
+    Graph options: max_workers, device_concurrency and device_limits
+    {device ref: n}.
+
+    A node is dispatched once its dependencies are done, its delay has
+    elapsed and its device has a free slot, so independent branches and
+    group children overlap. Dependents of a failed node are SKIPPED unless
+    that node has continue_on_fail. Returns (status, {"nodes": {...}, ...}).
+    """
+    try:
+        nodes = prepare_graph(graph)
+    except GraphError as e:
+        log_q.put(f"[graph] {e}")
+        return "FAILED", {"error": str(e)}
+
+    cancel_event = cancel_event or threading.Event()
+    bus = EventBus()
+    ctx = {"tb_ctx": tb_ctx, "log_q": log_q, "cancel_event": cancel_event, "results": {}, "graph": graph,
+           "events": bus}
+    results: Dict[str, Dict[str, Any]] = ctx["results"]
+    children = _children(nodes)
+    max_workers = int(graph.get("max_workers", NODE_GRAPH_DEFAULTS["max_workers"]))
+
+    # Per-device slots, enforced when dispatching rather than inside workers
+    devices = tb_ctx.get("devices") or []
+    default_limit = int(graph.get("device_concurrency", NODE_GRAPH_DEFAULTS["device_concurrency"]))
+    limits: Dict[Any, int] = {}
+    for ref, n in (graph.get("device_limits") or {}).items():
+        dev = find_device(devices, ref)
+        if dev is not None:
+            limits[dev["id"]] = int(n)
+    busy: Dict[Any, int] = {}
+    node_dev = {nid: node_device(n, ctx) for nid, n in nodes.items()}
+
+    remaining = {nid: len(n["depends_on"]) for nid, n in nodes.items()}
+    eligible_at: Dict[str, float] = {}
+    t0 = time.time()
+    for nid, k in remaining.items():
+        if k == 0:
+            eligible_at[nid] = t0 + _delay(nodes[nid])
+    order = {nid: i for i, nid in enumerate(nodes)}
+
+    def _finish(nid: str, status: str, metrics: Dict[str, Any], start: float | None, error: str = ""):
+        end = time.time()
+        results[nid] = {
+            "type": nodes[nid].get("type"),
+            "status": status,
+            "start_offset_s": round(start - t0, 3) if start else None,
+            "duration_s": round(end - start, 3) if start else 0.0,
+            "metrics": metrics,
+        }
+        if error:
+            results[nid]["error"] = error
+        bus.set(f"node:{nid}:done", status)
+        ok = status == "PASSED" or nodes[nid].get("continue_on_fail")
+        for c in children[nid]:
+            if not ok:
+                _skip(c, f"dependency {nid} {status}")
+            elif c not in results:
+                remaining[c] -= 1
+                if remaining[c] == 0:
+                    eligible_at[c] = time.time() + _delay(nodes[c])
+
+    def _skip(nid: str, why: str):
+        if nid in results:
+            return
+        eligible_at.pop(nid, None)
+        results[nid] = {"type": nodes[nid].get("type"), "status": "SKIPPED", "start_offset_s": None,
+                        "duration_s": 0.0, "metrics": {}, "error": why}
+        log_q.put(f"[graph] {nid}: SKIPPED ({why})")
+        for c in children[nid]:
+            _skip(c, f"dependency {nid} SKIPPED")
+
+    # Event-bus signals wake the scheduler through a dummy future in its wait set
+    wake = {"fut": Future()}
+
+    def _on_event(_name: str):
+        try:
+            wake["fut"].set_result(None)
+        except InvalidStateError:
+            pass
+
+    bus.add_listener(_on_event)
+    wait_deadline: Dict[str, float] = {}
+
+    running: Dict[Any, Tuple[str, float]] = {}
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="graph") as pool:
+        while len(results) < len(nodes):
+            if cancel_event.is_set():
+                for nid in list(eligible_at):
+                    _skip(nid, "cancelled")
+                if not running:
+                    for nid in nodes:
+                        _skip(nid, "cancelled")
+                    break
+
+            if wake["fut"].done():
+                wake["fut"] = Future()
+            now = time.time()
+            next_wake = None
+            for nid in sorted(eligible_at, key=order.get):
+                if len(running) >= max_workers:
+                    break
+                if nid not in eligible_at:
+                    continue  # skipped by a join finishing earlier in this pass
+                if eligible_at[nid] > now:
+                    next_wake = min(next_wake or eligible_at[nid], eligible_at[nid])
+                    continue
+                pending = [w for w in nodes[nid].get("wait_for") or [] if not bus.is_set(w)]
+                if pending:
+                    deadline = wait_deadline.setdefault(
+                        nid, eligible_at[nid] + float(nodes[nid].get("wait_timeout_s", 300)))
+                    if now < deadline:
+                        next_wake = min(next_wake or deadline, deadline)
+                        continue
+                    del eligible_at[nid]
+                    _finish(nid, "FAILED", {}, None, f"timed out waiting for {', '.join(pending)}")
+                    log_q.put(f"[graph] {nid}: FAILED (timed out waiting for {', '.join(pending)})")
+                    continue
+                dev = node_dev[nid]
+                if dev is not None and busy.get(dev["id"], 0) >= limits.get(dev["id"], default_limit):
+                    continue
+                del eligible_at[nid]
+                if nodes[nid].get("_join"):
+                    _finish(nid, "PASSED", {}, now)
+                    continue
+                if dev is not None:
+                    busy[dev["id"]] = busy.get(dev["id"], 0) + 1
+                log_q.put(f"[graph] {nid}: start ({nodes[nid].get('type')})")
+                running[pool.submit(_run_node, nodes[nid], ctx)] = (nid, time.time())
+
+            if not running:
+                if not eligible_at:
+                    break  # everything left was skipped
+                if next_wake is not None:
+                    cancel_event.wait(max(0.0, next_wake - time.time()))
+                continue
+
+            timeout = None if next_wake is None else max(0.0, next_wake - time.time())
+            done, _ = wait(list(running) + [wake["fut"]], timeout=timeout, return_when=FIRST_COMPLETED)
+            for fut in done:
+                if fut not in running:
+                    continue  # event-bus wake-up
+                nid, start = running.pop(fut)
+                dev = node_dev[nid]
+                if dev is not None:
+                    busy[dev["id"]] -= 1
+                try:
+                    status, metrics = fut.result()
+                    error = ""
+                except Exception as e:
+                    status, metrics, error = "FAILED", {}, f"{type(e).__name__}: {e}"
+                _finish(nid, status, metrics or {}, start, error)
+                log_q.put(f"[graph] {nid}: {status} in {results[nid]['duration_s']}s" + (f" ({error})" if error else ""))
+
+    wall = time.time() - t0
+    counts: Dict[str, int] = {}
+    for r in results.values():
+        counts[r["status"]] = counts.get(r["status"], 0) + 1
+    overall = "PASSED" if counts.get("PASSED", 0) == len(nodes) else (
+        "ABORTED" if cancel_event.is_set() else "FAILED")
+    return overall, {
+        "nodes": results,
+        "counts": counts,
+        "wall_s": round(wall, 3),
+        "sum_node_s": round(sum(r["duration_s"] for r in results.values()), 3),
+    }
+
+
+def _delay(node: Dict[str, Any]) -> float:
+    if node.get("delay_s") is not None:
+        return float(node["delay_s"])
+    return float(DEFAULT_NODE_DELAYS.get(node.get("type"), 0))
+
+
+def _run_node(node: Dict[str, Any], ctx: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    handler = NODE_HANDLERS.get(node.get("type"))
+    if handler is not None:
+        return handler(node, ctx)
+    # Any registered action (builtin or plugin) also works as a node type
+    action = get_action_registry().get(node.get("type"))
+    if action is None:
+        return "FAILED", {"error": f"no handler for node type {node.get('type')!r}"}
+    return action.run(node.get("params") or {}, ctx["tb_ctx"], ctx["log_q"])
+
+
+def execute_node_graph(
+    params: Dict[str, Any],
+    tb_ctx: Dict[str, Any],
+    log_q: queue.Queue
+) -> Tuple[str, Dict[str, Any]]:
+    """Entry point for testcases with action_type 'node_graph' (graph in parameters)."""
+    graph = params.get("graph") if isinstance(params.get("graph"), dict) else params
+    return run_node_graph(graph, tb_ctx, log_q, cancel_event=tb_ctx.get("cancel_event"))
+
+
+# -- builtin node handlers -----------------------------------------------------
+
+def _require_device(node, ctx):
+    dev = node_device(node, ctx)
+    if dev is None:
+        raise ValueError(f"node {node.get('id')!r}: device not found")
+    return dev
+
+
+def _node_custom_cmd(node, ctx):
+    p = node.get("params") or {}
+    dev = _require_device(node, ctx)
+    rc, out, err = run_shell_on_device(dev, p["command"], p.get("access"), ctx["log_q"], timeout=int(p.get("timeout_s", 60)))
+    if out:
+        ctx["log_q"].put(out.rstrip())
+    if err:
+        ctx["log_q"].put(err.rstrip())
+    ok = rc == int(p.get("expect_rc", 0))
+    return ("PASSED" if ok else "FAILED"), {"rc": rc, "stdout": out[-4000:], "stderr": err[-4000:]}
+
+
+def _node_config_write(node, ctx):
+    p = node.get("params") or {}
+    dev = _require_device(node, ctx)
+    rc, msg, info = sync_text_file_on_device(dev, p["path"], p.get("content", ""), p.get("access"), ctx["log_q"],
+                                             mode=p.get("mode"))
+    return ("PASSED" if rc == 0 else "FAILED"), dict(info, rc=rc, message=msg)
+
+
+def _node_verify_connectivity(node, ctx):
+    """Ping targets from a device (if given) or from this host via the probe engine."""
+    p = node.get("params") or {}
+    targets = p.get("targets") or [p.get("target") or p.get("target_ip")]
+    targets = [str(t) for t in targets if t]
+    if not targets:
+        return "FAILED", {"error": "no target"}
+    count = int(p.get("count", 3))
+    timeout = float(p.get("timeout_s", 2))
+    dev = node_device(node, ctx)
+    per_target = {}
+    if dev is None:
+        for t, res in get_probe_engine().probe_many(targets, count=count, timeout=timeout).items():
+            per_target[t] = {"ok": res["ok"], "loss_pct": res["loss_pct"], "rtt_avg_ms": res["rtt_avg_ms"]}
+    else:
+        for t in targets:
+            cmd = f"ping -c {count} -W {int(max(1, timeout))} {shlex.quote(t)}"
+            rc, out, err = run_shell_on_device(dev, cmd, p.get("access"), ctx["log_q"], timeout=int(count * timeout + 10))
+            per_target[t] = {"ok": rc == 0, "rc": rc}
+    for t, r in per_target.items():
+        ctx["log_q"].put(f"[verify] {t}: {'ok' if r['ok'] else 'unreachable'}")
+    ok = all(r["ok"] for r in per_target.values())
+    return ("PASSED" if ok else "FAILED"), {"targets": per_target}
+
+
+def _node_tcpdump(node, ctx):
+    p = node.get("params") or {}
+    dev = node_device(node, ctx)
+    duration = int(p.get("duration_s", 10))
+    if dev is None:
+        return get_action_registry().get("tshark_capture").run(p, ctx["tb_ctx"], ctx["log_q"])
+    outfile = p.get("outfile") or f"/tmp/capture_{int(time.time())}.pcap"
+    cmd = f"timeout {duration} tcpdump -i {shlex.quote(str(p.get('iface', 'any')))} -w {shlex.quote(outfile)}"
+    if p.get("capture_filter"):
+        cmd += " " + shlex.quote(p["capture_filter"])
+    rc, out, err = run_shell_on_device(dev, cmd, p.get("access"), ctx["log_q"], timeout=duration + 30)
+    # timeout(1) exits 124 when the capture ran for the full duration
+    ok = rc in (0, 124)
+    return ("PASSED" if ok else "FAILED"), {"rc": rc, "outfile": outfile}
+
+
+register_node_handler("custom_cmd", _node_custom_cmd)
+register_node_handler("config_write", _node_config_write)
+register_node_handler("verify_connectivity", _node_verify_connectivity)
+register_node_handler("tcpdump", _node_tcpdump)
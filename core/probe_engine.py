@@ -0,0 +1,297 @@
+"""In-process reachability probes: ICMP echo (unprivileged when possible) or TCP connect."""
+import errno
+import os
+import select
+import selectors
+import socket
+import struct
+import threading
+import time
+from typing import Dict, Iterable, List, Tuple
+
+
+PROBE_DEFAULTS = {
+    "timeout_s": 2.0,
+    "interval_s": 0.2,
+    "tcp_ports": (22, 5555),
+}
+
+_ICMP_ECHO_REQUEST = 8
+_ICMP_ECHO_REPLY = 0
+
+
+def _checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b"\x00"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def _echo_packet(ident: int, seq: int) -> bytes:
+    payload = struct.pack("!d", time.time()) + b"testrig-probe"
+    header = struct.pack("!BBHHH", _ICMP_ECHO_REQUEST, 0, 0, ident, seq)
+    csum = _checksum(header + payload)
+    return struct.pack("!BBHHH", _ICMP_ECHO_REQUEST, 0, csum, ident, seq) + payload
+
+
+def _new_result(target: str, method: str) -> dict:
+    return {
+        "target": target,
+        "ok": False,
+        "method": method,
+        "sent": 0,
+        "received": 0,
+        "loss_pct": 100.0,
+        "rtt_min_ms": None,
+        "rtt_avg_ms": None,
+        "rtt_max_ms": None,
+        "reason": "",
+        "_rtts": [],
+    }
+
+
+def _finish(res: dict) -> dict:
+    rtts = res.pop("_rtts")
+    if res["sent"]:
+        res["loss_pct"] = round(100.0 * (res["sent"] - res["received"]) / res["sent"], 1)
+    if rtts:
+        res["ok"] = True
+        res["rtt_min_ms"] = round(min(rtts), 3)
+        res["rtt_avg_ms"] = round(sum(rtts) / len(rtts), 3)
+        res["rtt_max_ms"] = round(max(rtts), 3)
+        res["reason"] = res["reason"] or f"{res['method']} ok ({res['rtt_avg_ms']} ms)"
+    elif not res["reason"]:
+        res["reason"] = f"{res['method']} timeout"
+    return res
+
+
+class ProbeEngine:
+    """
+    Fires probes at many targets from one socket and collects replies as
+    they arrive, so a sweep costs about one timeout window instead of one
+    `ping` process (and up to 2 s) per address.
+
+    ICMP uses an unprivileged datagram socket (Linux ping_group_range,
+    macOS) or a raw socket when running privileged. Without either, hosts
+    are probed with non-blocking TCP connects; a refused connection still
+    proves the host is up.
+    """
+
+    def __init__(self, timeout: float = PROBE_DEFAULTS["timeout_s"],
+                 tcp_ports: Tuple[int, ...] = PROBE_DEFAULTS["tcp_ports"]):
+        self.timeout = float(timeout)
+        self.tcp_ports = tuple(tcp_ports)
+        self._icmp_kind = None  # "dgram" | "raw" | "" (unavailable), resolved lazily
+        self._ident = os.getpid() & 0xFFFF
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    # -- public ------------------------------------------------------------
+
+    def probe(self, target: str, count: int = 1, timeout: float | None = None) -> dict:
+        return self.probe_many([target], count=count, timeout=timeout)[target]
+
+    def probe_many(self, targets: Iterable[str], count: int = 1, timeout: float | None = None,
+                   interval: float = PROBE_DEFAULTS["interval_s"]) -> Dict[str, dict]:
+        """
+        Probe all targets concurrently. Returns {target: result} with ok,
+        sent/received, loss_pct, rtt_min/avg/max_ms, method and reason.
+        """
+        timeout = self.timeout if timeout is None else float(timeout)
+        count = max(1, int(count))
+        targets = list(dict.fromkeys(t.strip() for t in targets if t and t.strip()))
+
+        results: Dict[str, dict] = {}
+        addrs: Dict[str, str] = {}
+        for t in targets:
+            try:
+                addrs[t] = socket.getaddrinfo(t, None, socket.AF_INET)[0][4][0]
+            except (socket.gaierror, IndexError, UnicodeError) as e:
+                res = _new_result(t, "resolve")
+                res["reason"] = f"resolve failed: {e}"
+                results[t] = _finish(res)
+
+        sock = self._open_icmp() if addrs else None
+        if sock is not None:
+            with sock:
+                results.update(self._icmp_round(sock, addrs, count, timeout, interval))
+        elif addrs:
+            results.update(self._tcp_round(addrs, count, timeout, interval))
+        return results
+
+    @property
+    def method(self) -> str:
+        if self._icmp_kind is None:
+            sock = self._open_icmp()
+            if sock is not None:
+                sock.close()
+        return f"icmp-{self._icmp_kind}" if self._icmp_kind else "tcp"
+
+    # -- ICMP --------------------------------------------------------------
+
+    def _open_icmp(self):
+        if self._icmp_kind == "":
+            return None
+        kinds = [self._icmp_kind] if self._icmp_kind else ["dgram", "raw"]
+        for kind in kinds:
+            try:
+                stype = socket.SOCK_DGRAM if kind == "dgram" else socket.SOCK_RAW
+                sock = socket.socket(socket.AF_INET, stype, socket.IPPROTO_ICMP)
+                sock.setblocking(False)
+                self._icmp_kind = kind
+                return sock
+            except (PermissionError, OSError):
+                continue
+        self._icmp_kind = ""
+        return None
+
+    def _next_seq(self) -> int:
+        with self._lock:
+            self._seq = (self._seq + 1) & 0xFFFF
+            return self._seq
+
+    def _icmp_round(self, sock, addrs: Dict[str, str], count: int, timeout: float,
+                    interval: float) -> Dict[str, dict]:
+        results = {t: _new_result(t, "icmp") for t in addrs}
+        by_addr: Dict[str, List[str]] = {}
+        for t, a in addrs.items():
+            by_addr.setdefault(a, []).append(t)
+
+        pending: Dict[Tuple[str, int], float] = {}
+        sends = [(i * interval, a) for i in range(count) for a in by_addr]
+        t0 = time.time()
+        deadline = t0 + (count - 1) * interval + timeout
+        si = 0
+
+        while True:
+            now = time.time()
+            while si < len(sends) and now - t0 >= sends[si][0]:
+                addr = sends[si][1]
+                seq = self._next_seq()
+                try:
+                    sock.sendto(_echo_packet(self._ident, seq), (addr, 0))
+                    pending[(addr, seq)] = time.time()
+                except OSError as e:
+                    for t in by_addr[addr]:
+                        results[t]["reason"] = f"icmp send failed: {e}"
+                for t in by_addr[addr]:
+                    results[t]["sent"] += 1
+                si += 1
+
+            if si >= len(sends) and not pending:
+                break
+            if now >= deadline:
+                break
+            wait = deadline - now
+            if si < len(sends):
+                wait = min(wait, max(0.0, t0 + sends[si][0] - now))
+            r, _, _ = select.select([sock], [], [], wait)
+            if not r:
+                continue
+            while True:
+                try:
+                    data, (src, _port) = sock.recvfrom(2048)
+                except (BlockingIOError, InterruptedError):
+                    break
+                except OSError:
+                    break
+                reply = self._parse_reply(data)
+                if reply is None:
+                    continue
+                ident, seq = reply
+                if self._icmp_kind == "raw" and ident != self._ident:
+                    continue  # someone else's ping
+                sent_at = pending.pop((src, seq), None)
+                if sent_at is None:
+                    continue
+                rtt = (time.time() - sent_at) * 1000.0
+                for t in by_addr.get(src, []):
+                    results[t]["received"] += 1
+                    results[t]["_rtts"].append(rtt)
+
+        return {t: _finish(res) for t, res in results.items()}
+
+    @staticmethod
+    def _parse_reply(data: bytes) -> Tuple[int, int] | None:
+        # Raw sockets (and macOS datagram sockets) deliver the IP header too
+        if len(data) >= 20 and data[0] >> 4 == 4:
+            data = data[(data[0] & 0x0F) * 4:]
+        if len(data) < 8:
+            return None
+        icmp_type, _code, _csum, ident, seq = struct.unpack("!BBHHH", data[:8])
+        if icmp_type != _ICMP_ECHO_REPLY:
+            return None
+        return ident, seq
+
+    # -- TCP fallback ------------------------------------------------------
+
+    def _tcp_round(self, addrs: Dict[str, str], count: int, timeout: float,
+                   interval: float) -> Dict[str, dict]:
+        results = {t: _new_result(t, "tcp") for t in addrs}
+        by_addr: Dict[str, List[str]] = {}
+        for t, a in addrs.items():
+            by_addr.setdefault(a, []).append(t)
+
+        for i in range(count):
+            round_start = time.time()
+            answered = self._tcp_connect_all(list(by_addr), timeout)
+            for addr, targets in by_addr.items():
+                for t in targets:
+                    results[t]["sent"] += 1
+                    if addr in answered:
+                        results[t]["received"] += 1
+                        results[t]["_rtts"].append(answered[addr])
+            if i < count - 1:
+                time.sleep(max(0.0, interval - (time.time() - round_start)))
+        return {t: _finish(res) for t, res in results.items()}
+
+    def _tcp_connect_all(self, addrs: List[str], timeout: float) -> Dict[str, float]:
+        """Non-blocking connects to every (addr, port); first answer per addr wins."""
+        socks = {}
+        answered: Dict[str, float] = {}
+        t0 = time.time()
+        for addr in addrs:
+            for port in self.tcp_ports:
+                s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                s.setblocking(False)
+                rc = s.connect_ex((addr, port))
+                if rc in (0, errno.ECONNREFUSED):
+                    answered.setdefault(addr, (time.time() - t0) * 1000.0)
+                    s.close()
+                elif rc in (errno.EINPROGRESS, errno.EWOULDBLOCK, getattr(errno, "WSAEWOULDBLOCK", -1)):
+                    socks[s] = addr
+                else:
+                    s.close()
+        sel = selectors.DefaultSelector()
+        try:
+            for s, addr in socks.items():
+                sel.register(s, selectors.EVENT_WRITE, addr)
+            deadline = t0 + timeout
+            while socks:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                for key, _ev in sel.select(remaining):
+                    s = key.fileobj
+                    addr = socks.pop(s)
+                    sel.unregister(s)
+                    err = s.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                    # Connected or actively refused both mean the host answered
+                    if err in (0, errno.ECONNREFUSED):
+                        answered.setdefault(addr, (time.time() - t0) * 1000.0)
+                    s.close()
+        finally:
+            sel.close()
+            for s in socks:
+                s.close()
+        return answered
+
+
+_ENGINE = ProbeEngine()
+
+
+def get_probe_engine() -> ProbeEngine:
+    """Return the process-wide probe engine."""
+    return _ENGINE
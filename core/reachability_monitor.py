@@ -0,0 +1,185 @@
+"""Background reachability monitor: re-probes devices and records state changes."""
+import json
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+
+from database import db_query, db_exec, get_conn
+from config import REACHABILITY_DEFAULTS
+from .device_manager import sweep_devices_reachability
+
+
+class ReachabilityMonitor:
+    """
+    Daemon thread that keeps the device_status table current.
+
+    Each device has its own next-check time. Healthy devices are re-probed
+    every `interval` seconds with +/- `jitter` spread so probes do not
+    arrive in bursts; devices that are down back off exponentially (capped
+    at `max_backoff`). Only changes of state or reason rewrite a row; other
+    probes just bump checked_ts. Due devices are probed together in one
+    de-duplicated sweep, which also refreshes REACHABILITY_CACHE.
+    """
+
+    def __init__(self,
+                 interval: float = REACHABILITY_DEFAULTS["monitor_interval_s"],
+                 jitter: float = REACHABILITY_DEFAULTS["monitor_jitter"],
+                 max_backoff: float = REACHABILITY_DEFAULTS["monitor_max_backoff_s"]):
+        self.interval = float(interval)
+        self.jitter = float(jitter)
+        self.max_backoff = float(max_backoff)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._next_due: Dict[int, float] = {}
+        self._last: Dict[int, dict] = {}  # device_id -> last recorded row
+        self._last_loaded = False
+
+    # -- control -----------------------------------------------------------
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="reach-monitor", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._wake.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        self._thread = None
+
+    def request_recheck(self, device_id: int):
+        """Probe a device on the next loop iteration instead of at its scheduled time."""
+        with self._lock:
+            self._next_due[int(device_id)] = 0.0
+        self._wake.set()
+
+    # -- scheduling --------------------------------------------------------
+
+    def _delay_for(self, ok: bool, fail_count: int) -> float:
+        base = self.interval if ok else min(self.max_backoff, self.interval * (2 ** min(fail_count, 16)))
+        return base * random.uniform(1.0 - self.jitter, 1.0 + self.jitter)
+
+    def _load_devices(self) -> List[dict]:
+        devices = db_query("SELECT * FROM devices ORDER BY id") or []
+        ids = {d["id"] for d in devices}
+        with self._lock:
+            removed = [dev_id for dev_id in self._next_due if dev_id not in ids]
+            for dev_id in removed:
+                self._next_due.pop(dev_id, None)
+                self._last.pop(dev_id, None)
+            for d in devices:
+                # New devices start at a random offset inside one interval
+                self._next_due.setdefault(d["id"], time.time() + random.uniform(0, min(self.interval, 2.0)))
+        if not self._last_loaded:
+            # Continue backoff/changed_ts from the previous process
+            for row in db_query("SELECT * FROM device_status") or []:
+                self._last[row["device_id"]] = row
+            self._last_loaded = True
+            removed = True
+        if removed:
+            db_exec("DELETE FROM device_status WHERE device_id NOT IN (SELECT id FROM devices)")
+        return devices
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                devices = self._load_devices()
+                now = time.time()
+                with self._lock:
+                    due = [d for d in devices if self._next_due.get(d["id"], 0) <= now]
+                if due:
+                    self._record(due, sweep_devices_reachability(due, force=True))
+                with self._lock:
+                    next_at = min(self._next_due.values(), default=time.time() + self.interval)
+                wait = max(0.05, min(next_at - time.time(), self.interval))
+            except Exception:
+                wait = self.interval
+            self._wake.wait(wait)
+            self._wake.clear()
+
+    def _record(self, devices: List[dict], entries: Dict[int, dict]):
+        changed, touched = [], []
+        now = time.time()
+        for d in devices:
+            entry = entries.get(d["id"])
+            if entry is None:
+                continue
+            prev = self._last.get(d["id"]) or {}
+            ok = bool(entry["ok"])
+            fail_count = 0 if ok else int(prev.get("fail_count") or 0) + 1
+            next_ts = now + self._delay_for(ok, fail_count)
+            with self._lock:
+                self._next_due[d["id"]] = next_ts
+            row = {
+                "device_id": d["id"],
+                "ok": int(ok),
+                "status": entry["status"],
+                "reason": entry["reason"],
+                "details_json": json.dumps(entry.get("details") or {}),
+                "fail_count": fail_count,
+                "checked_ts": now,
+                "changed_ts": prev.get("changed_ts") or now,
+                "next_check_ts": next_ts,
+            }
+            if not prev or bool(prev.get("ok")) != ok or prev.get("reason") != row["reason"]:
+                row["changed_ts"] = now
+                changed.append(row)
+            else:
+                touched.append(row)
+            self._last[d["id"]] = row
+
+        conn = get_conn()
+        with conn:
+            if changed:
+                conn.executemany(
+                    """
+                    INSERT OR REPLACE INTO device_status
+                        (device_id, ok, status, reason, details_json, fail_count, checked_ts, changed_ts, next_check_ts)
+                    VALUES (:device_id, :ok, :status, :reason, :details_json, :fail_count, :checked_ts, :changed_ts, :next_check_ts)
+                    """,
+                    changed,
+                )
+            if touched:
+                conn.executemany(
+                    "UPDATE device_status SET fail_count=:fail_count, checked_ts=:checked_ts, next_check_ts=:next_check_ts WHERE device_id=:device_id",
+                    touched,
+                )
+
+
+def load_device_status(testbed_id: int | None = None) -> Dict[int, dict]:
+    """Latest recorded status per device id (reads only; never probes)."""
+    if testbed_id is None:
+        rows = db_query("SELECT * FROM device_status") or []
+    else:
+        rows = db_query(
+            "SELECT s.* FROM device_status s JOIN devices d ON d.id = s.device_id WHERE d.testbed_id=?",
+            (testbed_id,),
+        ) or []
+    return {r["device_id"]: r for r in rows}
+
+
+_MONITOR: Optional[ReachabilityMonitor] = None
+_MONITOR_LOCK = threading.Lock()
+
+
+def get_reachability_monitor(start: bool = True) -> ReachabilityMonitor:
+    """Return the process-wide monitor, starting it on first use."""
+    global _MONITOR
+    with _MONITOR_LOCK:
+        if _MONITOR is None:
+            _MONITOR = ReachabilityMonitor()
+        if start:
+            _MONITOR.start()
+        return _MONITOR
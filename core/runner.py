@@ -0,0 +1,342 @@
+"""Headless testplan execution: runs a plan on a testbed and records runs/run_results."""
+import json
+import os
+import threading
+import time
+from typing import Tuple, Dict, Any, List, Optional
+
+from database import db_query, db_exec
+from utils import json_or_empty, device_context_for_testbed
+from models import Testplan
+from .action_executor import execute_builtin_action, execute_external_command
+from .leases import LeaseSet, default_owner
+from .node_graph import execute_node_graph
+
+
+RUNNER_DEFAULTS = {
+    # Log lines stored in run_results.logs per testcase (the tail is kept)
+    "log_lines": 5000,
+    "stop_on_fail": False,
+}
+
+
+class CaseLog:
+    """
+    Log queue for one testcase: keeps the last `max_lines` lines for
+    run_results.logs and forwards every line to the run-level sink.
+    """
+
+    def __init__(self, sink=None, max_lines: int = RUNNER_DEFAULTS["log_lines"]):
+        self.sink = sink
+        self.max_lines = max_lines
+        self.lines: List[str] = []
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def put(self, msg, block=True, timeout=None):
+        s = str(msg)
+        with self._lock:
+            self.lines.append(s)
+            if len(self.lines) > self.max_lines:
+                cut = len(self.lines) - self.max_lines
+                del self.lines[:cut]
+                self.dropped += cut
+        if self.sink is not None:
+            try:
+                self.sink.put(s)
+            except Exception:
+                pass
+
+    put_nowait = put
+
+    def text(self) -> str:
+        with self._lock:
+            head = [f"... {self.dropped} earlier lines dropped"] if self.dropped else []
+            return "\n".join(head + self.lines)
+
+
+class PrefixLog:
+    """Log queue wrapper that prefixes every line (e.g. with a job or shard id)."""
+
+    def __init__(self, inner, prefix: str):
+        self.inner = inner
+        self.prefix = prefix
+
+    def put(self, msg, block=True, timeout=None):
+        self.inner.put(f"{self.prefix} {msg}")
+
+    put_nowait = put
+
+
+def _now() -> str:
+    return time.strftime("%Y-%m-%d %H:%M:%S")
+
+
+# Metrics keys whose values are files produced by a testcase
+_ARTIFACT_KEYS = ("outfile", "files", "archived", "log_file", "spill_file", "out_dir")
+
+
+def _artifacts(metrics: Dict[str, Any]) -> List[str]:
+    paths: List[str] = []
+    for k in _ARTIFACT_KEYS:
+        v = (metrics or {}).get(k)
+        if isinstance(v, str) and v:
+            paths.append(v)
+        elif isinstance(v, list):
+            paths.extend(p for p in v if isinstance(p, str) and p)
+    return paths
+
+
+def _checkpoint(tb_ctx: Dict[str, Any], metrics: Dict[str, Any]) -> str:
+    """Resume state stored with each run_results row: testbed context and produced files."""
+    ctx = {k: v for k, v in tb_ctx.items()
+           if isinstance(v, (str, int, float, bool)) and k not in ("run_id", "testbed_id", "testcase_id")}
+    arts = [{"path": p, "size": os.path.getsize(p) if os.path.isfile(p) else None} for p in _artifacts(metrics)]
+    return json.dumps({"ctx": ctx, "artifacts": arts, "ts": time.time()}, default=str)
+
+
+def load_checkpoints(run_id: int) -> Dict[int, Dict[str, Any]]:
+    """
+    Completed items of a run (and of its shard runs, for a sharded run)
+    keyed by testplan_items.seq; rows without a seq are ignored.
+    """
+    rows = db_query(
+        "SELECT id, run_id, seq, testcase_id, status, checkpoint_json FROM run_results "
+        "WHERE run_id IN (SELECT id FROM runs WHERE id=? OR parent_run_id=?) AND seq IS NOT NULL ORDER BY id",
+        (run_id, run_id),
+    )
+    return {r["seq"]: dict(r, checkpoint=json_or_empty(r.get("checkpoint_json") or "")) for r in rows}
+
+
+def run_testcase(tc: Dict[str, Any], tb_ctx: Dict[str, Any], log_q) -> Tuple[str, Dict[str, Any]]:
+    """Dispatch one testcase row to its executor by action_type. Returns (status, metrics)."""
+    params = json_or_empty(tc.get("parameters_json") or "{}")
+    action_type = (tc.get("action_type") or "").lower()
+    try:
+        if action_type == "builtin":
+            return execute_builtin_action(tc.get("action_name") or "", params, tb_ctx, log_q)
+        if action_type == "external":
+            return execute_external_command(tc.get("command_template") or "", params, tb_ctx, log_q)
+        if action_type == "node_graph":
+            return execute_node_graph(params, tb_ctx, log_q)
+    except Exception as e:
+        log_q.put(f"{tc.get('name')}: executor error: {e}")
+        return "FAILED", {"error": str(e)}
+    log_q.put(f"{tc.get('name')}: unknown action_type {action_type!r}")
+    return "FAILED", {"error": f"unknown action_type {action_type!r}"}
+
+
+def resolve_plan_and_testbed(plan_ref, testbed_ref) -> Tuple[Optional[Testplan], Optional[Dict[str, Any]], str]:
+    """Look up a plan and testbed by id or name. Returns (plan, testbed_row, error)."""
+    plan_row = db_query("SELECT * FROM testplans WHERE name=? OR id=?", (str(plan_ref), str(plan_ref)), one=True)
+    if plan_row is None:
+        return None, None, f"testplan {plan_ref!r} not found"
+    bed = db_query("SELECT * FROM testbeds WHERE name=? OR id=?", (str(testbed_ref), str(testbed_ref)), one=True)
+    if bed is None:
+        return None, None, f"testbed {testbed_ref!r} not found"
+    plan = Testplan(testplan_id=plan_row["id"], name=plan_row["name"], description=plan_row.get("description"))
+    return plan, bed, ""
+
+
+def create_run(plan_id: int, testbed_id: int, parent_run_id: int | None = None) -> int:
+    cur = db_exec(
+        "INSERT INTO runs (plan_id, testbed_id, start_ts, status, parent_run_id) VALUES (?,?,?,?,?)",
+        (plan_id, testbed_id, _now(), "RUNNING", parent_run_id),
+    )
+    return cur.lastrowid
+
+
+def run_item(run_id: int, tc: Dict[str, Any], tb_ctx: Dict[str, Any], log_q=None, label: str = "") -> str:
+    """Run one plan item and record its run_results row and checkpoint. Returns PASSED or FAILED."""
+    case_log = CaseLog(log_q)
+    case_log.put(f"=== {label} {tc.get('name')} ===" if label else f"=== {tc.get('name')} ===")
+    t0 = time.time()
+    tc_status, metrics = run_testcase(tc, dict(tb_ctx, testcase_id=tc["id"]), case_log)
+    duration = time.time() - t0
+    tc_status = "PASSED" if tc_status == "PASSED" else "FAILED"
+    case_log.put(f"--- {tc.get('name')}: {tc_status} in {duration:.1f}s")
+    db_exec(
+        "INSERT INTO run_results (run_id, testcase_id, seq, status, logs, metrics_json, duration_s, checkpoint_json) "
+        "VALUES (?,?,?,?,?,?,?,?)",
+        (run_id, tc["id"], tc.get("seq"), tc_status, case_log.text(), json.dumps(metrics or {}, default=str),
+         duration, _checkpoint(tb_ctx, metrics)),
+    )
+    return tc_status
+
+
+def execute_run(
+    run_id: int,
+    plan: Testplan,
+    testbed_id: int,
+    log_q=None,
+    cancel_event: threading.Event | None = None,
+    stop_on_fail: bool = RUNNER_DEFAULTS["stop_on_fail"],
+    completed: Dict[int, Dict[str, Any]] | None = None,
+    restore_ctx: Dict[str, Any] | None = None,
+) -> str:
+    """
+    Run every testcase of `plan` in order, writing one run_results row
+    (with its seq and a checkpoint) per testcase as it finishes, then close
+    the runs row. Items in `completed` (from load_checkpoints) are skipped
+    but count towards the status; `restore_ctx` overrides the testbed
+    context. Returns the run status (PASSED, FAILED or ABORTED).
+    """
+    cancel_event = cancel_event or threading.Event()
+    completed = completed or {}
+    testcases = plan.get_testcases()
+    tb_ctx = device_context_for_testbed(testbed_id)
+    tb_ctx.update(restore_ctx or {})
+    tb_ctx.update(run_id=run_id, testbed_id=testbed_id, cancel_event=cancel_event,
+                  artifacts={seq: [a["path"] for a in c["checkpoint"].get("artifacts", [])]
+                             for seq, c in completed.items()})
+
+    counts = {"PASSED": 0, "FAILED": 0}
+    status = "PASSED"
+    for i, tc in enumerate(testcases, 1):
+        done = completed.get(tc.get("seq"))
+        if done is not None and done["testcase_id"] == tc["id"]:
+            tc_status = "PASSED" if done["status"] == "PASSED" else "FAILED"
+            counts[tc_status] += 1
+            if tc_status == "FAILED":
+                status = "FAILED"
+                if stop_on_fail:
+                    break
+            continue
+        if cancel_event.is_set():
+            status = "ABORTED"
+            break
+        tc_status = run_item(run_id, tc, tb_ctx, log_q, f"[{i}/{len(testcases)}]")
+        counts[tc_status] += 1
+        if tc_status == "FAILED":
+            status = "FAILED"
+            if stop_on_fail:
+                break
+
+    if cancel_event.is_set() and status != "FAILED":
+        status = "ABORTED"
+    db_exec("UPDATE runs SET end_ts=?, status=? WHERE id=?", (_now(), status, run_id))
+    if log_q is not None:
+        log_q.put(f"Run {run_id} {status}: {counts['PASSED']} passed, {counts['FAILED']} failed "
+                  f"of {len(testcases)}")
+    return status
+
+
+def run_plan(
+    plan_ref,
+    testbed_ref,
+    log_q=None,
+    cancel_event: threading.Event | None = None,
+    stop_on_fail: bool = RUNNER_DEFAULTS["stop_on_fail"],
+) -> Tuple[int | None, str]:
+    """
+    Execute a testplan (id or name) on a testbed (id or name) without any
+    UI. Returns (run_id, status); run_id is None if the lookup failed.
+    """
+    plan, bed, err = resolve_plan_and_testbed(plan_ref, testbed_ref)
+    if err:
+        if log_q is not None:
+            log_q.put(err)
+        return None, err
+    run_id = create_run(plan.id, bed["id"])
+    if log_q is not None:
+        log_q.put(f"Run {run_id}: plan {plan.name!r} on testbed {bed['name']!r}")
+    try:
+        return run_id, execute_run(run_id, plan, bed["id"], log_q, cancel_event, stop_on_fail)
+    except BaseException:
+        db_exec("UPDATE runs SET end_ts=?, status=? WHERE id=?", (_now(), "ABORTED", run_id))
+        raise
+
+
+def resume_run(
+    run_id: int,
+    log_q=None,
+    cancel_event: threading.Event | None = None,
+    stop_on_fail: bool = RUNNER_DEFAULTS["stop_on_fail"],
+    force: bool = False,
+    take_lease: bool = True,
+) -> Tuple[int | None, str]:
+    """
+    Continue an interrupted run: items with a checkpoint are skipped, the
+    testbed context of the last checkpoint is restored, and execution picks
+    up at the first incomplete item. A sharded run resumes its remaining
+    items on the parent run's testbed. Returns (run_id, status); run_id is
+    None if the run cannot be resumed.
+
+    A run still marked RUNNING may be executing in another process and is
+    refused unless `force` is set (its process is known to be dead). The
+    testbed is leased for the duration of the resume, and the resume is
+    refused while someone else holds the lease; the scheduler, which
+    already holds it for the job, passes take_lease=False.
+    """
+    run = db_query("SELECT * FROM runs WHERE id=?", (run_id,), one=True)
+    if run is None:
+        return None, f"run {run_id} not found"
+    if run["status"] == "RUNNING" and not force:
+        return None, f"run {run_id} is still RUNNING (it may be executing elsewhere); use --force if its process died"
+    plan_row = db_query("SELECT * FROM testplans WHERE id=?", (run["plan_id"],), one=True)
+    if plan_row is None:
+        return None, f"testplan {run['plan_id']} of run {run_id} no longer exists"
+    plan = Testplan(testplan_id=plan_row["id"], name=plan_row["name"], description=plan_row.get("description"))
+
+    completed = load_checkpoints(run_id)
+    # Shard checkpoints carry their own bed's context; only restore this run's
+    own = [c for c in completed.values() if c["run_id"] == run_id]
+    last = max(own, key=lambda c: c["id"]) if own else None
+    restore_ctx = (last["checkpoint"].get("ctx") if last else None) or {}
+    if log_q is not None:
+        total = len(plan.get_testcases())
+        log_q.put(f"Resuming run {run_id} ({run['status']}): {len(completed)}/{total} items checkpointed")
+        for seq, c in sorted(completed.items()):
+            for a in c["checkpoint"].get("artifacts", []):
+                if not os.path.exists(a["path"]):
+                    log_q.put(f"  item {seq}: artifact {a['path']} is missing")
+    cancel_event = cancel_event or threading.Event()
+
+    def _lost(testbed_id):
+        if log_q is not None:
+            log_q.put(f"Lease on testbed {testbed_id} was lost; stopping")
+        cancel_event.set()
+
+    leases = LeaseSet(default_owner("resume"), on_lost=_lost)
+    try:
+        holder = leases.acquire(run["testbed_id"]) if take_lease else ""
+        if holder:
+            return None, f"testbed {run['testbed_id']} of run {run_id} is leased by {holder}"
+        db_exec("UPDATE runs SET status='RUNNING', end_ts=NULL WHERE id=?", (run_id,))
+        try:
+            return run_id, execute_run(run_id, plan, run["testbed_id"], log_q, cancel_event, stop_on_fail,
+                                       completed=completed, restore_ctx=restore_ctx)
+        except BaseException:
+            db_exec("UPDATE runs SET end_ts=?, status=? WHERE id=?", (_now(), "ABORTED", run_id))
+            raise
+    finally:
+        leases.release()
+
+
+def _start_thread(fn, args: Tuple, log_q) -> Dict[str, Any]:
+    cancel = threading.Event()
+    result: Dict[str, Any] = {}
+
+    def _target():
+        try:
+            result["run_id"], result["status"] = fn(*args, log_q, cancel)
+        except Exception as e:
+            result["status"] = "ABORTED"
+            log_q.put(f"Run crashed: {e}")
+
+    t = threading.Thread(target=_target, daemon=True, name="testrig-run")
+    t.start()
+    return {"thread": t, "cancel": cancel, "result": result}
+
+
+def start_run_thread(plan_ref, testbed_ref, log_q, stop_on_fail: bool = False) -> Dict[str, Any]:
+    """
+    Run a plan on a background thread (used by the Runner page).
+    Returns a handle {"thread", "cancel", "result"}; result gets run_id/status when done.
+    """
+    return _start_thread(lambda p, t, q, c: run_plan(p, t, q, c, stop_on_fail), (plan_ref, testbed_ref), log_q)
+
+
+def start_resume_thread(run_id: int, log_q, stop_on_fail: bool = False, force: bool = False) -> Dict[str, Any]:
+    """Like start_run_thread, for resume_run."""
+    return _start_thread(lambda r, q, c: resume_run(r, q, c, stop_on_fail, force), (run_id,), log_q)
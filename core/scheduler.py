@@ -0,0 +1,411 @@
+"""
+Job queue and scheduler: runs queued testplans on every free testbed at once.
+
+Several scheduler processes (workers), on one host or on lab hosts sharing
+the database file, can pull from the same queue; each advertises the
+testbeds it can reach and only claims jobs for those.
+"""
+import json
+import os
+import socket
+import threading
+import time
+from typing import Tuple, Dict, Any, List, Optional
+
+from database import db_query, db_exec
+from models import Testplan
+from .leases import LEASE_DEFAULTS, _immediate, default_owner, renew_lease, release_lease
+from .runner import PrefixLog, create_run, execute_run, resume_run
+
+
+SCHEDULER_DEFAULTS = {
+    "lease_ttl_s": LEASE_DEFAULTS["ttl_s"],
+    "heartbeat_s": LEASE_DEFAULTS["heartbeat_s"],
+    "poll_s": 2.0,
+    "max_attempts": 2,
+    # Upper bound on concurrent runs per scheduler (default: one per testbed)
+    "max_workers": 32,
+}
+
+ACTIVE_JOB_STATUSES = ("CLAIMED", "RUNNING")
+
+
+def resolve_testbeds(refs: List[str] | None = None, pools: List[str] | None = None) -> Tuple[List[int], str]:
+    """Testbed names/ids and pool names -> testbed ids. Returns (ids, error)."""
+    ids: List[int] = []
+    for ref in refs or []:
+        bed = db_query("SELECT id FROM testbeds WHERE name=? OR id=?", (str(ref), str(ref)), one=True)
+        if bed is None:
+            return [], f"testbed {ref!r} not found"
+        ids.append(bed["id"])
+    for pool in pools or []:
+        rows = db_query("SELECT id FROM testbeds WHERE pool=? ORDER BY id", (pool,))
+        if not rows:
+            return [], f"no testbeds in pool {pool!r}"
+        ids.extend(r["id"] for r in rows)
+    return sorted(set(ids)), ""
+
+
+def enqueue_job(plan_ref, testbed_ref=None, pool: str | None = None, priority: int = 0,
+                stop_on_fail: bool = False, max_attempts: int | None = None) -> Tuple[int | None, str]:
+    """
+    Queue a plan (id or name) for a specific testbed (id or name) or for
+    any bed of a pool. Returns (job_id, error).
+    """
+    plan = db_query("SELECT id FROM testplans WHERE name=? OR id=?", (str(plan_ref), str(plan_ref)), one=True)
+    if plan is None:
+        return None, f"testplan {plan_ref!r} not found"
+    testbed_id = None
+    if testbed_ref is not None:
+        bed = db_query("SELECT id FROM testbeds WHERE name=? OR id=?", (str(testbed_ref), str(testbed_ref)), one=True)
+        if bed is None:
+            return None, f"testbed {testbed_ref!r} not found"
+        testbed_id = bed["id"]
+    elif not pool:
+        return None, "a testbed or a pool is required"
+    elif not db_query("SELECT 1 FROM testbeds WHERE pool=? LIMIT 1", (pool,)):
+        return None, f"no testbeds in pool {pool!r}"
+    cur = db_exec(
+        "INSERT INTO jobs (plan_id, testbed_id, pool, priority, status, stop_on_fail, max_attempts, created_ts) "
+        "VALUES (?,?,?,?,?,?,?,?)",
+        (plan["id"], testbed_id, pool or "", int(priority), "QUEUED", int(bool(stop_on_fail)),
+         int(max_attempts or SCHEDULER_DEFAULTS["max_attempts"]), time.time()),
+    )
+    return cur.lastrowid, ""
+
+
+def cancel_job(job_id: int) -> bool:
+    """Drop a queued job, or ask the scheduler running it to stop. Returns False if already finished."""
+    cur = db_exec("UPDATE jobs SET status='CANCELLED', finished_ts=? WHERE id=? AND status='QUEUED'",
+                  (time.time(), job_id))
+    if cur.rowcount:
+        return True
+    cur = db_exec(f"UPDATE jobs SET cancel_requested=1 WHERE id=? AND status IN {ACTIVE_JOB_STATUSES}", (job_id,))
+    return bool(cur.rowcount)
+
+
+def list_jobs(statuses: List[str] | None = None) -> List[Dict[str, Any]]:
+    sql = ("SELECT j.*, p.name AS plan_name, t.name AS testbed_name FROM jobs j "
+           "LEFT JOIN testplans p ON p.id=j.plan_id "
+           "LEFT JOIN testbeds t ON t.id=COALESCE(j.assigned_testbed_id, j.testbed_id)")
+    args: Tuple = ()
+    if statuses:
+        sql += f" WHERE j.status IN ({','.join('?' * len(statuses))})"
+        args = tuple(statuses)
+    return db_query(sql + " ORDER BY j.id DESC", args)
+
+
+def recover_abandoned_jobs(log_q=None) -> int:
+    """
+    Jobs whose lease expired (their scheduler crashed or hung) are requeued
+    if attempts remain, else marked ABORTED; their runs rows are closed as
+    ABORTED. A requeued job keeps its run_id and resumes that run from its
+    checkpoints. Returns the number of jobs recovered.
+    """
+    now = time.time()
+    with _immediate() as conn:
+        rows = conn.execute(
+            f"SELECT j.id, j.run_id, j.attempts, j.max_attempts, j.cancel_requested FROM jobs j "
+            f"LEFT JOIN testbed_leases l ON l.job_id=j.id "
+            f"WHERE j.status IN {ACTIVE_JOB_STATUSES} AND (l.job_id IS NULL OR l.expires_ts < ?)",
+            (now,),
+        ).fetchall()
+        for r in rows:
+            if r["run_id"]:
+                conn.execute("UPDATE runs SET status='ABORTED', end_ts=? WHERE id=? AND status='RUNNING'",
+                             (time.strftime("%Y-%m-%d %H:%M:%S"), r["run_id"]))
+            retry = r["attempts"] < r["max_attempts"] and not r["cancel_requested"]
+            conn.execute(
+                "UPDATE jobs SET status=?, owner='', assigned_testbed_id=NULL, error=?, "
+                "finished_ts=? WHERE id=?",
+                ("QUEUED" if retry else "ABORTED", "lease expired (scheduler lost)",
+                 None if retry else now, r["id"]),
+            )
+        conn.execute("DELETE FROM testbed_leases WHERE expires_ts < ?", (now,))
+    if rows and log_q is not None:
+        log_q.put(f"[sched] recovered {len(rows)} abandoned job(s)")
+    return len(rows)
+
+
+def claim_next_job(owner: str, lease_ttl_s: float,
+                   reachable: List[int] | None = None) -> Optional[Dict[str, Any]]:
+    """
+    Atomically pick the highest-priority queued job that has a free bed and
+    lease that bed to it. Jobs whose beds are all busy (or, with reachable,
+    not among those testbed ids) are skipped rather than blocking the
+    queue. Returns the claimed job row or None.
+    """
+    now = time.time()
+    with _immediate() as conn:
+        busy = {r["testbed_id"] for r in conn.execute(
+            "SELECT testbed_id FROM testbed_leases WHERE expires_ts >= ?", (now,))}
+        queued = conn.execute(
+            "SELECT * FROM jobs WHERE status='QUEUED' ORDER BY priority DESC, id"
+        ).fetchall()
+        pools: Dict[str, List[int]] = {}
+        for job in queued:
+            if job["testbed_id"] is not None:
+                candidates = [job["testbed_id"]]
+            else:
+                if job["pool"] not in pools:
+                    pools[job["pool"]] = [r["id"] for r in conn.execute(
+                        "SELECT id FROM testbeds WHERE pool=? ORDER BY id", (job["pool"],))]
+                candidates = pools[job["pool"]]
+            if job["run_id"]:
+                # A requeued job goes back to the bed of its run so it can resume
+                prev = conn.execute("SELECT testbed_id FROM runs WHERE id=?", (job["run_id"],)).fetchone()
+                if prev is not None and prev["testbed_id"] in candidates:
+                    candidates = [prev["testbed_id"]] + [b for b in candidates if b != prev["testbed_id"]]
+            bed = next((b for b in candidates
+                        if b not in busy and (reachable is None or b in reachable)), None)
+            if bed is None:
+                continue
+            conn.execute(
+                "INSERT OR REPLACE INTO testbed_leases (testbed_id, job_id, owner, acquired_ts, heartbeat_ts, expires_ts) "
+                "VALUES (?,?,?,?,?,?)",
+                (bed, job["id"], owner, now, now, now + lease_ttl_s),
+            )
+            conn.execute(
+                "UPDATE jobs SET status='CLAIMED', assigned_testbed_id=?, owner=?, attempts=attempts+1, "
+                "started_ts=?, error='' WHERE id=?",
+                (bed, owner, now, job["id"]),
+            )
+            return dict(job, assigned_testbed_id=bed, owner=owner)
+    return None
+
+
+def register_worker(owner: str, testbeds: List[int] | None, max_workers: int):
+    now = time.time()
+    db_exec(
+        "INSERT OR REPLACE INTO workers (owner, host, pid, testbeds_json, max_workers, running, status, "
+        "started_ts, heartbeat_ts) VALUES (?,?,?,?,?,0,'ONLINE',?,?)",
+        (owner, socket.gethostname(), os.getpid(), json.dumps(testbeds) if testbeds is not None else "",
+         max_workers, now, now),
+    )
+
+
+def worker_heartbeat(owner: str, running: int):
+    db_exec("UPDATE workers SET heartbeat_ts=?, running=?, status='ONLINE' WHERE owner=?",
+            (time.time(), running, owner))
+
+
+def unregister_worker(owner: str):
+    db_exec("UPDATE workers SET status='STOPPED', running=0, heartbeat_ts=? WHERE owner=?", (time.time(), owner))
+
+
+def list_workers(alive_only: bool = False) -> List[Dict[str, Any]]:
+    """Registered workers; `alive` is False once a worker misses its lease TTL worth of heartbeats."""
+    rows = db_query("SELECT * FROM workers ORDER BY started_ts")
+    cutoff = time.time() - SCHEDULER_DEFAULTS["lease_ttl_s"]
+    for r in rows:
+        r["testbeds"] = json.loads(r["testbeds_json"]) if r.get("testbeds_json") else None
+        r["alive"] = r["status"] == "ONLINE" and (r["heartbeat_ts"] or 0) >= cutoff
+    return [r for r in rows if r["alive"]] if alive_only else rows
+
+
+class Scheduler:
+    """
+    Claims queued jobs and runs each on its leased testbed in a worker
+    thread, so every free bed is busy at once. Leases are renewed by a
+    heartbeat; a job whose lease is lost is cancelled, and jobs of crashed
+    schedulers are requeued once their leases expire. With `testbeds`
+    (ids), only jobs for those beds are claimed, so one worker process per
+    lab host can serve the beds it reaches.
+    """
+
+    def __init__(self, owner: str | None = None, max_workers: int | None = None, log_q=None,
+                 testbeds: List[int] | None = None,
+                 lease_ttl_s: float = SCHEDULER_DEFAULTS["lease_ttl_s"],
+                 heartbeat_s: float = SCHEDULER_DEFAULTS["heartbeat_s"],
+                 poll_s: float = SCHEDULER_DEFAULTS["poll_s"]):
+        self.owner = owner or default_owner()
+        self.max_workers = max_workers
+        self.testbeds = set(testbeds) if testbeds is not None else None
+        self.log_q = log_q
+        self.lease_ttl_s = lease_ttl_s
+        self.heartbeat_s = heartbeat_s
+        self.poll_s = poll_s
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._workers: Dict[int, Dict[str, Any]] = {}
+        self._thread: threading.Thread | None = None
+
+    def _log(self, msg: str):
+        if self.log_q is not None:
+            self.log_q.put(msg)
+
+    def _capacity(self) -> int:
+        if self.max_workers:
+            return int(self.max_workers)
+        if self.testbeds is not None:
+            return max(1, len(self.testbeds))
+        beds = db_query("SELECT COUNT(*) AS n FROM testbeds", one=True)
+        return max(1, min(int(beds["n"] if beds else 1), SCHEDULER_DEFAULTS["max_workers"]))
+
+    def start(self) -> "Scheduler":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, daemon=True, name="testrig-sched")
+            self._thread.start()
+        return self
+
+    def stop(self, cancel_running: bool = False, wait: bool = True):
+        self._stop.set()
+        self._wake.set()
+        if cancel_running:
+            with self._lock:
+                for w in self._workers.values():
+                    w["cancel"].set()
+        if wait and self._thread is not None:
+            self._thread.join()
+
+    def running_jobs(self) -> List[int]:
+        with self._lock:
+            return list(self._workers)
+
+    def poke(self):
+        """Check the queue now instead of at the next poll."""
+        self._wake.set()
+
+    def run_until_idle(self) -> None:
+        """
+        Run in the calling thread until all workers are done and no queued
+        job can be claimed by this scheduler (jobs for beds it does not
+        serve, or beds leased by someone else, do not keep it running).
+        """
+        self._loop(until_idle=True)
+
+    def _has_claimable(self) -> bool:
+        """True if some queued job has a bed this scheduler serves that is not leased."""
+        rows = db_query("SELECT testbed_id, pool FROM jobs WHERE status='QUEUED'")
+        if not rows:
+            return False
+        leased = {r["testbed_id"] for r in db_query(
+            "SELECT testbed_id FROM testbed_leases WHERE expires_ts >= ?", (time.time(),))}
+        pools = {r["pool"] for r in rows if r["testbed_id"] is None}
+        pooled = db_query(
+            f"SELECT id FROM testbeds WHERE pool IN ({','.join('?' * len(pools))})", tuple(pools)
+        ) if pools else []
+        wanted = {r["testbed_id"] for r in rows if r["testbed_id"] is not None} | {r["id"] for r in pooled}
+        wanted &= {r["id"] for r in db_query("SELECT id FROM testbeds")}
+        if self.testbeds is not None:
+            wanted &= self.testbeds
+        return bool(wanted - leased)
+
+    def _loop(self, until_idle: bool = False):
+        register_worker(self.owner, sorted(self.testbeds) if self.testbeds is not None else None,
+                        self._capacity())
+        last_beat = time.time()
+        try:
+            while not self._stop.is_set():
+                try:
+                    recover_abandoned_jobs(self.log_q)
+                    self._fill()
+                    if time.time() - last_beat >= self.heartbeat_s:
+                        worker_heartbeat(self.owner, len(self.running_jobs()))
+                        last_beat = time.time()
+                except Exception as e:
+                    self._log(f"[sched] error: {e}")
+                with self._lock:
+                    busy = bool(self._workers)
+                if until_idle and not busy and not self._has_claimable():
+                    return
+                self._wake.wait(self.poll_s)
+                self._wake.clear()
+            # Let running jobs finish (they were cancelled if requested)
+            with self._lock:
+                threads = [w["thread"] for w in self._workers.values()]
+            for t in threads:
+                t.join()
+        finally:
+            unregister_worker(self.owner)
+
+    def _fill(self):
+        capacity = self._capacity()
+        while True:
+            with self._lock:
+                if len(self._workers) >= capacity:
+                    return
+            job = claim_next_job(self.owner, self.lease_ttl_s, self.testbeds)
+            if job is None:
+                return
+            cancel = threading.Event()
+            t = threading.Thread(target=self._run_job, args=(job, cancel), daemon=True,
+                                 name=f"testrig-job-{job['id']}")
+            with self._lock:
+                self._workers[job["id"]] = {"thread": t, "cancel": cancel, "job": job}
+            t.start()
+
+    def _heartbeat(self, job: Dict[str, Any], cancel: threading.Event, done: threading.Event):
+        while not done.wait(self.heartbeat_s):
+            try:
+                if not renew_lease(job["assigned_testbed_id"], job["id"], self.owner, self.lease_ttl_s):
+                    self._log(f"[sched] job {job['id']}: lease lost, cancelling")
+                    cancel.set()
+                    return
+                row = db_query("SELECT cancel_requested FROM jobs WHERE id=?", (job["id"],), one=True)
+                if row and row["cancel_requested"] and not cancel.is_set():
+                    self._log(f"[sched] job {job['id']}: cancel requested")
+                    cancel.set()
+            except Exception as e:
+                self._log(f"[sched] job {job['id']}: heartbeat error: {e}")
+
+    def _run_job(self, job: Dict[str, Any], cancel: threading.Event):
+        bed = job["assigned_testbed_id"]
+        log = PrefixLog(self.log_q, f"[job {job['id']}]") if self.log_q is not None else None
+        done = threading.Event()
+        hb = threading.Thread(target=self._heartbeat, args=(job, cancel, done), daemon=True)
+        hb.start()
+        status, error = "ABORTED", ""
+        try:
+            prev = db_query("SELECT testbed_id FROM runs WHERE id=?", (job["run_id"],), one=True) \
+                if job["run_id"] else None
+            if prev is not None and prev["testbed_id"] == bed:
+                db_exec("UPDATE jobs SET status='RUNNING' WHERE id=?", (job["id"],))
+                self._log(f"[sched] job {job['id']}: resuming run {job['run_id']} on testbed {bed}")
+                run_id, status = resume_run(job["run_id"], log, cancel, bool(job["stop_on_fail"]),
+                                             take_lease=False)
+                if run_id is None:
+                    raise RuntimeError(status)
+            else:
+                row = db_query("SELECT * FROM testplans WHERE id=?", (job["plan_id"],), one=True)
+                if row is None:
+                    raise RuntimeError(f"testplan {job['plan_id']} no longer exists")
+                plan = Testplan(testplan_id=row["id"], name=row["name"], description=row.get("description"))
+                run_id = create_run(plan.id, bed)
+                db_exec("UPDATE jobs SET status='RUNNING', run_id=? WHERE id=?", (run_id, job["id"]))
+                self._log(f"[sched] job {job['id']}: plan {plan.name!r} on testbed {bed} as run {run_id}")
+                status = execute_run(run_id, plan, bed, log, cancel, bool(job["stop_on_fail"]))
+        except Exception as e:
+            error = str(e)
+            self._log(f"[sched] job {job['id']}: {error}")
+        finally:
+            done.set()
+            hb.join()
+            # Only record the outcome if this scheduler still owns the job
+            db_exec(
+                "UPDATE jobs SET status=?, error=?, finished_ts=? WHERE id=? AND owner=?",
+                ("CANCELLED" if cancel.is_set() and status == "ABORTED" else status, error,
+                 time.time(), job["id"], self.owner),
+            )
+            release_lease(bed, job["id"], self.owner)
+            with self._lock:
+                self._workers.pop(job["id"], None)
+            self._log(f"[sched] job {job['id']}: {status}")
+            self._wake.set()
+
+
+_scheduler: Scheduler | None = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler(start: bool = True) -> Scheduler:
+    """Process-wide scheduler (started on first use by default)."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = Scheduler()
+        if start:
+            _scheduler.start()
+        return _scheduler
@@ -0,0 +1,190 @@
+"""Persistent, prompt-aware serial console sessions (one per COM port)."""
+import atexit
+import re
+import threading
+import time
+import uuid
+from typing import Tuple, Dict, Any, Callable
+
+try:
+    import serial
+except ImportError:
+    serial = None
+
+from utils import json_or_empty
+
+
+# Matches a typical busybox/ash/bash/u-boot prompt at the end of the output.
+# Override per device with extra_json["serial_prompt"].
+DEFAULT_PROMPT_RE = r"[#$>%]\s?$"
+
+# If the prompt regex never matches, return once the marker is in and the
+# line has been quiet this long, instead of waiting for the full timeout.
+_QUIET_AFTER_MARKER_S = 0.5
+_READ_TIMEOUT_S = 0.05
+
+
+class SerialConsole:
+    """
+    Keeps a serial port open and runs commands against the shell on it.
+    Each command is followed by a nonce-tagged `$?` marker, and the call
+    returns as soon as the marker and the next prompt have been read.
+    All access is serialized by a per-port lock.
+    """
+
+    def __init__(self, port: str, baudrate: int = 115200, prompt_re: str | None = None):
+        self.port = port
+        self.baudrate = int(baudrate)
+        self.prompt_re = re.compile(prompt_re or DEFAULT_PROMPT_RE)
+        self.lock = threading.RLock()
+        self._ser = None
+
+    def _ensure_open(self):
+        if self._ser is None or not self._ser.is_open:
+            if serial is None:
+                raise RuntimeError("pyserial not installed")
+            self._ser = serial.Serial(port=self.port, baudrate=self.baudrate, timeout=_READ_TIMEOUT_S)
+        return self._ser
+
+    @property
+    def is_open(self) -> bool:
+        return bool(self._ser is not None and self._ser.is_open)
+
+    def close(self):
+        with self.lock:
+            if self._ser is not None:
+                try:
+                    self._ser.close()
+                except Exception:
+                    pass
+                self._ser = None
+
+    def transact(self, payload: str, done: Callable[[str], bool], timeout: float) -> Tuple[bool, str]:
+        """
+        Write payload, then read until done(text) is true or timeout.
+        Returns (completed, text) with CRs removed.
+        """
+        with self.lock:
+            try:
+                ser = self._ensure_open()
+                ser.reset_input_buffer()
+                ser.write(payload.encode("utf-8"))
+                ser.flush()
+
+                deadline = time.time() + timeout
+                buf = bytearray()
+                while time.time() < deadline:
+                    data = ser.read(ser.in_waiting or 1)
+                    if data:
+                        buf += data
+                        if done(buf.decode("utf-8", errors="ignore").replace("\r", "")):
+                            return True, buf.decode("utf-8", errors="ignore").replace("\r", "")
+                return False, buf.decode("utf-8", errors="ignore").replace("\r", "")
+            except Exception:
+                # Port vanished (USB replug, device reboot): reopen on next use
+                self.close()
+                raise
+
+    def run(self, command: str, timeout: float = 60) -> Tuple[int, str, str]:
+        """Run one command. Returns (rc, stdout, stderr); rc 124 on timeout."""
+        nonce = uuid.uuid4().hex[:12]
+        marker_re = re.compile(rf"__TRIG_RC_{nonce}__ (\d+)\n")
+        # The newline closes the group even when the command ends in `&`, `;` or a comment
+        line = f"{{ {command}\n}}; printf '__TRIG_RC_%s__ %d\\n' {nonce} $?"
+        state = {"marker_at": None}
+
+        def done(text: str) -> bool:
+            m = marker_re.search(text)
+            if not m:
+                return False
+            if self.prompt_re.search(text[m.end():]):
+                return True
+            state["marker_at"] = state["marker_at"] or time.time()
+            return time.time() - state["marker_at"] > _QUIET_AFTER_MARKER_S
+
+        completed, text = self.transact(line + "\n", done, timeout)
+        # Output starts after our own echoed entry; anything before it is
+        # late output from an earlier (interrupted) command. The shell's PS2
+        # prompt for each continuation line lands right after the echo.
+        echo_at = text.find(f" {nonce} $?")
+        start = 0
+        if echo_at != -1:
+            continuations = line.count("\n")
+            start = text.find("\n", echo_at) + 1
+            start += re.match(rf"(?:> ){{0,{continuations}}}", text[start:]).end()
+        m = marker_re.search(text, start)
+        if not m:
+            self.interrupt()
+            return 124, strip_console_echo(text[start:]), f"serial timeout after {timeout}s"
+        return int(m.group(1)), strip_console_echo(text[start:m.start()]), ""
+
+    def interrupt(self):
+        """Send Ctrl-C so a hung command does not block the next caller."""
+        with self.lock:
+            try:
+                self._ensure_open().write(b"\x03\n")
+            except Exception:
+                self.close()
+
+
+def strip_console_echo(out: str) -> str:
+    """
+    Drop echoed command lines from console output. Every command we type
+    carries a literal `__TRIG_..%s` printf format, which real output never
+    does once printf has expanded it. Late markers of interrupted commands
+    are dropped as well.
+    """
+    kept = [
+        ln for ln in out.split("\n")
+        if not ("__TRIG_" in ln and "%s" in ln) and not _STALE_MARKER_RE.search(ln)
+    ]
+    return "\n".join(kept)
+
+
+# Expanded marker of an earlier command whose output arrived late
+_STALE_MARKER_RE = re.compile(r"__TRIG_\w+__ \d+$")
+
+
+_CONSOLES: Dict[str, SerialConsole] = {}
+_CONSOLES_LOCK = threading.Lock()
+
+
+def get_serial_console(device: Dict[str, Any]) -> SerialConsole:
+    """Return the shared console for a device's COM port (settings from extra_json)."""
+    extra = json_or_empty(device.get("extra_json") or "{}")
+    port = (extra.get("com_port") or "").strip()
+    if not port:
+        raise ValueError("com_port not set")
+    baud = int(extra.get("baud", 115200))
+    prompt = extra.get("serial_prompt") or None
+
+    with _CONSOLES_LOCK:
+        console = _CONSOLES.get(port)
+        if console is None:
+            console = _CONSOLES[port] = SerialConsole(port, baud, prompt)
+        else:
+            if prompt and prompt != console.prompt_re.pattern:
+                console.prompt_re = re.compile(prompt)
+            if baud != console.baudrate:
+                with console.lock:
+                    console.close()
+                    console.baudrate = baud
+    return console
+
+
+def is_console_open(port: str) -> bool:
+    """True if a session currently holds this port open."""
+    with _CONSOLES_LOCK:
+        console = _CONSOLES.get((port or "").strip())
+    return bool(console and console.is_open)
+
+
+def close_all_consoles():
+    with _CONSOLES_LOCK:
+        consoles = list(_CONSOLES.values())
+        _CONSOLES.clear()
+    for console in consoles:
+        console.close()
+
+
+atexit.register(close_all_consoles)
@@ -0,0 +1,260 @@
+"""Sharded runs: one testplan split across several equivalent testbeds."""
+import heapq
+import statistics
+import threading
+import time
+from collections import deque
+from typing import Tuple, Dict, Any, List, Optional
+
+from database import db_query, db_exec
+from utils import device_context_for_testbed
+from models import Testplan
+from .leases import LeaseSet, default_owner
+from .runner import PrefixLog, create_run, run_item, _start_thread
+from .scheduler import resolve_testbeds
+
+
+SHARDING_DEFAULTS = {
+    # Recent results per testcase used for its duration estimate
+    "history": 20,
+    # Estimate for testcases that never ran, when nothing in the plan has history
+    "default_duration_s": 60.0,
+}
+
+
+def estimate_durations(testcases: List[Dict[str, Any]], history: int | None = None) -> Dict[int, float]:
+    """
+    Median of the recent run_results.duration_s per testcase. Whole-item
+    results (with a seq) are preferred over per-iteration rows; testcases
+    without history get the median of the others.
+    """
+    ids = sorted({tc["id"] for tc in testcases})
+    if not ids:
+        return {}
+    rows = db_query(
+        "SELECT testcase_id, seq, duration_s FROM ("
+        "  SELECT testcase_id, seq, duration_s, ROW_NUMBER() OVER ("
+        "    PARTITION BY testcase_id ORDER BY seq IS NULL, id DESC) AS rn"
+        f"  FROM run_results WHERE duration_s > 0 AND testcase_id IN ({','.join('?' * len(ids))})"
+        ") WHERE rn <= ?",
+        tuple(ids) + (int(history or SHARDING_DEFAULTS["history"]),),
+    )
+    samples: Dict[int, List[float]] = {}
+    with_seq = {r["testcase_id"] for r in rows if r["seq"] is not None}
+    for r in rows:
+        if r["seq"] is None and r["testcase_id"] in with_seq:
+            continue
+        samples.setdefault(r["testcase_id"], []).append(r["duration_s"])
+    est = {tid: statistics.median(v) for tid, v in samples.items()}
+    fallback = statistics.median(est.values()) if est else SHARDING_DEFAULTS["default_duration_s"]
+    return {tid: est.get(tid, fallback) for tid in ids}
+
+
+def lpt_shards(testcases: List[Dict[str, Any]], durations: Dict[int, float], n: int) -> List[List[Dict[str, Any]]]:
+    """Longest-processing-time-first: each item, longest first, goes to the least loaded shard."""
+    shards: List[List[Dict[str, Any]]] = [[] for _ in range(n)]
+    heap = [(0.0, i) for i in range(n)]
+    for tc in sorted(testcases, key=lambda t: (-durations.get(t["id"], 0.0), t.get("seq") or 0)):
+        load, i = heapq.heappop(heap)
+        shards[i].append(tc)
+        heapq.heappush(heap, (load + durations.get(tc["id"], 0.0), i))
+    return shards
+
+
+class ShardQueues:
+    """
+    Per-shard item queues with work stealing: a shard that runs out takes
+    the last (shortest) item of the shard with the most estimated work left.
+    """
+
+    def __init__(self, shards: List[List[Dict[str, Any]]], durations: Dict[int, float]):
+        self.queues = [deque(s) for s in shards]
+        self.durations = durations
+        self.remaining = [sum(durations.get(tc["id"], 0.0) for tc in s) for s in shards]
+        self.steals = 0
+        self._lock = threading.Lock()
+
+    def next(self, shard: int) -> Tuple[Optional[Dict[str, Any]], Optional[int]]:
+        """Next item for `shard`; returns (item, victim shard or None if not stolen)."""
+        with self._lock:
+            if self.queues[shard]:
+                tc = self.queues[shard].popleft()
+                self.remaining[shard] -= self.durations.get(tc["id"], 0.0)
+                return tc, None
+            victims = [i for i, q in enumerate(self.queues) if q]
+            if not victims:
+                return None, None
+            victim = max(victims, key=lambda i: self.remaining[i])
+            tc = self.queues[victim].pop()
+            self.remaining[victim] -= self.durations.get(tc["id"], 0.0)
+            self.steals += 1
+            return tc, victim
+
+
+def _role_signature(testbed_id: int) -> Tuple[str, ...]:
+    rows = db_query("SELECT role FROM devices WHERE testbed_id=?", (testbed_id,))
+    return tuple(sorted((r["role"] or "").lower() for r in rows))
+
+
+def compatible_testbeds(testbed_ids: List[int], log_q=None) -> List[int]:
+    """Beds with the same device roles as the first one."""
+    if not testbed_ids:
+        return []
+    ref = _role_signature(testbed_ids[0])
+    beds = []
+    for tb in testbed_ids:
+        if _role_signature(tb) == ref:
+            beds.append(tb)
+        elif log_q is not None:
+            log_q.put(f"[shard] skipping testbed {tb}: device roles differ")
+    return beds
+
+
+def merged_results(run_id: int) -> List[Dict[str, Any]]:
+    """run_results of a run and its shard runs, in plan order, with each row's testbed."""
+    return db_query(
+        "SELECT rr.*, r.testbed_id, t.name AS testbed_name FROM run_results rr "
+        "JOIN runs r ON r.id=rr.run_id LEFT JOIN testbeds t ON t.id=r.testbed_id "
+        "WHERE r.id=? OR r.parent_run_id=? ORDER BY rr.seq IS NULL, rr.seq, rr.id",
+        (run_id, run_id),
+    )
+
+
+def run_sharded(
+    plan_ref,
+    testbed_refs: List[str] | None = None,
+    pools: List[str] | None = None,
+    log_q=None,
+    cancel_event: threading.Event | None = None,
+    stop_on_fail: bool = False,
+    max_shards: int | None = None,
+) -> Tuple[int | None, str]:
+    """
+    Split a plan's items across compatible testbeds (LPT on historical
+    durations, with work stealing) and run the shards concurrently. The
+    parent runs row is the logical run; each shard has a child run
+    (parent_run_id) holding its run_results. Items must not depend on
+    each other's order. Every shard bed is leased (testbed_leases) until
+    the run ends, so scheduler jobs skip it; beds leased by someone else
+    are skipped. Returns (parent_run_id, status).
+    """
+    cancel_event = cancel_event or threading.Event()
+    plan_row = db_query("SELECT * FROM testplans WHERE name=? OR id=?", (str(plan_ref), str(plan_ref)), one=True)
+    if plan_row is None:
+        return None, f"testplan {plan_ref!r} not found"
+    plan = Testplan(testplan_id=plan_row["id"], name=plan_row["name"], description=plan_row.get("description"))
+    ids, err = resolve_testbeds(testbed_refs, pools)
+    if err:
+        return None, err
+    beds = compatible_testbeds(ids, log_q)
+    testcases = plan.get_testcases()
+    if not testcases:
+        return None, "testplan has no items"
+
+    def _lost(testbed_id):
+        if log_q is not None:
+            log_q.put(f"[shard] lease on testbed {testbed_id} was lost; stopping the run")
+        cancel_event.set()
+
+    leases = LeaseSet(default_owner("shard"), on_lost=_lost)
+    try:
+        beds = _lease_beds(leases, beds, min(max_shards or len(beds), len(testcases)), log_q)
+        return _run_shards(plan, testcases, beds, log_q, cancel_event, stop_on_fail)
+    finally:
+        leases.release()
+
+
+def _lease_beds(leases: LeaseSet, beds: List[int], n: int, log_q=None) -> List[int]:
+    """Lease up to n of the beds, in order, skipping those leased by someone else."""
+    leased = []
+    for tb in beds:
+        if len(leased) >= n:
+            break
+        holder = leases.acquire(tb)
+        if not holder:
+            leased.append(tb)
+        elif log_q is not None:
+            log_q.put(f"[shard] skipping testbed {tb}: leased by {holder}")
+    return leased
+
+
+def _run_shards(plan: Testplan, testcases: List[Dict[str, Any]], beds: List[int], log_q,
+                cancel_event: threading.Event, stop_on_fail: bool) -> Tuple[int | None, str]:
+    """run_sharded on beds already leased by the caller, one shard per bed."""
+    n = len(beds)
+    if n < 1:
+        return None, "no compatible testbed available"
+
+    durations = estimate_durations(testcases)
+    shards = lpt_shards(testcases, durations, n)
+    queues = ShardQueues(shards, durations)
+    parent_id = create_run(plan.id, beds[0])
+    child_ids = [create_run(plan.id, bed, parent_id) for bed in beds]
+    if log_q is not None:
+        log_q.put(f"Run {parent_id}: plan {plan.name!r}, {len(testcases)} items in {n} shards")
+        for k, (bed, items) in enumerate(zip(beds, shards)):
+            est = sum(durations[tc["id"]] for tc in items)
+            log_q.put(f"  shard {k}: testbed {bed}, run {child_ids[k]}, {len(items)} items, ~{est:.0f}s")
+
+    counts = {"PASSED": 0, "FAILED": 0}
+    counts_lock = threading.Lock()
+
+    def _shard(k: int):
+        run_id, bed = child_ids[k], beds[k]
+        log = PrefixLog(log_q, f"[shard {k}]") if log_q is not None else None
+        status = "PASSED"
+        try:
+            tb_ctx = device_context_for_testbed(bed)
+            tb_ctx.update(run_id=run_id, testbed_id=bed, cancel_event=cancel_event, artifacts={})
+            while not cancel_event.is_set():
+                tc, victim = queues.next(k)
+                if tc is None:
+                    break
+                if victim is not None and log is not None:
+                    log.put(f"stole {tc.get('name')} from shard {victim}")
+                tc_status = run_item(run_id, tc, tb_ctx, log, f"[seq {tc.get('seq')}]")
+                with counts_lock:
+                    counts[tc_status] += 1
+                if tc_status == "FAILED":
+                    status = "FAILED"
+                    if stop_on_fail:
+                        cancel_event.set()
+        except Exception as e:
+            status = "FAILED"
+            if log is not None:
+                log.put(f"shard crashed: {e}")
+        if cancel_event.is_set() and status != "FAILED":
+            status = "ABORTED"
+        db_exec("UPDATE runs SET end_ts=?, status=? WHERE id=?", (time.strftime("%Y-%m-%d %H:%M:%S"), status, run_id))
+
+    t0 = time.time()
+    threads = [threading.Thread(target=_shard, args=(k,), daemon=True, name=f"testrig-shard-{k}")
+               for k in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    shard_status = [r["status"] for r in db_query(
+        f"SELECT status FROM runs WHERE id IN ({','.join('?' * n)})", tuple(child_ids))]
+    if "FAILED" in shard_status:
+        status = "FAILED"
+    elif "ABORTED" in shard_status or counts["PASSED"] + counts["FAILED"] < len(testcases):
+        status = "ABORTED"
+    else:
+        status = "PASSED"
+    db_exec("UPDATE runs SET end_ts=?, status=? WHERE id=?", (time.strftime("%Y-%m-%d %H:%M:%S"), status, parent_id))
+    if log_q is not None:
+        log_q.put(f"Run {parent_id} {status}: {counts['PASSED']} passed, {counts['FAILED']} failed "
+                  f"of {len(testcases)} in {time.time() - t0:.1f}s on {n} testbeds "
+                  f"(~{sum(durations.values()):.0f}s serial, {queues.steals} stolen)")
+    return parent_id, status
+
+
+def start_sharded_thread(plan_ref, testbed_refs, pools, log_q, stop_on_fail: bool = False,
+                         max_shards: int | None = None) -> Dict[str, Any]:
+    """Like start_run_thread, for run_sharded."""
+    return _start_thread(
+        lambda p, t, pl, q, c: run_sharded(p, t, pl, q, c, stop_on_fail, max_shards),
+        (plan_ref, testbed_refs, pools), log_q,
+    )
@@ -0,0 +1,232 @@
+"""Process-wide pool of authenticated SSH transports, keyed per device."""
+import atexit
+import threading
+import time
+from contextlib import contextmanager
+from typing import Tuple, Dict, Any, Iterator
+
+from utils import json_or_empty
+
+
+# Pool tuning (seconds unless noted)
+SSH_POOL_DEFAULTS = {
+    "max_sessions_per_device": 8,
+    "idle_timeout": 300,
+    "keepalive_interval": 30,
+    "connect_timeout": 20,
+}
+
+# Errors that mean the underlying transport is unusable and must be evicted
+_BROKEN_ERRORS = (EOFError, ConnectionError, OSError)
+
+_paramiko_lock = threading.Lock()
+_paramiko_state: Dict[str, Any] = {}
+
+
+def load_paramiko():
+    """
+    Import paramiko on first use (it takes longer to import than the rest
+    of core together). Returns the module, or None if it is not installed.
+    """
+    if "module" not in _paramiko_state:
+        with _paramiko_lock:
+            if "module" not in _paramiko_state:
+                try:
+                    import paramiko
+                except ImportError:
+                    paramiko = None
+                _paramiko_state["module"] = paramiko
+    return _paramiko_state["module"]
+
+
+def _load_ssh_key(key_path: str, passphrase: str = None):
+    """Load SSH private key (RSA or Ed25519)."""
+    paramiko = load_paramiko()
+    try:
+        return paramiko.RSAKey.from_private_key_file(key_path, password=passphrase)
+    except Exception:
+        try:
+            return paramiko.Ed25519Key.from_private_key_file(key_path, password=passphrase)
+        except Exception:
+            return None
+
+
+def ssh_params_for_device(device: Dict[str, Any]) -> Dict[str, Any]:
+    """Resolve host/port/credentials for a device row (extra_json overrides)."""
+    extra = json_or_empty(device.get("extra_json") or "{}")
+    return {
+        "host": device.get("mgmt_ip"),
+        "port": int(extra.get("ssh_port") or 22),
+        "username": device.get("username") or extra.get("username") or "root",
+        "password": device.get("password") or extra.get("password"),
+        "key_path": extra.get("ssh_key_path"),
+        "passphrase": extra.get("ssh_key_passphrase"),
+    }
+
+
+class _PooledConnection:
+    """One authenticated SSHClient shared by all channels to a device."""
+
+    def __init__(self, client):
+        self.client = client
+        self.last_used = time.time()
+        self.in_use = 0
+
+    def alive(self) -> bool:
+        transport = self.client.get_transport() if self.client else None
+        return bool(transport and transport.is_active())
+
+    def close(self):
+        try:
+            self.client.close()
+        except Exception:
+            pass
+
+
+class SSHConnectionPool:
+    """
+    Reuse one authenticated Transport per (host, port, user, key).
+    Every command still gets its own channel via SSHClient.exec_command /
+    open_session / open_sftp, so callers are unaffected by the sharing.
+    Concurrent channels per device are capped by a semaphore; idle or
+    broken transports are evicted on the next acquire.
+    """
+
+    def __init__(
+        self,
+        max_sessions_per_device: int = SSH_POOL_DEFAULTS["max_sessions_per_device"],
+        idle_timeout: float = SSH_POOL_DEFAULTS["idle_timeout"],
+        keepalive_interval: int = SSH_POOL_DEFAULTS["keepalive_interval"],
+        connect_timeout: float = SSH_POOL_DEFAULTS["connect_timeout"],
+    ):
+        self.max_sessions_per_device = max(1, int(max_sessions_per_device))
+        self.idle_timeout = idle_timeout
+        self.keepalive_interval = keepalive_interval
+        self.connect_timeout = connect_timeout
+        self._lock = threading.Lock()
+        self._conns: Dict[Tuple, _PooledConnection] = {}
+        self._slots: Dict[Tuple, threading.BoundedSemaphore] = {}
+        self._connect_locks: Dict[Tuple, threading.Lock] = {}
+
+    @staticmethod
+    def key_for(params: Dict[str, Any]) -> Tuple:
+        return (params["host"], params["port"], params["username"], params.get("key_path") or "")
+
+    @contextmanager
+    def session(self, device: Dict[str, Any]) -> Iterator[Any]:
+        """
+        Borrow a connected paramiko.SSHClient for the given device.
+        The client must not be closed by the caller.
+        """
+        paramiko = load_paramiko()
+        if paramiko is None:
+            raise RuntimeError("Paramiko not installed")
+
+        params = ssh_params_for_device(device)
+        key = self.key_for(params)
+
+        with self._lock:
+            self._evict_idle_locked()
+            slots = self._slots.setdefault(key, threading.BoundedSemaphore(self.max_sessions_per_device))
+            connect_lock = self._connect_locks.setdefault(key, threading.Lock())
+
+        if not slots.acquire(timeout=self.connect_timeout):
+            raise TimeoutError(f"ssh pool: no free session for {params['host']} "
+                               f"(max {self.max_sessions_per_device})")
+        conn = None
+        try:
+            # Serialize handshakes per device so N callers don't race N connects
+            with connect_lock:
+                conn = self._get_or_connect(key, params)
+                conn.in_use += 1
+            try:
+                yield conn.client
+            except _BROKEN_ERRORS + ((paramiko.SSHException,) if paramiko else ()):
+                if not conn.alive():
+                    self._discard(key, conn)
+                raise
+        finally:
+            if conn is not None:
+                with self._lock:
+                    conn.in_use -= 1
+                    conn.last_used = time.time()
+                if not conn.alive():
+                    self._discard(key, conn)
+            slots.release()
+
+    def _get_or_connect(self, key: Tuple, params: Dict[str, Any]) -> _PooledConnection:
+        with self._lock:
+            conn = self._conns.get(key)
+        if conn is not None and conn.alive():
+            return conn
+        if conn is not None:
+            self._discard(key, conn)
+
+        paramiko = load_paramiko()
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        pkey = _load_ssh_key(params["key_path"], params["passphrase"]) if params["key_path"] else None
+        client.connect(
+            hostname=params["host"],
+            port=params["port"],
+            username=params["username"],
+            password=None if pkey else (params["password"] or None),
+            pkey=pkey,
+            timeout=self.connect_timeout,
+            allow_agent=True,
+            look_for_keys=True,
+        )
+        transport = client.get_transport()
+        if transport is not None and self.keepalive_interval:
+            transport.set_keepalive(int(self.keepalive_interval))
+
+        conn = _PooledConnection(client)
+        with self._lock:
+            self._conns[key] = conn
+        return conn
+
+    def _discard(self, key: Tuple, conn: _PooledConnection):
+        with self._lock:
+            if self._conns.get(key) is conn:
+                del self._conns[key]
+        conn.close()
+
+    def _evict_idle_locked(self):
+        now = time.time()
+        for key, conn in list(self._conns.items()):
+            if conn.in_use:
+                continue
+            if not conn.alive() or (self.idle_timeout and now - conn.last_used > self.idle_timeout):
+                del self._conns[key]
+                conn.close()
+
+    def invalidate(self, device: Dict[str, Any]):
+        """Drop the pooled transport for a device (e.g. after a reboot)."""
+        key = self.key_for(ssh_params_for_device(device))
+        with self._lock:
+            conn = self._conns.pop(key, None)
+        if conn is not None:
+            conn.close()
+
+    def close_all(self):
+        with self._lock:
+            conns = list(self._conns.values())
+            self._conns.clear()
+        for conn in conns:
+            conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "connections": len(self._conns),
+                "in_use": sum(c.in_use for c in self._conns.values()),
+            }
+
+
+_POOL = SSHConnectionPool()
+atexit.register(_POOL.close_all)
+
+
+def get_ssh_pool() -> SSHConnectionPool:
+    """Return the process-wide SSH connection pool."""
+    return _POOL
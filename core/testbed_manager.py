@@ -1,7 +1,7 @@
 """Testbed management: export, import, validation."""
 import json
 from typing import Tuple
-from ..database import db_query, db_exec
+from database import db_query, db_exec
 
 
 def export_testbed_json(testbed_id: int) -> str:
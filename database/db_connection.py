@@ -1,17 +1,53 @@
 """SQLite database connection management."""
 import sqlite3
-import streamlit as st
+import sys
+import threading
 from config import DB_PATH
 
 
+# Connections for threads outside a Streamlit script run (background
+# monitor, workers). sqlite3 connections must not be shared across threads.
+_thread_local = threading.local()
+
+
+def _in_script_thread() -> bool:
+    # Headless use (CLI runner) never imports Streamlit; don't pull it in here
+    if "streamlit" not in sys.modules:
+        return False
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return True  # old Streamlit: assume the script thread, as before
+    try:
+        return get_script_run_ctx(suppress_warning=True) is not None
+    except TypeError:
+        return get_script_run_ctx() is not None
+
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, timeout=10)
+    conn.row_factory = sqlite3.Row
+    # WAL lets the UI read while a background thread writes
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+    except sqlite3.DatabaseError:
+        pass
+    return conn
+
+
 def get_conn() -> sqlite3.Connection:
     """
     Get or create SQLite connection (cached in Streamlit session state).
     Streamlit re-runs script, so keep a single connection in session_state.
+    Background threads get their own per-thread connection.
     """
+    if not _in_script_thread():
+        conn = getattr(_thread_local, "conn", None)
+        if conn is None:
+            conn = _thread_local.conn = _connect()
+        return conn
+    import streamlit as st
     if "_db_conn" not in st.session_state:
         st.write(f"Using DB: {DB_PATH}")
-        conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-        conn.row_factory = sqlite3.Row
-        st.session_state["_db_conn"] = conn
+        st.session_state["_db_conn"] = _connect()
     return st.session_state["_db_conn"]
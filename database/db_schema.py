@@ -115,6 +115,103 @@ def init_db():
         )
         """
     )
+    db_exec(
+        """
+        CREATE TABLE IF NOT EXISTS device_status (
+            device_id INTEGER PRIMARY KEY,
+            ok INTEGER NOT NULL DEFAULT 0,
+            status TEXT DEFAULT '',
+            reason TEXT DEFAULT '',
+            details_json TEXT DEFAULT '{}',
+            fail_count INTEGER DEFAULT 0,
+            checked_ts REAL,
+            changed_ts REAL,
+            next_check_ts REAL,
+            FOREIGN KEY(device_id) REFERENCES devices(id) ON DELETE CASCADE
+        )
+        """
+    )
+    db_exec(
+        """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            plan_id INTEGER NOT NULL,
+            testbed_id INTEGER,
+            pool TEXT DEFAULT '',
+            priority INTEGER DEFAULT 0,
+            status TEXT NOT NULL DEFAULT 'QUEUED',
+            stop_on_fail INTEGER DEFAULT 0,
+            assigned_testbed_id INTEGER,
+            run_id INTEGER,
+            owner TEXT DEFAULT '',
+            attempts INTEGER DEFAULT 0,
+            max_attempts INTEGER DEFAULT 2,
+            cancel_requested INTEGER DEFAULT 0,
+            error TEXT DEFAULT '',
+            created_ts REAL,
+            started_ts REAL,
+            finished_ts REAL,
+            FOREIGN KEY(plan_id) REFERENCES testplans(id) ON DELETE CASCADE,
+            FOREIGN KEY(testbed_id) REFERENCES testbeds(id) ON DELETE CASCADE
+        )
+        """
+    )
+    db_exec("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, priority, id)")
+    db_exec(
+        """
+        CREATE TABLE IF NOT EXISTS testbed_leases (
+            testbed_id INTEGER PRIMARY KEY,
+            job_id INTEGER NOT NULL,
+            owner TEXT NOT NULL,
+            acquired_ts REAL,
+            heartbeat_ts REAL,
+            expires_ts REAL NOT NULL,
+            FOREIGN KEY(testbed_id) REFERENCES testbeds(id) ON DELETE CASCADE
+        )
+        """
+    )
+    db_exec(
+        """
+        CREATE TABLE IF NOT EXISTS workers (
+            owner TEXT PRIMARY KEY,
+            host TEXT,
+            pid INTEGER,
+            testbeds_json TEXT DEFAULT '',
+            max_workers INTEGER,
+            running INTEGER DEFAULT 0,
+            status TEXT DEFAULT 'ONLINE',
+            started_ts REAL,
+            heartbeat_ts REAL
+        )
+        """
+    )
+
+    # Schema migration: testbeds.pool groups interchangeable beds for the scheduler
+    try:
+        cols = db_query("PRAGMA table_info(testbeds)")
+        if "pool" not in [c["name"] for c in cols or []]:
+            db_exec("ALTER TABLE testbeds ADD COLUMN pool TEXT DEFAULT ''")
+    except Exception:
+        pass
+
+    # Schema migration: runs.parent_run_id links the shard runs of a sharded run
+    try:
+        cols = [c["name"] for c in db_query("PRAGMA table_info(runs)") or []]
+        if "parent_run_id" not in cols:
+            db_exec("ALTER TABLE runs ADD COLUMN parent_run_id INTEGER")
+    except Exception:
+        pass
+
+    # Schema migration: run_results checkpoints (testplan_items.seq + resume state)
+    try:
+        cols = [c["name"] for c in db_query("PRAGMA table_info(run_results)") or []]
+        if "seq" not in cols:
+            db_exec("ALTER TABLE run_results ADD COLUMN seq INTEGER")
+        if "checkpoint_json" not in cols:
+            db_exec("ALTER TABLE run_results ADD COLUMN checkpoint_json TEXT DEFAULT ''")
+        db_exec("CREATE INDEX IF NOT EXISTS idx_run_results_run_seq ON run_results (run_id, seq)")
+    except Exception:
+        pass
 
     # Schema migration: ensure testcases.testbed_id exists (if needed)
     try:
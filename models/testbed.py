@@ -1,6 +1,6 @@
 """Data model for Testbed."""
 from typing import Dict, Any, Optional
-from ..database import db_query
+from database import db_query
 
 
 class Testbed:
@@ -10,6 +10,7 @@ class Testbed:
         self.id = testbed_id
         self.name = kwargs.get('name')
         self.description = kwargs.get('description', '')
+        self.pool = kwargs.get('pool') or ''
     
     @staticmethod
     def get_by_id(testbed_id: int) -> Optional['Testbed']:
@@ -39,4 +40,5 @@ class Testbed:
             'id': self.id,
             'name': self.name,
             'description': self.description,
+            'pool': self.pool,
         }
@@ -1,6 +1,6 @@
 """Data model for Testcase."""
 from typing import Dict, Any, Optional
-from ..database import db_query
+from database import db_query
 
 
 class Testcase:
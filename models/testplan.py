@@ -1,6 +1,6 @@
 """Data model for Testplan."""
 from typing import Dict, Any, Optional, List
-from ..database import db_query
+from database import db_query
 
 
 class Testplan:
@@ -26,10 +26,10 @@ class Testplan:
         return [Testplan(**dict(row)) for row in rows]
     
     def get_testcases(self) -> List[Dict[str, Any]]:
-        """Get all testcases in this testplan."""
+        """Get all testcases in this testplan (each row also carries its item `seq`)."""
         rows = db_query(
             """
-            SELECT tc.* FROM testplan_items ti
+            SELECT tc.*, ti.seq AS seq FROM testplan_items ti
             JOIN testcases tc ON tc.id = ti.testcase_id
             WHERE ti.plan_id = ? ORDER BY ti.seq
             """,
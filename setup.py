@@ -11,6 +11,7 @@ setup(
     description="Professional WLAN testbed automation tool with modular architecture",
     author="Test Engineering",
     packages=find_packages(),
+    py_modules=["main", "cli"],
     python_requires=">=3.8",
     install_requires=[
         "streamlit>=1.31.0",
@@ -21,6 +22,7 @@ setup(
     entry_points={
         "console_scripts": [
             "testrig-automator=main:main",
+            "testrig=cli:main",
         ],
     },
     classifiers=[
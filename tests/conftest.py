@@ -0,0 +1,18 @@
+import os
+import sys
+
+# The app packages (core, database, ...) are top-level, imported from the repo root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def use_db(path):
+    """Point the database layer at `path` (init_db is up to the caller)."""
+    import database.db_connection as db_connection
+    db_connection.DB_PATH = path
+    # Drop this thread's cached connection to a previous test's database
+    conn = getattr(db_connection._thread_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        db_connection._thread_local.conn = None
@@ -0,0 +1,246 @@
+"""AdbClient against a fake adb server on a loopback port (shell commands run under the local sh)."""
+import os
+import socket
+import struct
+import subprocess
+import threading
+import time
+
+import pytest
+
+from core.adb_client import AdbClient, AdbCommandFailed
+
+
+def _recv(conn, n):
+    buf = b""
+    while len(buf) < n:
+        chunk = conn.recv(n - len(buf))
+        if not chunk:
+            raise EOFError
+        buf += chunk
+    return buf
+
+
+class FakeAdbServer:
+    """
+    adb server with one online device SER1 (and an offline SER2). Sync
+    files live in self.files; shell services run commands with sh and
+    stream their output as it is produced.
+    """
+
+    def __init__(self, shell_v2: bool = True):
+        self.shell_v2 = shell_v2
+        self.files = {}
+        self.connections = 0
+        self.sock = socket.create_server(("127.0.0.1", 0))
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            self.connections += 1
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    @staticmethod
+    def _request(conn) -> str:
+        return _recv(conn, int(_recv(conn, 4), 16)).decode()
+
+    @staticmethod
+    def _fail(conn, msg: str):
+        conn.sendall(b"FAIL%04x" % len(msg) + msg.encode())
+
+    @staticmethod
+    def _okay(conn, payload: bytes | None = None):
+        conn.sendall(b"OKAY" + (b"%04x" % len(payload) + payload if payload is not None else b""))
+
+    def _serve(self, conn):
+        try:
+            req = self._request(conn)
+            if req == "host:devices-l":
+                self._okay(conn, b"SER1 device usb:1-1 product:x model:Pixel_7 transport_id:3\n"
+                                 b"SER2 offline transport_id:4\n")
+            elif req.startswith("host-serial:"):
+                _, serial, what = req.split(":")
+                if serial != "SER1":
+                    self._fail(conn, f"device '{serial}' not found")
+                elif what == "get-state":
+                    self._okay(conn, b"device")
+                elif what == "features":
+                    self._okay(conn, b"shell_v2,cmd" if self.shell_v2 else b"cmd")
+            elif req in ("host:transport:SER1", "host:transport-any"):
+                self._okay(conn)
+                service = self._request(conn)
+                if service.startswith("shell,v2,raw:") and self.shell_v2:
+                    self._okay(conn)
+                    self._shell_v2(conn, service[len("shell,v2,raw:"):])
+                elif service.startswith("shell:"):
+                    self._okay(conn)
+                    self._shell_legacy(conn, service[len("shell:"):])
+                elif service == "sync:":
+                    self._okay(conn)
+                    self._sync(conn)
+                else:
+                    self._fail(conn, f"unknown service {service}")
+            else:
+                self._fail(conn, f"device not found ({req})")
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+
+    def _shell_v2(self, conn, command):
+        proc = subprocess.Popen(["sh", "-c", command], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+        lock = threading.Lock()
+
+        def _stdin():
+            try:
+                while True:
+                    pid, n = struct.unpack("<BI", _recv(conn, 5))
+                    data = _recv(conn, n) if n else b""
+                    if pid == 0:
+                        proc.stdin.write(data)
+                    elif pid == 4:
+                        break
+            except (EOFError, OSError):
+                pass
+            try:
+                proc.stdin.close()
+            except OSError:
+                pass
+
+        def _pump(stream, pid):
+            try:
+                for chunk in iter(lambda: os.read(stream.fileno(), 65536), b""):
+                    with lock:
+                        conn.sendall(struct.pack("<BI", pid, len(chunk)) + chunk)
+            except OSError:
+                proc.kill()  # the client hung up (timeout)
+
+        threading.Thread(target=_stdin, daemon=True).start()
+        pumps = [threading.Thread(target=_pump, args=(s, pid), daemon=True)
+                 for s, pid in ((proc.stdout, 1), (proc.stderr, 2))]
+        try:
+            for t in pumps:
+                t.start()
+            for t in pumps:
+                t.join()
+            conn.sendall(struct.pack("<BI", 3, 1) + bytes([proc.wait() & 0xFF]))
+        finally:
+            proc.kill()
+            proc.wait()
+
+    def _shell_legacy(self, conn, command):
+        proc = subprocess.Popen(["sh", "-c", command], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        try:
+            for chunk in iter(lambda: os.read(proc.stdout.fileno(), 65536), b""):
+                conn.sendall(chunk.replace(b"\n", b"\r\n"))
+        finally:
+            proc.kill()
+            proc.wait()
+
+    def _sync(self, conn):
+        while True:
+            cmd, n = _recv(conn, 4), struct.unpack("<I", _recv(conn, 4))[0]
+            arg = _recv(conn, n).decode()
+            if cmd == b"QUIT":
+                return
+            if cmd == b"RECV":
+                if arg not in self.files:
+                    msg = b"No such file or directory"
+                    conn.sendall(b"FAIL" + struct.pack("<I", len(msg)) + msg)
+                    return  # adbd closes the sync service after a FAIL
+                data = self.files[arg]
+                for pos in range(0, len(data), 65536):
+                    chunk = data[pos:pos + 65536]
+                    conn.sendall(b"DATA" + struct.pack("<I", len(chunk)) + chunk)
+                conn.sendall(b"DONE" + struct.pack("<I", 0))
+            elif cmd == b"SEND":
+                path, buf = arg.rsplit(",", 1)[0], b""
+                while True:
+                    kind, m = _recv(conn, 4), struct.unpack("<I", _recv(conn, 4))[0]
+                    if kind == b"DONE":
+                        break
+                    buf += _recv(conn, m)
+                self.files[path] = buf
+                conn.sendall(b"OKAY" + struct.pack("<I", 0))
+
+    def close(self):
+        self.sock.close()
+
+
+@pytest.fixture(params=[True, False], ids=["shell_v2", "legacy"])
+def adb(request):
+    server = FakeAdbServer(shell_v2=request.param)
+    client = AdbClient(port=server.port)
+    yield server, client
+    client.close()
+    server.close()
+
+
+def test_devices_and_state(adb):
+    server, client = adb
+    assert client.devices() == [
+        {"serial": "SER1", "state": "device", "usb": "1-1", "product": "x", "model": "Pixel_7", "transport_id": "3"},
+        {"serial": "SER2", "state": "offline", "transport_id": "4"},
+    ]
+    assert client.get_state("SER1") == "device"
+    with pytest.raises(AdbCommandFailed, match="not found"):
+        client.get_state("NOPE")
+
+
+def test_shell_exit_codes(adb):
+    server, client = adb
+    assert client.shell("SER1", "echo hi") == (0, "hi\n", "")
+    rc, out, err = client.shell("SER1", "echo out; echo err >&2; exit 3")
+    assert rc == 3
+    if server.shell_v2:
+        assert (out, err) == ("out\n", "err\n")
+    else:
+        assert sorted(out.splitlines()) == ["err", "out"]  # merged over the pty
+    assert client.shell("SER1", "sleep 0 &")[0] == 0
+    with pytest.raises(AdbCommandFailed):
+        client.shell("NOPE", "true")
+
+
+def test_shell_stdin_needs_v2(adb):
+    server, client = adb
+    if server.shell_v2:
+        assert client.shell("SER1", "cat", stdin=b"fed\n") == (0, "fed\n", "")
+    else:
+        with pytest.raises(Exception, match="stdin"):
+            client.shell("SER1", "cat", stdin=b"fed\n")
+
+
+def test_shell_timeout_bounds_the_whole_call(adb):
+    server, client = adb
+    t0 = time.monotonic()
+    rc, out, err = client.shell("SER1", "while true; do echo tick; sleep 0.05; done", timeout=0.5)
+    assert time.monotonic() - t0 < 3
+    assert rc == 124 and "timeout" in err
+    assert out.startswith("tick\n")  # output read before the deadline is kept
+
+
+def test_sync_push_pull_and_fail(adb, tmp_path):
+    server, client = adb
+    data = os.urandom(200 * 1024)  # several DATA packets
+    assert client.push("SER1", data, "/sdcard/blob") == len(data)
+    assert server.files["/sdcard/blob"] == data
+
+    local = tmp_path / "blob"
+    assert client.pull("SER1", "/sdcard/blob", str(local)) == len(data)
+    assert local.read_bytes() == data
+
+    with pytest.raises(AdbCommandFailed, match="No such file"):
+        client.pull("SER1", "/sdcard/missing", str(tmp_path / "missing"))
+    assert not (tmp_path / "missing").exists() and not (tmp_path / "missing.part").exists()
+
+    # The connection adbd closed after FAIL is not reused; later transfers still work
+    before = server.connections
+    assert client.pull("SER1", "/sdcard/blob", str(local)) == len(data)
+    assert client.pull("SER1", "/sdcard/blob", str(local)) == len(data)
+    assert server.connections - before == 1
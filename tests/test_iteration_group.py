@@ -0,0 +1,51 @@
+"""iteration_group sweeps and assert_expr over their results column."""
+import queue
+
+import pytest
+
+from core.iteration_group import expand_matrix
+from core.node_graph import run_node_graph
+
+
+def _sweep_then_assert(exprs, **group_params):
+    nodes = [{"id": "sweep", "type": "iteration_group", "params": dict(
+        {"matrix": {"params": {"d": [0, 0]}}, "body": {"type": "sleep", "params": {"duration_s": "{d}"}}},
+        **group_params)}]
+    for i, expr in enumerate(exprs):
+        nodes.append({"id": f"check{i}", "type": "assert_expr", "depends_on": ["sweep"], "params": {"expr": expr}})
+    status, metrics = run_node_graph({"nodes": nodes}, {"devices": []}, queue.Queue())
+    return status, metrics["nodes"]
+
+
+def test_column_assert_sees_metrics_without_group_assert():
+    status, nodes = _sweep_then_assert(["duration_s == 0", "d == 0"])
+    assert status == "PASSED"
+    assert nodes["check0"]["metrics"]["passed"] == 2
+    assert nodes["check1"]["metrics"]["passed"] == 2
+
+
+def test_column_assert_sees_node_qualified_metrics():
+    for group_params in ({}, {"assert": "body.duration_s == 0"}):
+        status, nodes = _sweep_then_assert(["body.duration_s == 0", "body.status == 'PASSED'"], **group_params)
+        assert status == "PASSED", group_params
+        assert nodes["sweep"]["metrics"]["passed"] == 2
+        assert all(nodes[f"check{i}"]["metrics"]["passed"] == 2 for i in range(2))
+
+
+def test_malformed_matrix_is_rejected():
+    for matrix in ({"d": [0, 0]}, {}, {"mode": "zip"}, {"mode": "list"}, {"params": {"d": [0]}, "mod": "zip"}):
+        with pytest.raises(ValueError):
+            expand_matrix(matrix)
+    assert list(expand_matrix({"mode": "zip", "params": {"a": [1, 2], "b": "x"}})) == [{"a": 1, "b": "x"}]
+    assert list(expand_matrix({"mode": "list", "items": [{"a": 1}]})) == [{"a": 1}]
+
+
+def test_empty_sweep_fails_unless_allowed():
+    status, nodes = _sweep_then_assert([], matrix={"d": [0, 0]})
+    assert status == "FAILED" and "expected mode, params or items" in nodes["sweep"]["metrics"]["error"]
+
+    status, nodes = _sweep_then_assert([], matrix={"params": {"d": []}})
+    assert status == "FAILED" and nodes["sweep"]["metrics"]["iterations"] == 0
+
+    status, nodes = _sweep_then_assert([], matrix={"params": {"d": []}}, allow_empty=True)
+    assert status == "PASSED" and nodes["sweep"]["metrics"]["iterations"] == 0
@@ -0,0 +1,114 @@
+"""Testbed leases taken outside scheduler jobs (resumed runs)."""
+import json
+
+import pytest
+
+from tests.conftest import use_db
+
+
+@pytest.fixture
+def bed_db(tmp_path):
+    """One testbed and a two-item plan."""
+    use_db(str(tmp_path / "leases.db"))
+    from database import init_db, db_exec
+
+    init_db()
+    db_exec("INSERT INTO testbeds (name) VALUES ('bed0')")
+    db_exec("INSERT INTO testplans (name) VALUES ('plan')")
+    for seq in range(2):
+        cur = db_exec(
+            "INSERT INTO testcases (name, action_type, action_name, parameters_json) VALUES (?,'builtin','sleep',?)",
+            (f"s{seq}", json.dumps({"duration_s": 0})),
+        )
+        db_exec("INSERT INTO testplan_items (plan_id, testcase_id, seq) VALUES (1, ?, ?)", (cur.lastrowid, seq))
+
+
+def _interrupted_run(status):
+    from database import db_exec
+    from core.runner import create_run
+
+    run_id = create_run(1, 1)
+    db_exec("UPDATE runs SET status=? WHERE id=?", (status, run_id))
+    return run_id
+
+
+def _result_count(run_id):
+    from database import db_query
+    return db_query("SELECT COUNT(*) AS n FROM run_results WHERE run_id=?", (run_id,), one=True)["n"]
+
+
+def test_resume_refuses_running_run(bed_db):
+    from core.runner import resume_run
+
+    run_id = _interrupted_run("RUNNING")
+    rid, err = resume_run(run_id)
+    assert rid is None and "RUNNING" in err
+    assert _result_count(run_id) == 0
+
+    rid, status = resume_run(run_id, force=True)
+    assert (rid, status) == (run_id, "PASSED")
+    assert _result_count(run_id) == 2
+
+
+def test_resume_refuses_leased_testbed(bed_db):
+    from core.leases import acquire_lease, release_lease
+    from core.runner import resume_run
+
+    run_id = _interrupted_run("ABORTED")
+    assert acquire_lease(1, 7, "worker-a", 30) == ""
+    rid, err = resume_run(run_id)
+    assert rid is None and "worker-a" in err
+    assert _result_count(run_id) == 0
+    release_lease(1, 7, "worker-a")
+
+    # An expired lease no longer blocks the bed
+    assert acquire_lease(1, 7, "worker-a", -1) == ""
+    assert resume_run(run_id) == (run_id, "PASSED")
+
+
+def test_resume_holds_lease_while_running(bed_db, monkeypatch):
+    import core.runner as runner
+    from core.leases import lease_holder
+
+    seen = []
+    real_run_item = runner.run_item
+
+    def _run_item(*args, **kwargs):
+        seen.append(lease_holder(1))
+        return real_run_item(*args, **kwargs)
+
+    monkeypatch.setattr(runner, "run_item", _run_item)
+    run_id = _interrupted_run("ABORTED")
+    assert runner.resume_run(run_id) == (run_id, "PASSED")
+    assert len(seen) == 2 and all(h.startswith("resume:") for h in seen)
+    assert lease_holder(1) == ""
+
+
+def test_sharded_run_leases_its_beds(bed_db, monkeypatch):
+    import core.sharding as sharding
+    from database import db_exec
+    from core.leases import acquire_lease, lease_holder
+    from core.scheduler import claim_next_job, enqueue_job
+
+    for name in ("bed1", "bed2"):
+        db_exec("INSERT INTO testbeds (name) VALUES (?)", (name,))
+    db_exec("UPDATE testbeds SET pool='lab'")
+    assert acquire_lease(3, 7, "worker-a", 30) == ""
+
+    seen = []
+    real_run_item = sharding.run_item
+
+    def _run_item(run_id, tc, tb_ctx, *args):
+        # A scheduler job for the shard's bed must not be claimable mid-run
+        job_id, _ = enqueue_job("plan", tb_ctx["testbed_id"])
+        seen.append((tb_ctx["testbed_id"], lease_holder(tb_ctx["testbed_id"]), claim_next_job("worker-b", 30)))
+        db_exec("DELETE FROM jobs WHERE id=?", (job_id,))
+        return real_run_item(run_id, tc, tb_ctx, *args)
+
+    monkeypatch.setattr(sharding, "run_item", _run_item)
+    parent_id, status = sharding.run_sharded("plan", pools=["lab"])
+    assert status == "PASSED"
+    assert {bed for bed, _, _ in seen} == {1, 2}
+    assert all(holder.startswith("shard:") and job is None for _, holder, job in seen)
+    assert lease_holder(1) == lease_holder(2) == ""
+    assert lease_holder(3) == "worker-a"
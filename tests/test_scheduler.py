@@ -0,0 +1,97 @@
+"""Job claiming across processes sharing one SQLite file."""
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from tests.conftest import ROOT, use_db
+
+
+@pytest.fixture
+def queue_db(tmp_path):
+    """Four pooled testbeds and 40 queued jobs of a one-item plan."""
+    path = str(tmp_path / "queue.db")
+    use_db(path)
+    from database import init_db, db_exec
+    from core.scheduler import enqueue_job
+
+    init_db()
+    for i in range(4):
+        db_exec("INSERT INTO testbeds (name, pool) VALUES (?, 'lab')", (f"bed{i}",))
+    db_exec("INSERT INTO testplans (name) VALUES ('plan')")
+    cur = db_exec(
+        "INSERT INTO testcases (name, action_type, action_name, parameters_json) VALUES ('s','builtin','sleep',?)",
+        (json.dumps({"duration_s": 0}),),
+    )
+    db_exec("INSERT INTO testplan_items (plan_id, testcase_id, seq) VALUES (1, ?, 0)", (cur.lastrowid,))
+    for _ in range(40):
+        assert enqueue_job("plan", pool="lab")[0] is not None
+    return path
+
+
+def _claim_loop(db_path, owner, out, start):
+    """Claim jobs until none are left, finishing each one at once."""
+    use_db(db_path)
+    from database import db_exec
+    from core.scheduler import claim_next_job, release_lease
+
+    start.wait()
+    claimed = []
+    idle = 0
+    while idle < 20:
+        job = claim_next_job(owner, 30)
+        if job is None:
+            idle += 1
+            continue
+        idle = 0
+        claimed.append(job["id"])
+        time.sleep(0.02)  # hold the bed so the other processes compete for the rest
+        db_exec("UPDATE jobs SET status='PASSED' WHERE id=?", (job["id"],))
+        release_lease(job["assigned_testbed_id"], job["id"], owner)
+    out.put((owner, claimed))
+
+
+def test_claims_are_exclusive_across_processes(queue_db):
+    ctx = multiprocessing.get_context("spawn")
+    out = ctx.Queue()
+    start = ctx.Barrier(4)
+    procs = [ctx.Process(target=_claim_loop, args=(queue_db, f"w{i}", out, start)) for i in range(4)]
+    for p in procs:
+        p.start()
+    results = dict(out.get(timeout=120) for _ in procs)
+    for p in procs:
+        p.join(timeout=30)
+        assert p.exitcode == 0
+
+    claimed = [job_id for ids in results.values() for job_id in ids]
+    assert sorted(claimed) == list(range(1, 41))  # every job exactly once
+    assert sum(1 for ids in results.values() if ids) > 1  # the processes really competed
+
+    from database import db_query
+    rows = db_query("SELECT owner, attempts FROM jobs")
+    assert {r["attempts"] for r in rows} == {1}
+    assert {r["owner"] for r in rows} == {o for o, ids in results.items() if ids}
+
+
+def test_worker_processes_run_each_job_once(queue_db):
+    cmd = [sys.executable, os.path.join(ROOT, "cli.py"), "worker", "--pool", "lab",
+           "--until-idle", "-q", "--db", queue_db]
+    procs = [subprocess.Popen(cmd, cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+             for _ in range(2)]
+    outputs = [p.communicate(timeout=120)[0] for p in procs]
+    assert [p.returncode for p in procs] == [0, 0], outputs
+
+    from database import db_query
+    jobs = db_query("SELECT status, attempts, run_id, owner FROM jobs")
+    assert len(jobs) == 40
+    assert {j["status"] for j in jobs} == {"PASSED"}
+    assert {j["attempts"] for j in jobs} == {1}
+    assert len({j["run_id"] for j in jobs}) == 40
+    runs = db_query("SELECT COUNT(*) AS n FROM runs")[0]["n"]
+    results = db_query("SELECT COUNT(*) AS n FROM run_results")[0]["n"]
+    assert (runs, results) == (40, 40)
+    assert db_query("SELECT * FROM testbed_leases") == []
@@ -0,0 +1,51 @@
+"""SerialConsole.run against a real interactive sh behind a pty pair."""
+import os
+import pty
+import select
+import subprocess
+import threading
+import tty
+
+import pytest
+
+pytest.importorskip("serial")
+
+from core.serial_console import SerialConsole
+
+
+@pytest.fixture
+def console():
+    """A SerialConsole on one end of a pty relay whose other end runs `sh -i`."""
+    shell_m, shell_s = pty.openpty()
+    port_m, port_s = pty.openpty()
+    env = dict(os.environ, PS1="root@ap:~# ", ENV="", HOME="/tmp")
+    proc = subprocess.Popen(["sh", "-i"], stdin=shell_s, stdout=shell_s, stderr=shell_s, env=env,
+                            start_new_session=True)
+    tty.setraw(port_m)
+
+    def _relay():
+        try:
+            while True:
+                for fd in select.select([shell_m, port_m], [], [])[0]:
+                    os.write(port_m if fd == shell_m else shell_m, os.read(fd, 4096))
+        except OSError:
+            pass
+
+    threading.Thread(target=_relay, daemon=True).start()
+    con = SerialConsole(os.ttyname(port_s))
+    yield con
+    con.close()
+    proc.kill()
+    proc.wait()
+
+
+@pytest.mark.parametrize("command, expected", [
+    ("echo hi", (0, "hi\n", "")),
+    ("sleep 0 &", (0, "", "")),
+    ("echo two;", (0, "two\n", "")),
+    ("echo hi # note", (0, "hi\n", "")),
+    ("echo x\necho y", (0, "x\ny\n", "")),
+    ("echo '> quoted'; false", (1, "> quoted\n", "")),
+])
+def test_run_returns_output_and_rc(console, command, expected):
+    assert console.run(command, timeout=5) == expected
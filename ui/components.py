@@ -1,6 +1,6 @@
 """Reusable UI components for TestRig Automator."""
 import streamlit as st
-from ..database import db_query
+from database import db_query
 
 
 def select_testbed_id(label: str = "Select testbed") -> int | None:
@@ -8,9 +8,13 @@ def render():
     st.subheader("Results")
     st.info("📈 Results - View execution results, logs, and metrics from completed runs.")
 
+    # Shard runs are folded into their parent run (one logical run per sharded run)
     rows = db_query(
-        "SELECT r.id, r.plan_id, r.testbed_id, r.status, r.start_ts, r.end_ts, p.name AS plan_name, t.name AS testbed_name "
-        "FROM runs r LEFT JOIN testplans p ON r.plan_id=p.id LEFT JOIN testbeds t ON r.testbed_id=t.id ORDER BY r.id DESC"
+        "SELECT r.id, r.plan_id, r.testbed_id, r.status, r.start_ts, r.end_ts, p.name AS plan_name, "
+        "COALESCE((SELECT group_concat(tb.name, ', ') FROM runs c JOIN testbeds tb ON tb.id=c.testbed_id "
+        "WHERE c.parent_run_id=r.id), t.name) AS testbed_name "
+        "FROM runs r LEFT JOIN testplans p ON r.plan_id=p.id LEFT JOIN testbeds t ON r.testbed_id=t.id "
+        "WHERE r.parent_run_id IS NULL ORDER BY r.id DESC"
     )
     if rows:
         df = pd.DataFrame([
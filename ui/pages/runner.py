@@ -1,6 +1,46 @@
 """Runner page (basic runner UI)."""
+import queue
 import streamlit as st
 from database import db_query
+from config import SESSION_KEYS, LIVE_LOG_MAX_LINES
+from core.runner import start_run_thread
+
+
+def _drain(job):
+    """Move new lines from the run's queue into its log buffer."""
+    q = job["queue"]
+    while True:
+        try:
+            job["lines"].append(q.get_nowait())
+        except queue.Empty:
+            break
+    if len(job["lines"]) > LIVE_LOG_MAX_LINES:
+        del job["lines"][: len(job["lines"]) - LIVE_LOG_MAX_LINES]
+
+
+def _ui_run_progress():
+    job = st.session_state.get(SESSION_KEYS["runner_job"])
+    if not job:
+        return
+    _drain(job)
+    running = job["handle"]["thread"].is_alive()
+    result = job["handle"]["result"]
+    if running:
+        st.info(f"⏳ Running **{job['plan']}** on **{job['testbed']}**...")
+        if st.button("Cancel run", key="runner_cancel"):
+            job["handle"]["cancel"].set()
+    elif result.get("run_id") is None:
+        st.error(result.get("status") or "Run failed to start")
+    else:
+        icon = {"PASSED": "✅", "FAILED": "❌"}.get(result.get("status"), "⚠️")
+        st.success(f"{icon} Run {result['run_id']} finished: {result.get('status')}")
+    st.code("\n".join(job["lines"][-200:]) or "(no output yet)")
+
+
+# Poll the background run every couple of seconds where fragments exist
+_fragment = getattr(st, "fragment", None)
+if _fragment is not None:
+    _ui_run_progress = _fragment(run_every=2)(_ui_run_progress)
 
 
 def render():
@@ -16,6 +56,18 @@ def render():
 
     plan_sel = st.selectbox("Select testplan", [p["name"] for p in plans], key="runner_plan")
     bed_sel = st.selectbox("Select testbed", [b["name"] for b in beds], key="runner_bed")
+    stop_on_fail = st.checkbox("Stop at first failure", key="runner_stop_on_fail")
+
+    job = st.session_state.get(SESSION_KEYS["runner_job"])
+    busy = bool(job and job["handle"]["thread"].is_alive())
+    if st.button("Start run", disabled=busy):
+        q = queue.Queue()
+        st.session_state[SESSION_KEYS["runner_job"]] = {
+            "plan": plan_sel,
+            "testbed": bed_sel,
+            "queue": q,
+            "lines": [],
+            "handle": start_run_thread(plan_sel, bed_sel, q, stop_on_fail=stop_on_fail),
+        }
 
-    if st.button("Start run"):
-        st.info("Run execution is not yet wired to the backend runner in this lightweight UI.")
+    _ui_run_progress()
@@ -2,6 +2,7 @@
 import json
 import streamlit as st
 from database import db_query, db_exec
+from core.reachability_monitor import get_reachability_monitor, load_device_status
 
 
 def _export_testbed_json(testbed_id: int) -> str:
@@ -75,7 +76,9 @@ def _ui_devices_for_selected_testbed(testbed_id: int):
     cols[7].markdown("**↻**")
     cols[8].markdown("**Delete**")
 
-    cache = st.session_state.setdefault("_dev_status", {})
+    # Status comes from the background monitor; rendering never probes
+    monitor = get_reachability_monitor()
+    statuses = load_device_status(testbed_id)
     for d in devices:
         try:
             ej = json.loads(d.get("extra_json") or "{}")
@@ -90,9 +93,12 @@ def _ui_devices_for_selected_testbed(testbed_id: int):
         row_cols[3].write(str(d.get("mgmt_ip", "")))
         row_cols[4].write(str(com))
         row_cols[5].write(str(adb))
+        entry = statuses.get(d["id"])
+        row_cols[6].write(f"{entry['status']} {entry['reason']}" if entry else "⏳ pending")
 
         if row_cols[7].button("🔄", key=f"dev_recheck_{d['id']}"):
-            st.info("Recheck not implemented in lightweight UI")
+            monitor.request_recheck(d["id"])
+            st.info(f"Recheck queued for {d['name']}")
 
         if row_cols[8].button("🗑️", key=f"dev_delete_{d['id']}"):
             db_exec("DELETE FROM devices WHERE id=?", (d["id"],))
@@ -100,6 +106,13 @@ def _ui_devices_for_selected_testbed(testbed_id: int):
             _safe_rerun()
 
 
+# Re-render the device table every few seconds where Streamlit supports
+# fragments, so monitor updates show up without a full page rerun
+_fragment = getattr(st, "fragment", None)
+if _fragment is not None:
+    _ui_devices_for_selected_testbed = _fragment(run_every=5)(_ui_devices_for_selected_testbed)
+
+
 def render():
     st.subheader("Testbeds")
     st.info("🏢 Testbeds management - Create, manage, and configure testbeds with devices.")
@@ -1,11 +1,14 @@
 """Utilities module for TestRig Automator."""
-from .helpers import json_or_empty, device_context_for_testbed
+from .helpers import json_or_empty, device_context_for_testbed, find_device
 from .logger import TeeLogger
 from .ssh_utils import SSHClient
+from .cache import TTLCache
 
 __all__ = [
     'json_or_empty',
     'device_context_for_testbed',
+    'find_device',
     'TeeLogger',
     'SSHClient',
+    'TTLCache',
 ]
@@ -0,0 +1,58 @@
+"""Small thread-safe TTL cache."""
+import threading
+import time
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """
+    Key/value store whose entries expire `ttl` seconds after being set.
+    Stale entries can still be read with allow_stale=True so a UI can render
+    the last known value while a refresh is pending.
+    """
+    
+    def __init__(self, ttl: float):
+        self.ttl = float(ttl)
+        self._lock = threading.Lock()
+        self._data: Dict[Hashable, Tuple[Any, float]] = {}
+    
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._data[key] = (value, time.time())
+    
+    def get(self, key: Hashable, default: Any = None, allow_stale: bool = False) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+        if item is None:
+            return default
+        value, ts = item
+        if not allow_stale and time.time() - ts > self.ttl:
+            return default
+        return value
+    
+    def is_fresh(self, key: Hashable) -> bool:
+        with self._lock:
+            item = self._data.get(key)
+        return bool(item and time.time() - item[1] <= self.ttl)
+    
+    def age(self, key: Hashable) -> Optional[float]:
+        with self._lock:
+            item = self._data.get(key)
+        return None if item is None else time.time() - item[1]
+    
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.pop(key, None)
+        return default if item is None else item[0]
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+    
+    def snapshot(self, allow_stale: bool = False) -> Dict[Hashable, Any]:
+        now = time.time()
+        with self._lock:
+            return {
+                k: v for k, (v, ts) in self._data.items()
+                if allow_stale or now - ts <= self.ttl
+            }
@@ -1,7 +1,7 @@
 """Helper utility functions."""
 import json
-from typing import Dict, Any
-from ..database import db_query
+from typing import Dict, Any, List
+from database import db_query
 
 
 def json_or_empty(s: str) -> Dict[str, Any]:
@@ -46,6 +46,22 @@ def device_context_for_testbed(testbed_id: int, role_bindings: Dict[str, str] |
     return ctx
 
 
+def find_device(devices: List[Dict[str, Any]], ref) -> Dict[str, Any] | None:
+    """Look a device up by id, name or role (first match)."""
+    if isinstance(ref, dict):
+        return ref
+    if ref is None:
+        return None
+    ref_s = str(ref).strip()
+    for d in devices:
+        if str(d.get("id")) == ref_s or d.get("name") == ref_s:
+            return d
+    for d in devices:
+        if (d.get("role") or "").lower() == ref_s.lower():
+            return d
+    return None
+
+
 def validate_json(s: str) -> bool:
     """Check if a string is valid JSON."""
     try:
@@ -1,9 +1,14 @@
 """Custom logger for streaming logs to Streamlit UI."""
 import queue
-import streamlit as st
 from config import SESSION_KEYS
 
 
+def _session_state():
+    """Streamlit session state, imported only when a TeeLogger is in use."""
+    import streamlit as st
+    return st.session_state
+
+
 class TeeLogger:
     """
     Wrap a queue and also push lines into session live buffer.
@@ -13,7 +18,7 @@ class TeeLogger:
     def __init__(self, inner_q: queue.Queue):
         self.inner = inner_q
         try:
-            st.session_state.setdefault(SESSION_KEYS["live_logs"], [])
+            _session_state().setdefault(SESSION_KEYS["live_logs"], [])
         except Exception:
             pass
     
@@ -29,7 +34,7 @@ class TeeLogger:
         
         # Mirror into session buffer (line-by-line)
         try:
-            buf = st.session_state.setdefault(SESSION_KEYS["live_logs"], [])
+            buf = _session_state().setdefault(SESSION_KEYS["live_logs"], [])
             buf.append(s)
             # Trim to last 2000 lines to avoid memory bloat
             if len(buf) > 2000:
@@ -1,6 +1,5 @@
 """SSH utilities using paramiko."""
 from typing import Tuple
-import paramiko
 from config import UI_DEFAULTS
 
 
@@ -23,6 +22,7 @@ class SSHClient:
             return True
         
         try:
+            import paramiko  # deferred: slow to import, only needed once connecting
             self.client = paramiko.SSHClient()
             self.client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
             
@@ -52,6 +52,7 @@ class SSHClient:
     
     def _load_key(self):
         """Load SSH private key."""
+        import paramiko
         try:
             return paramiko.RSAKey.from_private_key_file(
                 self.key_path, 